@@ -149,6 +149,23 @@ MEDIA_ROOT = BASE_DIR / 'media'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Cache
+# LocMemCache é por processo; em produção com vários workers use um backend
+# compartilhado (ex: django.core.cache.backends.db.DatabaseCache)
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='chatbot-backend'),
+    },
+    # RAG (systems.rag): revisão dos contextos e respostas em cache, separados do default
+    # para que as respostas (uma chave por mensagem distinta) não expulsem as demais chaves.
+    # As respostas só ficam em cache quando este backend é compartilhado entre os processos
+    'rag': {
+        'BACKEND': config('RAG_CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('RAG_CACHE_LOCATION', default='chatbot-rag'),
+    },
+}
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
@@ -188,3 +205,94 @@ LOGGING = {
         },
     },
 }
+
+# Compressão de textos longos (common.compression / CompressedTextField):
+# nível do zlib, tamanho mínimo (bytes) para comprimir e id do dicionário
+# compartilhado usado na escrita (0 = sem dicionário, máximo 65535; ver `train_message_dictionary`)
+COMPRESSION_LEVEL = config('COMPRESSION_LEVEL', cast=int, default=6)
+COMPRESSION_MIN_LENGTH = config('COMPRESSION_MIN_LENGTH', cast=int, default=64)
+COMPRESSION_DICTIONARY_ID = config('COMPRESSION_DICTIONARY_ID', cast=int, default=0)
+
+# Origens (common.origins): segundos até outros processos recarregarem o registro em memória
+ORIGIN_REGISTRY_TTL = config('ORIGIN_REGISTRY_TTL', cast=int, default=300)
+
+# RAG (systems.rag): segundos até recarregar o índice de contextos do cliente (com cache por
+# processo; com cache compartilhado a revisão dos contextos já recarrega na hora) e tempo
+# (segundos) das respostas em cache (invalidadas pela revisão a cada alteração de contexto)
+CONTEXT_INDEX_TTL = config('CONTEXT_INDEX_TTL', cast=int, default=300)
+CONTEXT_CACHE_TTL = config('CONTEXT_CACHE_TTL', cast=int, default=60 * 10)
+# Orçamento padrão de tokens dos contextos retornados quando a requisição não informa max_tokens (0 = sem limite)
+CONTEXT_MAX_TOKENS = config('CONTEXT_MAX_TOKENS', cast=int, default=0)
+# Peso do BM25 no método 'hybrid': pontos somados ao contexto com melhor BM25 (os demais, proporcionalmente)
+CONTEXT_BM25_WEIGHT = config('CONTEXT_BM25_WEIGHT', cast=float, default=6)
+# Método 'vector' (systems.vectors): similaridade mínima para incluir um contexto e
+# diretório dos arquivos .npy compartilhados (mmap) entre os processos
+CONTEXT_VECTOR_MIN_SIMILARITY = config('CONTEXT_VECTOR_MIN_SIMILARITY', cast=float, default=0.1)
+CONTEXT_VECTOR_DIR = config('CONTEXT_VECTOR_DIR', default=str(BASE_DIR / 'data' / 'context_vectors'))
+# Passagens (systems.passages): tamanho máximo em tokens, parágrafos repetidos da passagem anterior
+# (alterar exige `manage.py rebuild_context_passages`) e passagens por contexto retornadas quando a
+# requisição não informa max_passages (0 = conteúdo inteiro)
+CONTEXT_PASSAGE_MAX_TOKENS = config('CONTEXT_PASSAGE_MAX_TOKENS', cast=int, default=200)
+CONTEXT_PASSAGE_OVERLAP = config('CONTEXT_PASSAGE_OVERLAP', cast=int, default=1)
+CONTEXT_MAX_PASSAGES = config('CONTEXT_MAX_PASSAGES', cast=int, default=0)
+
+# Chats
+# Janela (horas) em que um chat ativo pode ser retomado pelo validate
+CHAT_ACTIVE_WINDOW_HOURS = config('CHAT_ACTIVE_WINDOW_HOURS', cast=int, default=12)
+# Tempo (segundos) que a classificação "conversa encerrada" fica em cache por chat/última mensagem
+CHAT_FINISHED_CACHE_TTL = config('CHAT_FINISHED_CACHE_TTL', cast=int, default=60 * 60 * 12)
+# Transcript enviado ao classificador: últimas N mensagens e orçamento aproximado de tokens
+CHAT_TRANSCRIPT_MAX_MESSAGES = config('CHAT_TRANSCRIPT_MAX_MESSAGES', cast=int, default=30)
+CHAT_TRANSCRIPT_MAX_TOKENS = config('CHAT_TRANSCRIPT_MAX_TOKENS', cast=int, default=2000)
+# Limites padrão do ChatLogView (podem ser alterados por query string)
+CHAT_LOG_MAX_MESSAGES = config('CHAT_LOG_MAX_MESSAGES', cast=int, default=200)
+CHAT_LOG_MAX_TOKENS = config('CHAT_LOG_MAX_TOKENS', cast=int, default=0)
+# Estado de sessão do chat (chats.state): 'sync' grava a cada atualização;
+# 'write_behind' guarda no cache e grava em lote a cada ciclo do sweeper
+# (exige cache compartilhado; ver durabilidade em chats/state.py)
+CHAT_STATE_MODE = config('CHAT_STATE_MODE', default='sync')
+CHAT_STATE_TTL = config('CHAT_STATE_TTL', cast=int, default=60 * 60 * 24)
+# Arquivamento (comando archive_chats): chats inativos sem alteração há N dias
+# também são movidos para ArchivedChat/ArchivedMessage
+CHAT_ARCHIVE_AFTER_DAYS = config('CHAT_ARCHIVE_AFTER_DAYS', cast=int, default=30)
+# Busca full-text de mensagens (chats.search): tamanho padrão e máximo da página
+CHAT_SEARCH_PAGE_SIZE = config('CHAT_SEARCH_PAGE_SIZE', cast=int, default=20)
+CHAT_SEARCH_MAX_PAGE_SIZE = config('CHAT_SEARCH_MAX_PAGE_SIZE', cast=int, default=100)
+# Máximo de mensagens por requisição no endpoint de ingestão em lote
+CHAT_BULK_MAX_MESSAGES = config('CHAT_BULK_MAX_MESSAGES', cast=int, default=500)
+# Classificador local de encerramento: pares Input/Output analisados, confiança
+# mínima para dispensar a OpenAI e minutos sem mensagens que encerram a conversa
+CHAT_CLOSURE_WINDOW = config('CHAT_CLOSURE_WINDOW', cast=int, default=3)
+CHAT_CLOSURE_MIN_CONFIDENCE = config('CHAT_CLOSURE_MIN_CONFIDENCE', cast=float, default=0.5)
+CHAT_CLOSURE_IDLE_MINUTES = config('CHAT_CLOSURE_IDLE_MINUTES', cast=int, default=180)
+# Padrões customizados (mesmo formato de chats.functions.DEFAULT_CHAT_CLOSURE_PATTERNS)
+CHAT_CLOSURE_PATTERNS = None
+# Backend de encerramento: 'llm' (regras + OpenAI) ou 'local' (regras + modelo
+# treinado com `manage.py train_closure_model`, OpenAI só como fallback)
+CHAT_CLOSURE_BACKEND = config('CHAT_CLOSURE_BACKEND', default='llm')
+CHAT_CLOSURE_MODEL_PATH = config('CHAT_CLOSURE_MODEL_PATH', default=str(BASE_DIR / 'data' / 'chat_closure_model.json'))
+CHAT_CLOSURE_MODEL_MIN_CONFIDENCE = config('CHAT_CLOSURE_MODEL_MIN_CONFIDENCE', cast=float, default=0.8)
+
+# LLM (systems.llm)
+# Backend: 'openai' (API da OpenAI ou servidor compatível em LLM_BASE_URL, ex: o
+# stub local de `manage.py llm_stub_server`) ou 'stub' (respostas locais, sem rede)
+LLM_BACKEND = config('LLM_BACKEND', default='openai')
+LLM_BASE_URL = config('LLM_BASE_URL', default='https://api.openai.com/v1')
+LLM_API_KEY = config('OPENAI_API_KEY', default='')
+LLM_DEFAULT_MODEL = config('LLM_DEFAULT_MODEL', default='gpt-4.1-nano')
+LLM_CONNECT_TIMEOUT = config('LLM_CONNECT_TIMEOUT', cast=float, default=5)
+LLM_READ_TIMEOUT = config('LLM_READ_TIMEOUT', cast=float, default=30)
+LLM_MAX_RETRIES = config('LLM_MAX_RETRIES', cast=int, default=2)
+LLM_RETRY_BACKOFF = config('LLM_RETRY_BACKOFF', cast=float, default=0.5)
+LLM_POOL_SIZE = config('LLM_POOL_SIZE', cast=int, default=10)
+# Chamadas simultâneas por processo e espera máxima (s) por uma vaga
+LLM_MAX_CONCURRENCY = config('LLM_MAX_CONCURRENCY', cast=int, default=8)
+LLM_ACQUIRE_TIMEOUT = config('LLM_ACQUIRE_TIMEOUT', cast=float, default=10)
+# Cache de respostas para prompts idênticos com temperature=0 (0 desativa)
+LLM_CACHE_TTL = config('LLM_CACHE_TTL', cast=int, default=60 * 60)
+# Tempo (s) que o orçamento diário de cada cliente fica em cache
+LLM_BUDGET_CACHE_TTL = config('LLM_BUDGET_CACHE_TTL', cast=int, default=300)
+# Intervalo (s) para gravar no ledger, em lote, as respostas servidas pelo cache
+LLM_CACHED_FLUSH_INTERVAL = config('LLM_CACHED_FLUSH_INTERVAL', cast=int, default=60)
+LLM_STUB_RESPONSE = config('LLM_STUB_RESPONSE', default='false')
+LLM_STUB_LATENCY_MS = config('LLM_STUB_LATENCY_MS', cast=int, default=0)
@@ -32,6 +32,7 @@ urlpatterns = [
     
     path('api/v1/clients/', include('clients.urls', namespace='clients')),
     path('api/v1/chats/', include('chats.urls', namespace='chats')),
+    path('api/v1/common/', include('common.urls', namespace='common')),
     path('api/', include('systems.urls', namespace='systems')), 
 ]
 
@@ -1,7 +1,9 @@
 from django.contrib import admin
 from django.db.models import Q
-from chats.models import Chat, Message
+from django.db.models.expressions import RawSQL
+from chats.models import ArchivedChat, ArchivedMessage, Chat, ChatClosureLabel, Message
 from chats.resources import MessageResource, ChatResource
+from chats.search import search_subquery
 from import_export.admin import ImportExportModelAdmin
 
 
@@ -24,21 +26,41 @@ class MessageAdmin(ImportExportModelAdmin):
     # Campos pesquisáveis — apenas contact_id
     search_fields = ('contact_id',)
 
-    # Adiciona busca customizada no conteúdo
+    # Busca por parte do contact_id ou no conteúdo, pelo índice full-text
     def get_search_results(self, request, queryset, search_term):
         """
-        Permite buscar também dentro de content_input e content_output
-        sem precisar indexar diretamente esses campos (evita lentidão).
+        Busca o termo em contact_id (icontains, como o search_fields) ou dentro
+        de content_input/content_output pelo índice full-text (chats.search):
+        o conteúdo é comprimido e não aceita icontains.
         """
-        queryset, use_distinct = super().get_search_results(request, queryset, search_term)
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
 
-        if search_term:
-            queryset |= self.model.objects.filter(
-                Q(content_input__icontains=search_term) |
-                Q(content_output__icontains=search_term)
-            )
-
-        return queryset, use_distinct
+        sql, params = search_subquery(search_term)
+        queryset = queryset.filter(Q(contact_id__icontains=search_term) | Q(id__in=RawSQL(sql, params)))
+        return queryset, False
 
     # Exibe timestamp no formulário de detalhes (readonly)
     readonly_fields = ('timestamp',)
+
+@admin.register(ChatClosureLabel)
+class ChatClosureLabelAdmin(admin.ModelAdmin):
+    list_display = ('id', 'chat', 'last_message_id', 'finished', 'source', 'created_at')
+    list_filter = ('finished', 'source', 'created_at')
+    raw_id_fields = ('chat',)
+    readonly_fields = ('created_at',)
+
+@admin.register(ArchivedChat)
+class ArchivedChatAdmin(admin.ModelAdmin):
+    list_display = ('id', 'contact_id', 'status', 'created_at', 'archived_at')
+    search_fields = ('contact_id',)
+    list_filter = ('status', 'archived_at')
+    raw_id_fields = ('client', 'origin')
+
+@admin.register(ArchivedMessage)
+class ArchivedMessageAdmin(admin.ModelAdmin):
+    list_display = ('id', 'chat', 'contact_id', 'timestamp')
+    search_fields = ('contact_id',)
+    list_filter = ('timestamp',)
+    raw_id_fields = ('client', 'origin', 'chat')
@@ -4,3 +4,17 @@ from django.apps import AppConfig
 class ChatsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'chats'
+
+    def ready(self):
+        from django.conf import settings
+
+        # Signals que mantêm o índice full-text sincronizado com Message
+        import chats.search  # noqa: F401
+        from chats.state import check_chat_state_mode
+
+        check_chat_state_mode()
+
+        # Carrega o classificador local uma única vez, na subida do processo
+        if settings.CHAT_CLOSURE_BACKEND == 'local':
+            from chats.closure_model import get_closure_model
+            get_closure_model()
@@ -0,0 +1,89 @@
+"""
+Camada fria de chats: ArchivedChat / ArchivedMessage.
+
+Chats arquivados (ChatDeleteView) e chats inativos sem alteração há
+CHAT_ARCHIVE_AFTER_DAYS dias são movidos, em lotes transacionais, para as
+tabelas de arquivo mantendo os ids originais. Assim as tabelas quentes
+(Chat/Message) ficam proporcionais às conversas ativas. O ChatLogView lê as
+duas camadas. O conteúdo das mensagens é copiado já comprimido
+(CompressedTextField nas duas tabelas), sem descomprimir e comprimir de novo.
+"""
+import logging
+from chats.models import ArchivedChat, ArchivedMessage, Chat, Message
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import BinaryField, Q
+from django.db.models.functions import Cast
+from django.utils import timezone
+
+
+logger = logging.getLogger(__name__)
+
+CHAT_FIELDS = [
+    'id', 'client_id', 'origin_id', 'contact_id', 'flow', 'flow_option', 'room_availability',
+    'rooms', 'status', 'language', 'last_message_at', 'message_count', 'created_at', 'updated_at',
+]
+MESSAGE_FIELDS = [
+    'id', 'client_id', 'origin_id', 'chat_id', 'contact_id', 'external_id', 'timestamp',
+]
+# Bytes gravados do conteúdo (o Cast para BinaryField não passa pelo from_db_value)
+MESSAGE_CONTENT = {
+    'stored_input': Cast('content_input', BinaryField()),
+    'stored_output': Cast('content_output', BinaryField()),
+}
+
+
+def archive_chats(batch_size=200, older_than_days=None, message_batch_size=2000):
+    """
+    Move os chats arquivados/antigos e suas mensagens para a camada fria.
+
+    Cada lote de chats é copiado e removido das tabelas quentes em uma única
+    transação, com as linhas de Chat bloqueadas (select_for_update) para que
+    nenhuma mensagem nova seja inserida nesses chats no meio da cópia.
+
+    :param older_than_days: Idade mínima (dias sem alteração) dos chats inativos
+                            (padrão: settings.CHAT_ARCHIVE_AFTER_DAYS).
+    :return: Dicionário com os totais de chats e mensagens movidos.
+    """
+    if older_than_days is None:
+        older_than_days = settings.CHAT_ARCHIVE_AFTER_DAYS
+    threshold = timezone.now() - timedelta(days=older_than_days)
+
+    candidates = Chat.objects.filter(
+        Q(status='archived') | Q(status='inactive', updated_at__lt=threshold)
+    ).order_by('id').values_list('id', flat=True)
+
+    stats = {'chats': 0, 'messages': 0}
+    last_id = 0
+    while True:
+        batch = list(candidates.filter(id__gt=last_id)[:batch_size])
+        if not batch:
+            break
+        last_id = batch[-1]
+
+        with transaction.atomic():
+            chats = list(Chat.objects.select_for_update().filter(id__in=batch).order_by().values(*CHAT_FIELDS))
+            chat_ids = [chat['id'] for chat in chats]
+            ArchivedChat.objects.bulk_create([ArchivedChat(**chat) for chat in chats])
+
+            messages = Message.objects.filter(chat_id__in=chat_ids).order_by().values(*MESSAGE_FIELDS, **MESSAGE_CONTENT)
+            pending = []
+            for message in messages.iterator(chunk_size=message_batch_size):
+                pending.append(ArchivedMessage(
+                    content_input=message.pop('stored_input'), content_output=message.pop('stored_output'), **message
+                ))
+                if len(pending) >= message_batch_size:
+                    ArchivedMessage.objects.bulk_create(pending)
+                    stats['messages'] += len(pending)
+                    pending = []
+            if pending:
+                ArchivedMessage.objects.bulk_create(pending)
+                stats['messages'] += len(pending)
+
+            Message.objects.filter(chat_id__in=chat_ids).delete()
+            Chat.objects.filter(id__in=chat_ids).delete()
+            stats['chats'] += len(chat_ids)
+
+    logger.info(f"[Archive] {stats}")
+    return stats
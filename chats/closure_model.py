@@ -0,0 +1,220 @@
+"""
+Classificador local de encerramento de conversa.
+
+Regressão logística sobre n-gramas de palavras com hashing (feature hashing),
+em Python puro. É treinado com o comando `train_closure_model` a partir das
+decisões do LLM e salvo em JSON (settings.CHAT_CLOSURE_MODEL_PATH). Em produção
+o modelo é carregado uma única vez por processo e responde em microssegundos.
+"""
+import json
+import logging
+import math
+import random
+import re
+import threading
+import unicodedata
+import zlib
+from django.conf import settings
+from django.utils import timezone
+
+
+logger = logging.getLogger(__name__)
+
+MODEL_VERSION = 1
+DEFAULT_N_FEATURES = 2 ** 18
+
+_TOKEN_RE = re.compile(r"\w+|[?!]")
+
+_model = None
+_model_loaded = False
+_model_lock = threading.Lock()
+
+
+def _normalize(text):
+    text = unicodedata.normalize('NFD', text or '')
+    text = ''.join(c for c in text if unicodedata.category(c) != 'Mn')
+    return text.lower()
+
+
+def _hash(feature, n_features):
+    # crc32 é estável entre processos (hash() do Python não é)
+    return zlib.crc32(feature.encode('utf-8')) % n_features
+
+
+def featurize(pairs, n_features=DEFAULT_N_FEATURES):
+    """
+    Converte os últimos pares (content_input, content_output) em um vetor
+    esparso {índice: valor}. O par mais recente recebe features próprias
+    (prefixo 'last'), pois é o que mais indica o encerramento.
+    """
+    features = {}
+    total = len(pairs)
+    for position, (content_input, content_output) in enumerate(pairs):
+        scope = 'last' if position == total - 1 else 'prev'
+        for side, text in (('i', content_input), ('o', content_output)):
+            tokens = _TOKEN_RE.findall(_normalize(text))
+            if not tokens:
+                features[_hash(f'{scope}:{side}:<empty>', n_features)] = 1.0
+                continue
+            grams = tokens + [f'{a} {b}' for a, b in zip(tokens, tokens[1:])]
+            for gram in grams:
+                index = _hash(f'{scope}:{side}:{gram}', n_features)
+                features[index] = features.get(index, 0.0) + 1.0
+            if side == 'o' and tokens[-1] == '?':
+                index = _hash(f'{scope}:o:<ends_question>', n_features)
+                features[index] = 1.0
+
+    # Normalização L2 para que conversas longas não dominem o treino
+    norm = math.sqrt(sum(v * v for v in features.values())) or 1.0
+    return {index: value / norm for index, value in features.items()}
+
+
+def _sigmoid(z):
+    if z >= 0:
+        return 1.0 / (1.0 + math.exp(-z))
+    exp_z = math.exp(z)
+    return exp_z / (1.0 + exp_z)
+
+
+class ClosureModel:
+    def __init__(self, weights=None, bias=0.0, n_features=DEFAULT_N_FEATURES, window=3, metadata=None):
+        self.weights = weights or {}
+        self.bias = bias
+        self.n_features = n_features
+        self.window = window
+        self.metadata = metadata or {}
+
+    def predict_proba(self, pairs):
+        """Probabilidade de a conversa ter sido encerrada."""
+        features = featurize(pairs[-self.window:], self.n_features)
+        z = self.bias + sum(self.weights.get(index, 0.0) * value for index, value in features.items())
+        return _sigmoid(z)
+
+    @classmethod
+    def train(cls, samples, window=3, n_features=DEFAULT_N_FEATURES,
+              epochs=10, learning_rate=0.5, l2=1e-5, seed=42):
+        """
+        Treina com SGD.
+
+        :param samples: Lista de tuplas (pairs, finished: bool).
+        """
+        rng = random.Random(seed)
+        data = [(featurize(pairs[-window:], n_features), 1.0 if finished else 0.0) for pairs, finished in samples]
+
+        # Compensa desbalanceamento entre conversas encerradas e em aberto
+        positives = sum(1 for _, y in data if y) or 1
+        negatives = (len(data) - positives) or 1
+        class_weight = {1.0: len(data) / (2 * positives), 0.0: len(data) / (2 * negatives)}
+
+        weights = {}
+        bias = 0.0
+        for epoch in range(epochs):
+            rng.shuffle(data)
+            rate = learning_rate / (1 + epoch)
+            for features, y in data:
+                z = bias + sum(weights.get(i, 0.0) * v for i, v in features.items())
+                gradient = (_sigmoid(z) - y) * class_weight[y]
+                bias -= rate * gradient
+                for i, v in features.items():
+                    w = weights.get(i, 0.0)
+                    weights[i] = w - rate * (gradient * v + l2 * w)
+
+        weights = {i: w for i, w in weights.items() if abs(w) > 1e-6}
+        return cls(weights, bias, n_features, window, {
+            'trained_at': timezone.now().isoformat(),
+            'samples': len(data),
+            'positives': int(sum(y for _, y in data)),
+        })
+
+    def save(self, path):
+        payload = {
+            'version': MODEL_VERSION,
+            'n_features': self.n_features,
+            'window': self.window,
+            'bias': self.bias,
+            'weights': {str(i): round(w, 6) for i, w in self.weights.items()},
+            'metadata': self.metadata,
+        }
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(payload, f)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, encoding='utf-8') as f:
+            payload = json.load(f)
+        if payload.get('version') != MODEL_VERSION:
+            raise ValueError(f"Unsupported closure model version {payload.get('version')}")
+        return cls(
+            {int(i): w for i, w in payload['weights'].items()},
+            payload['bias'],
+            payload['n_features'],
+            payload['window'],
+            payload.get('metadata'),
+        )
+
+
+def evaluate(model, samples, threshold=0.5):
+    """
+    Relatório offline: acurácia, precisão, recall e F1 para a classe 'encerrada',
+    além da cobertura (fração respondida com a confiança mínima configurada).
+    """
+    tp = fp = tn = fn = 0
+    confident = 0
+    min_confidence = settings.CHAT_CLOSURE_MODEL_MIN_CONFIDENCE
+    for pairs, finished in samples:
+        proba = model.predict_proba(pairs)
+        predicted = proba >= threshold
+        if max(proba, 1 - proba) >= min_confidence:
+            confident += 1
+        if predicted and finished:
+            tp += 1
+        elif predicted and not finished:
+            fp += 1
+        elif not predicted and finished:
+            fn += 1
+        else:
+            tn += 1
+
+    total = tp + fp + tn + fn
+    precision = tp / (tp + fp) if tp + fp else 0.0
+    recall = tp / (tp + fn) if tp + fn else 0.0
+    return {
+        'samples': total,
+        'accuracy': (tp + tn) / total if total else 0.0,
+        'precision': precision,
+        'recall': recall,
+        'f1': 2 * precision * recall / (precision + recall) if precision + recall else 0.0,
+        'coverage': confident / total if total else 0.0,
+        'confusion': {'tp': tp, 'fp': fp, 'tn': tn, 'fn': fn},
+    }
+
+
+def get_closure_model():
+    """
+    Retorna o modelo carregado de settings.CHAT_CLOSURE_MODEL_PATH (uma vez por
+    processo) ou None se o arquivo não existir.
+    """
+    global _model, _model_loaded
+    if _model_loaded:
+        return _model
+    with _model_lock:
+        if not _model_loaded:
+            try:
+                _model = ClosureModel.load(settings.CHAT_CLOSURE_MODEL_PATH)
+                logger.info(f"[ClosureModel] modelo carregado de {settings.CHAT_CLOSURE_MODEL_PATH}")
+            except FileNotFoundError:
+                logger.warning(f"[ClosureModel] modelo não encontrado em {settings.CHAT_CLOSURE_MODEL_PATH}; usando o LLM")
+                _model = None
+            except Exception:
+                logger.exception("[ClosureModel] erro ao carregar modelo; usando o LLM")
+                _model = None
+            _model_loaded = True
+    return _model
+
+
+def reset_closure_model():
+    """Descarta o modelo em memória (usado após um novo treino)."""
+    global _model, _model_loaded
+    with _model_lock:
+        _model = None
+        _model_loaded = False
@@ -1,12 +1,32 @@
-import requests
-import os
-from decouple import config
+import logging
+import re
+from chats.closure_model import get_closure_model
+from chats.models import Chat, ChatClosureLabel, Message
+from chats.search import index_messages
+from chats.state import flush_chat_states
+from chats.transcripts import build_classification_transcript
+from common import metrics
+from common.origins import resolve_origin
+from datetime import timedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.db import router, transaction
+from django.db.models import F, Max, Q, sql
+from django.db.models.constants import OnConflict
+from django.utils import timezone
+from functools import lru_cache
+from systems.llm import LLMError, budget_exceeded, chat_completion
 
 
-def get_chat_finished(chat_log):
+logger = logging.getLogger(__name__)
+
+
+def get_chat_finished(chat_log, client=None):
     """
     Envia um chat_log para a API da OpenAI e retorna 'true' ou 'false'
     dependendo se a conversa foi encerrada.
+
+    :param client: Client (ou id) a quem a chamada é atribuída no ledger de uso do LLM.
     """
 
     if not chat_log:
@@ -16,45 +36,519 @@ def get_chat_finished(chat_log):
     if not isinstance(chat_log, str):
         return "Invalid chat log format. Expected a string."
 
-    # OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
-    OPENAI_API_KEY = config('OPENAI_API_KEY')
-    if not OPENAI_API_KEY:
-        raise RuntimeError("OPENAI_API_KEY não configurada")
-
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {OPENAI_API_KEY}",
-    }    
-    url = "https://api.openai.com/v1/chat/completions"
-
-    # Monta payload
-    payload = {
-        "model": "gpt-4.1-nano",
-        "messages": [
-            {
-                "role": "system", 
-                "content": "Você é um classificador. Você deverá analisar o content e entender se ao final da conversa ela foi encerrada. Responda apenas 'true' ou 'false'.\
-            Responda 'true' se a conversa claramente foi encerrada, ou 'false' caso contrário."
-            },
-            {
-                "role": "user", 
-                "content": chat_log
-            }
-        ],
-        "temperature": 0,  # resposta determinística
-        "max_tokens": 5    # garante que só venha 'true' ou 'false'
+    messages = [
+        {
+            "role": "system", 
+            "content": "Você é um classificador. Você deverá analisar o content e entender se ao final da conversa ela foi encerrada. Responda apenas 'true' ou 'false'.\
+        Responda 'true' se a conversa claramente foi encerrada, ou 'false' caso contrário."
+        },
+        {
+            "role": "user", 
+            "content": chat_log
+        }
+    ]
+
+    try:
+        result = chat_completion(
+            messages,
+            model="gpt-4.1-nano",
+            temperature=0,  # resposta determinística
+            max_tokens=5,   # garante que só venha 'true' ou 'false'
+            client=client,
+            purpose='chat_closure'
+        )
+    except LLMError as e:
+        logger.error(f"Erro ao enviar para OpenAI: {e}")
+        return False
+
+    resposta = result.content.strip().lower()
+    logger.debug(f"Resposta da OpenAI: {resposta} (cache={result.cached}, {result.latency_ms} ms)")
+    return resposta
+
+
+# Padrões de encerramento (português e espanhol). Podem ser sobrescritos em
+# settings.CHAT_CLOSURE_PATTERNS com o mesmo formato: (regex, peso).
+# Peso positivo indica conversa encerrada, negativo indica conversa em aberto.
+DEFAULT_CHAT_CLOSURE_PATTERNS = {
+    # Mensagens do usuário (content_input)
+    'input': [
+        (r'\b(muito )?obrigad[oa]s?\b', 0.5),
+        (r'\b(muchas )?gracias\b', 0.5),
+        (r'\bvaleu\b', 0.5),
+        (r'\b(tchau|chau|adios|adiós)\b', 0.7),
+        (r'\b(até (logo|mais|breve)|hasta (luego|pronto|mañana))\b', 0.7),
+        (r'\b(perfeito|perfecto|listo|combinado|ok|okay|beleza|dale)\b', 0.2),
+        (r'\?', -0.6),
+        (r'\b(quero|quiero|gostaria|quisiera|preciso|necesito|tem|tiene|hay|cuanto|cuánto|quanto|qual|cual|cuál|como|cómo|onde|donde|dónde)\b', -0.4),
+    ],
+    # Respostas do bot (content_output)
+    'output': [
+        (r'\breserva (foi )?(confirmada|realizada|efetuada)\b', 0.6),
+        (r'\breserva (fue )?(confirmada|realizada|efectuada)\b', 0.6),
+        (r'\b(c[oó]digo|n[uú]mero) de (la )?reserva\b', 0.3),
+        (r'\b(tenha|tenga) (um|un) (ótimo|otimo|excelente|buen|lindo) (dia|día)\b', 0.5),
+        (r'\b(estamos|quedamos) (à|a) (disposição|disposicao|disposición|disposicion)\b', 0.3),
+        (r'\?\s*$', -0.6),
+    ],
+}
+
+metrics.declare(
+    'chat_finished_cache.hit', 'chat_finished_cache.miss',
+    'chat_closure_rules.hit', 'chat_closure_rules.miss',
+    'chat_closure_model.hit', 'chat_closure_model.miss',
+    'chat_closure.budget_fallback',
+)
+
+
+@lru_cache(maxsize=1)
+def _compiled_closure_patterns():
+    patterns = getattr(settings, 'CHAT_CLOSURE_PATTERNS', None) or DEFAULT_CHAT_CLOSURE_PATTERNS
+    return {
+        side: [(re.compile(regex, re.IGNORECASE), weight) for regex, weight in patterns.get(side, [])]
+        for side in ('input', 'output')
     }
 
-    response = requests.post(url, headers=headers, json=payload)
 
-    if response.status_code == 200:
-        result = response.json()
-        resposta = result["choices"][0]["message"]["content"].strip().lower()
-        print("Resposta da OpenAI:", resposta)
-        return resposta
+def _score_text(text, patterns):
+    if not text:
+        return 0.0
+    text = text.strip()
+    return sum(weight for regex, weight in patterns if regex.search(text))
+
+
+def classify_chat_closure(pairs, idle_seconds):
+    """
+    Classificador local e determinístico de encerramento de conversa.
+
+    Pontua os últimos pares (content_input, content_output) contra os padrões
+    de encerramento e considera o tempo sem mensagens. O par mais recente pesa
+    mais que os anteriores.
+
+    :param pairs: Lista de tuplas (content_input, content_output), da mais antiga para a mais recente.
+    :param idle_seconds: Segundos desde a última mensagem.
+    :return: Tupla (decisão, confiança). decisão é 'true', 'false' ou None
+             quando a confiança é baixa e a decisão deve ficar com o LLM.
+    """
+    idle_limit = settings.CHAT_CLOSURE_IDLE_MINUTES * 60
+    if idle_seconds >= idle_limit:
+        return 'true', 1.0
+
+    if not pairs:
+        return None, 0.0
+
+    patterns = _compiled_closure_patterns()
+    score = 0.0
+    weight = 1.0
+    for content_input, content_output in reversed(pairs):
+        score += weight * (
+            _score_text(content_input, patterns['input']) +
+            _score_text(content_output, patterns['output'])
+        )
+        weight /= 2
+
+    # Silêncio parcial reforça o encerramento
+    score += 0.3 * (idle_seconds / idle_limit)
+
+    confidence = min(abs(score), 1.0)
+    if confidence < settings.CHAT_CLOSURE_MIN_CONFIDENCE:
+        return None, confidence
+    return ('true' if score > 0 else 'false'), confidence
+
+
+def classify_with_local_model(pairs, min_confidence=None):
+    """
+    Classifica com o modelo local treinado. Retorna 'true'/'false' ou None
+    quando não há modelo ou a probabilidade está na faixa de incerteza.
+    """
+    if min_confidence is None:
+        min_confidence = settings.CHAT_CLOSURE_MODEL_MIN_CONFIDENCE
+
+    model = get_closure_model()
+    if model is None:
+        metrics.incr('chat_closure_model.miss')
+        return None
+
+    proba = model.predict_proba(pairs)
+    if max(proba, 1 - proba) < min_confidence:
+        metrics.incr('chat_closure_model.miss')
+        return None
+
+    metrics.incr('chat_closure_model.hit')
+    return 'true' if proba >= 0.5 else 'false'
+
+
+def record_closure_label(chat_id, last_message_id, pairs, chat_finished):
+    """
+    Grava a decisão do LLM como rótulo de treino. Falhas não interrompem a requisição.
+    """
+    if not isinstance(chat_finished, str) or not ('true' in chat_finished or 'false' in chat_finished):
+        return
+    try:
+        ChatClosureLabel.objects.create(
+            chat_id=chat_id,
+            last_message_id=last_message_id,
+            pairs=[list(pair) for pair in pairs],
+            finished='true' in chat_finished,
+            source='llm'
+        )
+    except Exception:
+        logger.exception("[ChatFinished] erro ao gravar rótulo de encerramento")
+
+
+def build_chat_log(messages):
+    """
+    Monta o chat_log (Input/Output) enviado ao classificador, limitado às
+    últimas mensagens (CHAT_TRANSCRIPT_MAX_MESSAGES / CHAT_TRANSCRIPT_MAX_TOKENS).
+    """
+    transcript, _, _ = build_classification_transcript(messages)
+    return (
+        transcript +
+        "\n\nAnalisando os inputs e outputs, que é uma conversa, essa conversa foi encerrada? Você deve apenas responder com True ou False."
+    )
+
+
+def get_chat_finished_cached(chat_id, messages, last_message, client_id=None):
+    """
+    Decide se a conversa foi encerrada, evitando a OpenAI sempre que possível.
+
+    1. Cache por chat e última mensagem (id, timestamp): enquanto nenhuma
+       mensagem nova chegar, a resposta anterior é reaproveitada.
+    2. Classificador local por regras (classify_chat_closure): resolve os
+       casos óbvios (agradecimento, despedida, reserva confirmada, silêncio).
+    3. Com CHAT_CLOSURE_BACKEND = 'local', o modelo treinado localmente
+       (chats.closure_model), quando tiver confiança suficiente.
+    4. get_chat_finished (OpenAI) como fallback. As decisões do LLM são
+       gravadas em ChatClosureLabel para os próximos treinos. Se o cliente
+       já consumiu o orçamento diário do LLM, a decisão fica com o caminho
+       local: o modelo (se houver) mesmo com confiança baixa ou, sem ele,
+       a conversa é mantida aberta.
+
+    :param chat_id: ID do chat.
+    :param messages: QuerySet das mensagens da conversa, ordenado por timestamp.
+    :param last_message: Tupla (id, timestamp) da última Message de messages.
+    :param client_id: ID do cliente, para o ledger e o orçamento do LLM.
+    """
+    last_message_id, last_timestamp = last_message
+    cache_key = f"chat_finished:{chat_id}:{last_message_id}:{last_timestamp.timestamp()}"
+
+    cached = cache.get(cache_key)
+    if cached is not None:
+        metrics.incr('chat_finished_cache.hit')
+        logger.debug(f"[ChatFinished] cache hit chat={chat_id} last_message={last_message_id}")
+        return cached
+    metrics.incr('chat_finished_cache.miss')
+
+    window = settings.CHAT_CLOSURE_WINDOW
+    recent_pairs = list(messages.reverse().values_list('content_input', 'content_output')[:window])
+    recent_pairs.reverse()
+    idle_seconds = (timezone.now() - last_timestamp).total_seconds()
+
+    chat_finished, confidence = classify_chat_closure(recent_pairs, idle_seconds)
+    if chat_finished is not None:
+        metrics.incr('chat_closure_rules.hit')
+        logger.debug(f"[ChatFinished] regras chat={chat_id} -> {chat_finished} (confiança {confidence:.2f})")
     else:
-        print("Erro ao enviar para OpenAI:", response.status_code, response.text)
-        return False
+        metrics.incr('chat_closure_rules.miss')
+        chat_finished = None
+        if settings.CHAT_CLOSURE_BACKEND == 'local':
+            chat_finished = classify_with_local_model(recent_pairs)
+        if chat_finished is None and budget_exceeded(client_id):
+            metrics.incr('chat_closure.budget_fallback')
+            logger.info(f"[ChatFinished] orçamento do LLM esgotado (cliente {client_id}); usando caminho local")
+            chat_finished = classify_with_local_model(recent_pairs, min_confidence=0)
+            if chat_finished is None:
+                # Sem evidência suficiente a conversa continua aberta; a expiração
+                # por inatividade encerra o chat depois
+                chat_finished = 'false'
+        if chat_finished is None:
+            chat_finished = get_chat_finished(build_chat_log(messages), client=client_id)
+            record_closure_label(chat_id, last_message_id, recent_pairs, chat_finished)
+
+    # Só guarda respostas válidas; erros da API devem ser tentados de novo
+    if isinstance(chat_finished, str) and ('true' in chat_finished or 'false' in chat_finished):
+        cache.set(cache_key, chat_finished, settings.CHAT_FINISHED_CACHE_TTL)
+
+    return chat_finished
+
+
+
+def touch_chat_activity(chat_id, last_message_at, count=1):
+    """
+    Atualiza os contadores desnormalizados do chat (last_message_at e
+    message_count) com um único UPDATE atômico (F()), sem ler a linha.
+    Deve rodar na mesma transação que insere as mensagens.
+    """
+    return Chat.objects.filter(id=chat_id).update(
+        last_message_at=last_message_at,
+        message_count=F('message_count') + count
+    )
+
+
+def find_messages_by_external_id(client, keys):
+    """
+    Busca, em uma consulta, mensagens já gravadas do cliente pelo ID do provedor.
+
+    :param keys: Conjunto de tuplas (origin_id, external_id).
+    :return: Dicionário {(origin_id, external_id): (message_id, timestamp)}.
+    """
+    if not keys:
+        return {}
+    by_origin = {}
+    for origin_id, external_id in keys:
+        by_origin.setdefault(origin_id, set()).add(external_id)
+    # (client, origin, external_id): mesmo prefixo das constraints de unicidade
+    condition = Q()
+    for origin_id, external_ids in by_origin.items():
+        origin = Q(origin__isnull=True) if origin_id is None else Q(origin_id=origin_id)
+        condition |= origin & Q(external_id__in=external_ids)
+    rows = Message.objects.filter(condition, client=client).values_list('origin_id', 'external_id', 'id', 'timestamp')
+    return {
+        (origin_id, external_id): (message_id, timestamp)
+        for origin_id, external_id, message_id, timestamp in rows
+        if (origin_id, external_id) in keys
+    }
+
+
+def _insert_ignoring_conflicts(messages, batch_size=500):
+    """
+    INSERT das mensagens ignorando conflitos nas constraints de external_id
+    (ON CONFLICT DO NOTHING / INSERT OR IGNORE) com RETURNING: só as linhas
+    inseridas voltam, então a origem de cada linha não depende de comparar
+    timestamps. O bulk_create com ignore_conflicts não retorna os ids.
+
+    :return: Dicionário {(origin_id, external_id): id} das mensagens inseridas.
+    """
+    opts = Message._meta
+    fields = [field for field in opts.concrete_fields if not field.primary_key]
+    returning = [opts.pk, opts.get_field('origin'), opts.get_field('external_id')]
+    created = {}
+    for start in range(0, len(messages), batch_size):
+        query = sql.InsertQuery(Message, on_conflict=OnConflict.IGNORE)
+        query.insert_values(fields, messages[start:start + batch_size])
+        rows = query.get_compiler(using=router.db_for_write(Message)).execute_sql(returning)
+        # Com uma única linha ignorada o RETURNING volta vazio (None)
+        for message_id, origin_id, external_id in filter(None, rows):
+            created[(origin_id, external_id)] = message_id
+    return created
+
+
+def _message_item_error(item):
+    """Erro de validação de um item de ingest_messages, ou None."""
+    if not isinstance(item, dict):
+        return 'Item must be an object'
+    if not item.get('chat_id') or not item.get('contact_id'):
+        return 'chat_id and contact_id are required'
+    # bool é subclasse de int e não é um id válido
+    if isinstance(item['contact_id'], bool) or not isinstance(item['contact_id'], (str, int)):
+        return 'contact_id must be a string or an integer'
+    for field in ('content_input', 'content_output'):
+        if item.get(field) is not None and not isinstance(item[field], str):
+            return f'{field} must be a string or null'
+    external_id = item.get('external_id')
+    if external_id is not None and (isinstance(external_id, bool) or not isinstance(external_id, (str, int))):
+        return 'external_id must be a string or an integer'
+    return None
+
+
+def ingest_messages(client, items):
+    """
+    Insere um lote de mensagens de um cliente com um número fixo de consultas:
+    origens vêm do registro em memória, chats são resolvidos uma única vez, as mensagens entram com
+    bulk_create e os contadores de cada chat com um UPDATE por chat, tudo na
+    mesma transação. Também é o caminho do MessageCreateView (lote de um item).
+
+    Cada item segue o corpo do MessageCreateView (chat_id, contact_id e,
+    opcionalmente, origin, content_input, content_output e external_id); itens
+    inválidos (campos ausentes ou de tipo errado) retornam um erro próprio sem
+    afetar os demais. Cada mensagem é indexada na busca full-text
+    (chats.search) na mesma transação. Origem
+    desconhecida é gravada como nula, como no endpoint unitário. Itens com um
+    external_id já gravado (ou repetido no próprio lote) não são inseridos de
+    novo: retornam a mensagem existente com 'duplicate': True. Os itens com
+    external_id entram em um único INSERT que ignora conflitos e retorna as
+    linhas inseridas (_insert_ignoring_conflicts), então retries concorrentes
+    não geram linhas duplicadas nem IntegrityError.
+
+    :param client: Client autenticado.
+    :param items: Lista de dicionários.
+    :return: Lista de resultados na ordem dos itens: {'index', 'message_id',
+             'timestamp'[, 'duplicate']} ou {'index', 'error'}.
+    """
+    results = [None] * len(items)
+
+    chat_ids = set()
+    for item in items:
+        if isinstance(item, dict) and str(item.get('chat_id', '')).isdigit():
+            chat_ids.add(int(item['chat_id']))
+    chats = set(Chat.objects.filter(id__in=chat_ids, client=client).values_list('id', flat=True))
+
+    pending = []
+    for index, item in enumerate(items):
+        error = _message_item_error(item)
+        if error:
+            results[index] = {'index': index, 'error': error}
+            continue
+        chat_id = int(item['chat_id']) if str(item['chat_id']).isdigit() else None
+        if chat_id not in chats:
+            results[index] = {'index': index, 'error': 'Chat not found for this client'}
+            continue
+
+        origin = resolve_origin(item.get('origin'))
+        pending.append((index, Message(
+            client=client,
+            origin_id=origin.id if origin else None,
+            chat_id=chat_id,
+            contact_id=str(item['contact_id']),
+            content_input=item.get('content_input'),
+            content_output=item.get('content_output'),
+            external_id=str(item['external_id']) if item.get('external_id') else None
+        )))
+
+    if not pending:
+        return results
+
+    # Retries já gravados saem sem escrever nada
+    existing = find_messages_by_external_id(
+        client, {(message.origin_id, message.external_id) for _, message in pending if message.external_id}
+    )
+    plain = []
+    keyed = []
+    repeated = []
+    seen = {}
+    for index, message in pending:
+        key = (message.origin_id, message.external_id)
+        if not message.external_id:
+            plain.append((index, message))
+        elif key in existing:
+            message_id, timestamp = existing[key]
+            results[index] = {'index': index, 'message_id': message_id, 'timestamp': timestamp, 'duplicate': True}
+        elif key in seen:
+            repeated.append((index, seen[key]))
+        else:
+            seen[key] = index
+            keyed.append((index, message))
+
+    with transaction.atomic():
+        inserted = []
+        if plain:
+            Message.objects.bulk_create([message for _, message in plain], batch_size=500)
+            inserted.extend(plain)
+        if keyed:
+            created = _insert_ignoring_conflicts([message for _, message in keyed])
+            # As linhas que não voltaram no RETURNING foram gravadas por um retry
+            # concorrente depois da verificação acima: relê essas pela chave
+            conflicts = {(message.origin_id, message.external_id) for _, message in keyed} - created.keys()
+            stored = find_messages_by_external_id(client, conflicts)
+            for index, message in keyed:
+                key = (message.origin_id, message.external_id)
+                if key in created:
+                    message.id = created[key]
+                    inserted.append((index, message))
+                else:
+                    message_id, timestamp = stored[key]
+                    results[index] = {'index': index, 'message_id': message_id, 'timestamp': timestamp, 'duplicate': True}
+
+        # bulk_create não dispara o post_save que indexa as mensagens
+        index_messages((message.id, message.content_input, message.content_output) for _, message in inserted)
+
+        activity = {}
+        for _, message in inserted:
+            count, last_message_at = activity.get(message.chat_id, (0, message.timestamp))
+            activity[message.chat_id] = (count + 1, max(last_message_at, message.timestamp))
+        for chat_id, (count, last_message_at) in activity.items():
+            touch_chat_activity(chat_id, last_message_at, count)
+
+    for index, message in inserted:
+        results[index] = {'index': index, 'message_id': message.id, 'timestamp': message.timestamp}
+    for index, first in repeated:
+        results[index] = {**results[first], 'index': index, 'duplicate': True}
+
+    return results
+
+
+def sweep_active_chats(batch_size=200):
+    """
+    Job periódico de encerramento de conversas (ver comando sweep_chats).
+
+    0. Grava o estado de sessão pendente dos chats (chats.state, modo write_behind).
+    1. Expira chats ativos criados antes da janela CHAT_ACTIVE_WINDOW_HOURS.
+    2. Expira chats ativos sem mensagens há CHAT_CLOSURE_IDLE_MINUTES, direto
+       pela coluna Chat.last_message_at, sem ler as mensagens.
+    3. Classifica, em lotes, os demais chats ativos com mensagens
+       (cache -> regras -> modelo local -> OpenAI) e marca como 'inactive'
+       os encerrados com um único UPDATE por lote. Chats cuja última mensagem
+       já foi classificada (last_classified_message_id) são pulados, e um chat
+       que recebeu mensagem durante a classificação (last_message_at ou
+       message_count diferentes dos lidos) não é encerrado.
+
+    Com isso o ChatCreateOrExistsView só precisa procurar um chat ativo.
+
+    :return: Dicionário com os totais de chats expirados, ociosos, analisados e encerrados.
+    """
+    # Estado de sessão pendente (modo write_behind) é gravado antes de encerrar conversas
+    state_flushed = flush_chat_states()
+
+    now = timezone.now()
+    time_threshold = now - timedelta(hours=settings.CHAT_ACTIVE_WINDOW_HOURS)
+    idle_threshold = now - timedelta(minutes=settings.CHAT_CLOSURE_IDLE_MINUTES)
+
+    expired = Chat.objects.filter(status='active', created_at__lt=time_threshold).update(
+        status='inactive', updated_at=now
+    )
+    idle = Chat.objects.filter(status='active').filter(
+        Q(last_message_at__lt=idle_threshold) |
+        Q(last_message_at__isnull=True, created_at__lt=idle_threshold)
+    ).update(status='inactive', updated_at=now)
+
+    stats = {'state_flushed': state_flushed, 'expired': expired, 'idle': idle, 'checked': 0, 'skipped': 0, 'finished': 0}
+    active_chats = Chat.objects.filter(
+        status='active', created_at__gte=time_threshold, last_message_at__isnull=False
+    ).order_by('id').values_list('id', 'client_id', 'last_message_at', 'message_count', 'last_classified_message_id')
+
+    last_id = 0
+    while True:
+        batch = list(active_chats.filter(id__gt=last_id)[:batch_size])
+        if not batch:
+            break
+        last_id = batch[-1][0]
+
+        # Última mensagem de cada chat do lote em uma consulta
+        last_message_ids = dict(
+            Message.objects.filter(chat_id__in=[row[0] for row in batch]).values('chat_id').annotate(
+                last_message_id=Max('id')
+            ).values_list('chat_id', 'last_message_id')
+        )
+
+        finished = Q()
+        classified = []
+        for chat_id, client_id, last_message_at, message_count, last_classified_message_id in batch:
+            message_id = last_message_ids.get(chat_id)
+            if message_id is None or message_id == last_classified_message_id:
+                stats['skipped'] += 1
+                continue
+
+            messages = Message.objects.filter(chat_id=chat_id).order_by('timestamp')
+            try:
+                chat_finished = get_chat_finished_cached(chat_id, messages, (message_id, last_message_at), client_id)
+            except Exception:
+                logger.exception(f"[Sweeper] erro ao classificar chat {chat_id}")
+                continue
+            stats['checked'] += 1
+            if isinstance(chat_finished, str) and 'true' in chat_finished.lower():
+                # Só encerra se nenhuma mensagem chegou depois da leitura do lote
+                finished |= Q(id=chat_id, last_message_at=last_message_at, message_count=message_count)
+            elif isinstance(chat_finished, str) and 'false' in chat_finished.lower():
+                classified.append(Chat(id=chat_id, last_classified_message_id=message_id))
+
+        if finished:
+            stats['finished'] += Chat.objects.filter(finished, status='active').update(
+                status='inactive', updated_at=timezone.now()
+            )
+        if classified:
+            Chat.objects.bulk_update(classified, ['last_classified_message_id'])
+
+    logger.info(f"[Sweeper] {stats}")
+    return stats
 
 
 
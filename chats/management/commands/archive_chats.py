@@ -0,0 +1,21 @@
+from chats.archive import archive_chats
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = (
+        "Move chats arquivados e chats inativos antigos (com suas mensagens) para as tabelas "
+        "ArchivedChat/ArchivedMessage, em lotes transacionais. Rodar via cron."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=200, help="Chats por transação")
+        parser.add_argument(
+            '--older-than-days', type=int, default=settings.CHAT_ARCHIVE_AFTER_DAYS,
+            help="Dias sem alteração para mover chats inativos"
+        )
+
+    def handle(self, *args, **options):
+        stats = archive_chats(batch_size=options['batch_size'], older_than_days=options['older_than_days'])
+        self.stdout.write(f"[archive_chats] chats={stats['chats']} mensagens={stats['messages']}")
@@ -0,0 +1,130 @@
+import random
+import uuid
+from chats.models import Chat, Message
+from clients.models import Client
+from common.models import Origin
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+
+class Command(BaseCommand):
+    help = (
+        "Imprime o EXPLAIN das consultas quentes de chats e mensagens (validate, chat/log, sweeper) "
+        "e aponta as que fazem varredura completa da tabela. Com --synthetic, gera um volume "
+        "realista de dados dentro de uma transação que é desfeita ao final."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--synthetic', type=int, default=0, help="Quantidade de mensagens sintéticas a gerar")
+        parser.add_argument('--contacts', type=int, default=2000, help="Contatos distintos nos dados sintéticos")
+        parser.add_argument('--chats-per-contact', type=int, default=3)
+        parser.add_argument('--analyze', action='store_true', help="EXPLAIN ANALYZE (apenas PostgreSQL)")
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            if options['synthetic']:
+                self._generate(options['synthetic'], options['contacts'], options['chats_per_contact'])
+                with connection.cursor() as cursor:
+                    cursor.execute('ANALYZE')
+
+            full_scans = self._explain_all(options['analyze'])
+
+            # Os dados sintéticos nunca são gravados
+            transaction.set_rollback(True)
+
+        if full_scans:
+            self.stdout.write(self.style.WARNING(f"Varredura completa em: {', '.join(full_scans)}"))
+        else:
+            self.stdout.write(self.style.SUCCESS("Todas as consultas usam índice"))
+
+    def _generate(self, total_messages, contacts, chats_per_contact):
+        client = Client.objects.create(
+            name='explain', business_name='explain', phone='0', contact='explain',
+            email=f'explain-{uuid.uuid4().hex}@example.com', api_token=uuid.uuid4().hex, monthly_fee=0
+        )
+        origin = Origin.objects.create(name=f'explain-{uuid.uuid4().hex[:8]}')
+
+        rng = random.Random(42)
+        contact_ids = [f'55{rng.randrange(10 ** 10, 10 ** 11)}' for _ in range(contacts)]
+        statuses = ['inactive'] * (chats_per_contact - 1) + ['active']
+
+        chats = Chat.objects.bulk_create(
+            [
+                Chat(client=client, origin=origin, contact_id=contact_id, status=status)
+                for contact_id in contact_ids
+                for status in statuses
+            ],
+            batch_size=2000
+        )
+
+        batch = []
+        for i in range(total_messages):
+            chat = chats[rng.randrange(len(chats))]
+            batch.append(Message(
+                client=client, origin=origin, chat=chat, contact_id=chat.contact_id,
+                content_input=f'mensagem {i}', content_output=f'resposta {i}'
+            ))
+            if len(batch) == 5000:
+                Message.objects.bulk_create(batch)
+                batch = []
+        if batch:
+            Message.objects.bulk_create(batch)
+
+        self.stdout.write(f"Gerados {len(chats)} chats e {total_messages} mensagens ({contacts} contatos)")
+
+    def _hot_queries(self):
+        sample = Message.objects.order_by('-id').values_list('client_id', 'origin_id', 'contact_id', 'chat_id').first()
+        if sample is None:
+            return []
+        client_id, origin_id, contact_id, chat_id = sample
+        now = timezone.now()
+        time_threshold = now - timedelta(hours=settings.CHAT_ACTIVE_WINDOW_HOURS)
+        idle_threshold = now - timedelta(minutes=settings.CHAT_CLOSURE_IDLE_MINUTES)
+
+        return [
+            ('validate', Chat.objects.filter(
+                Q(last_message_at__gte=idle_threshold) |
+                Q(last_message_at__isnull=True, created_at__gte=idle_threshold),
+                client_id=client_id,
+                origin_id=origin_id,
+                contact_id=contact_id,
+                status='active', created_at__gte=time_threshold
+            )[:1]),
+            ('messages_recent_contact', Message.objects.filter(
+                contact_id=contact_id, timestamp__gte=time_threshold
+            ).order_by('timestamp')),
+            ('chat_log', Message.objects.filter(
+                client_id=client_id, origin_id=origin_id, contact_id=contact_id
+            ).order_by('-timestamp')[:200]),
+            ('closure_transcript', Message.objects.filter(chat_id=chat_id).order_by('-timestamp')[:30]),
+            ('sweeper_expire', Chat.objects.filter(status='active', created_at__lt=time_threshold).order_by().values('id')),
+        ]
+
+    def _explain_all(self, analyze):
+        queries = self._hot_queries()
+        if not queries:
+            self.stdout.write(self.style.WARNING("Sem mensagens na base; use --synthetic"))
+            return []
+
+        explain_options = {'analyze': True} if analyze and connection.vendor == 'postgresql' else {}
+        full_scans = []
+        for name, queryset in queries:
+            plan = queryset.explain(**explain_options)
+            self.stdout.write(self.style.MIGRATE_HEADING(f"== {name}"))
+            self.stdout.write(plan)
+            if self._is_full_scan(plan):
+                full_scans.append(name)
+        return full_scans
+
+    def _is_full_scan(self, plan):
+        for line in plan.splitlines():
+            if connection.vendor == 'postgresql' and 'Seq Scan on' in line:
+                return True
+            # SQLite: "SCAN <tabela>" sem índice (com índice aparece "USING INDEX")
+            if connection.vendor == 'sqlite' and ' SCAN ' in f' {line.strip()} ' and 'USING' not in line:
+                return True
+        return False
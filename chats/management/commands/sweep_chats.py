@@ -0,0 +1,26 @@
+import time
+from chats.functions import sweep_active_chats
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = (
+        "Encerra conversas em background: expira chats fora da janela de atividade e marca "
+        "como 'inactive' os chats classificados como encerrados. Rodar via cron ou com --loop."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=200)
+        parser.add_argument('--loop', action='store_true', help="Executa continuamente")
+        parser.add_argument('--interval', type=int, default=60, help="Segundos entre execuções com --loop")
+
+    def handle(self, *args, **options):
+        while True:
+            stats = sweep_active_chats(batch_size=options['batch_size'])
+            self.stdout.write(
+                f"[sweep_chats] estados_gravados={stats['state_flushed']} expirados={stats['expired']} ociosos={stats['idle']} "
+                f"analisados={stats['checked']} pulados={stats['skipped']} encerrados={stats['finished']}"
+            )
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,129 @@
+import json
+import random
+import zlib
+from chats.closure_model import ClosureModel, evaluate, reset_closure_model
+from chats.models import Chat, ChatClosureLabel, Message
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from itertools import groupby
+
+
+class Command(BaseCommand):
+    help = (
+        "Treina o classificador local de encerramento de conversa com as decisões do LLM "
+        "(ChatClosureLabel) e com o histórico de chats, e imprime um relatório de avaliação."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--source', choices=['labels', 'history', 'all'], default='all',
+            help="labels: decisões gravadas do LLM; history: fronteiras entre chats do mesmo contato"
+        )
+        parser.add_argument('--days', type=int, default=90, help="Janela de histórico considerada")
+        parser.add_argument('--eval-split', type=float, default=0.2, help="Fração separada para avaliação")
+        parser.add_argument('--epochs', type=int, default=10)
+        parser.add_argument('--max-negatives-per-chat', type=int, default=3)
+        parser.add_argument('--output', default=settings.CHAT_CLOSURE_MODEL_PATH)
+        parser.add_argument('--evaluate-only', action='store_true', help="Apenas avalia o modelo salvo em --output")
+
+    def handle(self, *args, **options):
+        since = timezone.now() - timedelta(days=options['days'])
+        window = settings.CHAT_CLOSURE_WINDOW
+
+        samples = []
+        if options['source'] in ('labels', 'all'):
+            samples += self._label_samples(since)
+        if options['source'] in ('history', 'all'):
+            samples += self._history_samples(since, window, options['max_negatives_per_chat'])
+
+        if not samples:
+            raise CommandError("Nenhuma amostra encontrada para treino")
+
+        self.stdout.write(
+            f"{len(samples)} amostra(s): {sum(1 for _, _, y in samples if y)} encerrada(s), "
+            f"{sum(1 for _, _, y in samples if not y)} em aberto"
+        )
+
+        if options['evaluate_only']:
+            model = ClosureModel.load(options['output'])
+            self._report(evaluate(model, [(pairs, y) for _, pairs, y in samples]))
+            return
+
+        train, test = self._split(samples, options['eval_split'])
+        self.stdout.write(f"{len(train)} amostra(s) de treino, {len(test)} de avaliação")
+
+        model = ClosureModel.train(train, window=window, epochs=options['epochs'])
+        if test:
+            report = evaluate(model, test)
+            model.metadata['evaluation'] = report
+            self._report(report)
+
+        model.save(options['output'])
+        reset_closure_model()
+        self.stdout.write(self.style.SUCCESS(
+            f"Modelo salvo em {options['output']} ({len(model.weights)} pesos)"
+        ))
+
+    def _split(self, samples, eval_split):
+        """
+        Separa treino e avaliação por chat (hash do chat_id), não por amostra: as
+        janelas sobrepostas de um chat e os rótulos repetidos do LLM ficam todos
+        do mesmo lado, sem inflar a avaliação. Cada lado é embaralhado.
+        """
+        train, test = [], []
+        for group, pairs, finished in samples:
+            side = test if zlib.crc32(str(group).encode()) % 1000 < eval_split * 1000 else train
+            side.append((pairs, finished))
+        rng = random.Random(42)
+        rng.shuffle(train)
+        rng.shuffle(test)
+        return train, test
+
+    def _label_samples(self, since):
+        """Amostras (chat, pares, rótulo) das decisões gravadas do LLM."""
+        labels = ChatClosureLabel.objects.filter(created_at__gte=since).values_list('id', 'chat_id', 'pairs', 'finished')
+        return [
+            # Rótulos de chats já arquivados (chat nulo) formam um grupo cada
+            (chat_id if chat_id is not None else f'label-{label_id}', [tuple(pair) for pair in pairs], finished)
+            for label_id, chat_id, pairs, finished in labels.iterator(chunk_size=2000)
+        ]
+
+    def _history_samples(self, since, window, max_negatives):
+        """
+        Deriva rótulos das decisões já tomadas: um chat seguido de outro chat do
+        mesmo contato (ou marcado inactive/archived) foi considerado encerrado
+        no final; pontos intermediários do chat foram considerados em aberto.
+        Retorna amostras (chat, pares, rótulo).
+        """
+        chats = Chat.objects.filter(created_at__gte=since).order_by('client_id', 'contact_id', 'created_at')
+        finished_chats = set()
+        previous = None
+        for chat_id, client_id, contact_id, status in chats.values_list('id', 'client_id', 'contact_id', 'status').iterator(chunk_size=2000):
+            if status != 'active':
+                finished_chats.add(chat_id)
+            if previous and previous[1:] == (client_id, contact_id):
+                finished_chats.add(previous[0])
+            previous = (chat_id, client_id, contact_id)
+
+        messages = Message.objects.filter(chat__created_at__gte=since).order_by('chat_id', 'timestamp')
+        rows = messages.values_list('chat_id', 'content_input', 'content_output').iterator(chunk_size=2000)
+
+        samples = []
+        for chat_id, chat_rows in groupby(rows, key=lambda row: row[0]):
+            pairs = [(content_input, content_output) for _, content_input, content_output in chat_rows]
+            if chat_id in finished_chats:
+                samples.append((chat_id, pairs[-window:], True))
+                # Pontos intermediários: o chat seguiu depois deles
+                middle = list(range(1, len(pairs) - 1))
+                for end in random.Random(chat_id).sample(middle, min(max_negatives, len(middle))):
+                    samples.append((chat_id, pairs[max(0, end - window):end], False))
+            else:
+                for end in range(max(1, len(pairs) - max_negatives), len(pairs)):
+                    samples.append((chat_id, pairs[max(0, end - window):end], False))
+        return samples
+
+    def _report(self, report):
+        self.stdout.write("Avaliação offline:")
+        self.stdout.write(json.dumps(report, indent=2))
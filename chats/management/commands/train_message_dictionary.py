@@ -0,0 +1,77 @@
+from chats.models import Message
+from common.compression import MAX_DICTIONARY_ID, compress_text, train_dictionary
+from common.models import CompressionDictionary
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = (
+        "Treina um dicionário compartilhado de compressão com o conteúdo das mensagens mais recentes, "
+        "grava em CompressionDictionary e mostra o ganho estimado. Para usá-lo na escrita defina "
+        "COMPRESSION_DICTIONARY_ID; com --recompress as mensagens existentes são regravadas com ele."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sample', type=int, default=5000, help="Mensagens usadas no treino")
+        parser.add_argument('--recompress', action='store_true', help="Regrava as mensagens existentes com o novo dicionário")
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        rows = list(
+            Message.objects.order_by('-id').values_list('content_input', 'content_output')[:options['sample']]
+        )
+        samples = [text for row in rows for text in row if text]
+        if not samples:
+            raise CommandError("Nenhuma mensagem para treinar o dicionário")
+
+        data = train_dictionary(samples)
+        if not data:
+            raise CommandError("Nenhum trecho repetido encontrado; dicionário não é necessário")
+        dictionary = CompressionDictionary.objects.create(name='messages', data=data)
+        if dictionary.id > MAX_DICTIONARY_ID:
+            dictionary.delete()
+            raise CommandError(f"Ids de dicionário acima de {MAX_DICTIONARY_ID} não cabem no cabeçalho comprimido")
+
+        raw_size = sum(len(text.encode('utf-8')) + 1 for text in samples)
+        plain_size = sum(len(compress_text(text, dictionary_id=0)) for text in samples)
+        dict_size = sum(len(compress_text(text, dictionary_id=dictionary.id)) for text in samples)
+        self.stdout.write(
+            f"Dicionário #{dictionary.id} ({len(data)} bytes) treinado com {len(samples)} textos. "
+            f"Amostra: {raw_size} bytes sem compressão, {plain_size} com zlib, {dict_size} com dicionário."
+        )
+
+        if options['recompress']:
+            self._recompress(dictionary.id, options['batch_size'])
+        else:
+            self.stdout.write(f"Defina COMPRESSION_DICTIONARY_ID={dictionary.id} para usá-lo nas novas mensagens.")
+
+    def _recompress(self, dictionary_id, batch_size):
+        last_id = 0
+        total = 0
+        while True:
+            rows = list(
+                Message.objects.filter(id__gt=last_id).order_by('id')
+                .values_list('id', 'content_input', 'content_output')[:batch_size]
+            )
+            if not rows:
+                break
+            last_id = rows[-1][0]
+
+            # Bytes já comprimidos passam direto pelo CompressedTextField
+            Message.objects.bulk_update(
+                [
+                    Message(
+                        id=message_id,
+                        content_input=compress_text(content_input, dictionary_id) if content_input is not None else None,
+                        content_output=compress_text(content_output, dictionary_id) if content_output is not None else None
+                    )
+                    for message_id, content_input, content_output in rows
+                ],
+                ['content_input', 'content_output']
+            )
+            total += len(rows)
+
+        self.stdout.write(
+            f"{total} mensagem(ns) regravada(s) com o dicionário #{dictionary_id}. "
+            f"Defina COMPRESSION_DICTIONARY_ID={dictionary_id} para as novas mensagens."
+        )
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.4 on 2026-10-19 10:21
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chats', '0012_chat_language'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChatClosureLabel',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_message_id', models.BigIntegerField(help_text='ID of the last message considered in the decision')),
+                ('pairs', models.JSONField(help_text='Last [content_input, content_output] pairs seen by the classifier')),
+                ('finished', models.BooleanField(help_text='Indicates if the conversation was classified as finished')),
+                ('source', models.CharField(choices=[('llm', 'LLM'), ('manual', 'Manual')], default='llm', help_text='Who produced the label', max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('chat', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='closure_labels', to='chats.chat')),
+            ],
+            options={
+                'verbose_name': 'Chat Closure Label',
+                'verbose_name_plural': 'Chat Closure Labels',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.2.4 on 2026-10-19 10:27
+
+from django.db import migrations, models
+from django.db.models import Count, Max
+
+
+def backfill_activity_counters(apps, schema_editor):
+    Chat = apps.get_model('chats', 'Chat')
+    Message = apps.get_model('chats', 'Message')
+
+    last_id = 0
+    while True:
+        batch = list(Chat.objects.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:1000])
+        if not batch:
+            break
+        last_id = batch[-1]
+
+        stats = Message.objects.filter(chat_id__in=batch).values('chat_id').annotate(
+            last_message_at=Max('timestamp'),
+            message_count=Count('id')
+        )
+        Chat.objects.bulk_update(
+            [
+                Chat(id=row['chat_id'], last_message_at=row['last_message_at'], message_count=row['message_count'])
+                for row in stats
+            ],
+            ['last_message_at', 'message_count']
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chats', '0013_chatclosurelabel'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chat',
+            name='last_classified_message_id',
+            field=models.BigIntegerField(blank=True, help_text='Last message considered by the closure classifier', null=True),
+        ),
+        migrations.AddField(
+            model_name='chat',
+            name='last_message_at',
+            field=models.DateTimeField(blank=True, help_text='Timestamp of the last message of the chat', null=True),
+        ),
+        migrations.AddField(
+            model_name='chat',
+            name='message_count',
+            field=models.PositiveIntegerField(default=0, help_text='Number of messages in the chat'),
+        ),
+        migrations.RunPython(backfill_activity_counters, migrations.RunPython.noop),
+    ]
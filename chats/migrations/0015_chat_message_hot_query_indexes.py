@@ -0,0 +1,35 @@
+# Generated by Django 5.2.4 on 2026-10-19 10:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chats', '0014_chat_activity_counters'),
+        ('clients', '0005_client_llm_daily_token_budget'),
+        ('common', '0002_origin'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='chat',
+            index=models.Index(condition=models.Q(('status', 'active')), fields=['contact_id', '-created_at'], name='chat_active_contact_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='chat',
+            index=models.Index(condition=models.Q(('status', 'active')), fields=['created_at'], name='chat_active_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['contact_id', 'timestamp'], name='message_contact_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['client', 'origin', 'contact_id', 'timestamp'], name='message_context_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['chat', 'timestamp'], name='message_chat_ts_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.4 on 2026-10-19 10:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chats', '0015_chat_message_hot_query_indexes'),
+        ('clients', '0005_client_llm_daily_token_budget'),
+        ('common', '0002_origin'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='chat',
+            name='chat_active_contact_idx',
+        ),
+        migrations.AddIndex(
+            model_name='chat',
+            index=models.Index(condition=models.Q(('status', 'active')), fields=['client', 'origin', 'contact_id', '-created_at'], name='chat_active_tenant_contact_idx'),
+        ),
+    ]
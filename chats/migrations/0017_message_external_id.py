@@ -0,0 +1,28 @@
+# Generated by Django 5.2.4 on 2026-10-19 10:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chats', '0016_chat_active_tenant_contact_idx'),
+        ('clients', '0005_client_llm_daily_token_budget'),
+        ('common', '0002_origin'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='message',
+            name='external_id',
+            field=models.CharField(blank=True, help_text='Provider message ID (e.g. WhatsApp wamid), used to ignore webhook retries', max_length=255, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='message',
+            constraint=models.UniqueConstraint(condition=models.Q(('external_id__isnull', False)), fields=('client', 'origin', 'external_id'), name='message_unique_external_id'),
+        ),
+        migrations.AddConstraint(
+            model_name='message',
+            constraint=models.UniqueConstraint(condition=models.Q(('external_id__isnull', False), ('origin__isnull', True)), fields=('client', 'external_id'), name='message_unique_external_id_no_origin'),
+        ),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 5.2.4 on 2026-10-19 10:35
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chats', '0017_message_external_id'),
+        ('clients', '0005_client_llm_daily_token_budget'),
+        ('common', '0002_origin'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='chatclosurelabel',
+            name='chat',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='closure_labels', to='chats.chat'),
+        ),
+        migrations.CreateModel(
+            name='ArchivedChat',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('contact_id', models.CharField(max_length=255)),
+                ('flow', models.BooleanField(blank=True, default=False, null=True)),
+                ('flow_option', models.IntegerField(blank=True, default=0, null=True)),
+                ('room_availability', models.BooleanField(default=False)),
+                ('rooms', models.IntegerField(blank=True, default=0, null=True)),
+                ('status', models.CharField(help_text='Status of the chat when it was archived', max_length=20)),
+                ('language', models.CharField(blank=True, max_length=20, null=True)),
+                ('last_message_at', models.DateTimeField(blank=True, null=True)),
+                ('message_count', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('client', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_chats', to='clients.client')),
+                ('origin', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='archived_chats', to='common.origin')),
+            ],
+            options={
+                'verbose_name': 'Archived Chat',
+                'verbose_name_plural': 'Archived Chats',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedMessage',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('contact_id', models.CharField(max_length=255)),
+                ('content_input', models.TextField(blank=True, null=True)),
+                ('content_output', models.TextField(blank=True, null=True)),
+                ('external_id', models.CharField(blank=True, max_length=255, null=True)),
+                ('timestamp', models.DateTimeField()),
+                ('chat', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='messages', to='chats.archivedchat')),
+                ('client', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_messages', to='clients.client')),
+                ('origin', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='archived_messages', to='common.origin')),
+            ],
+            options={
+                'verbose_name': 'Archived Message',
+                'verbose_name_plural': 'Archived Messages',
+                'ordering': ['timestamp'],
+                'indexes': [models.Index(fields=['client', 'origin', 'contact_id', 'timestamp'], name='archived_msg_context_ts_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.2.4 on 2026-10-19 10:37
+
+from django.db import migrations
+
+
+FTS_TABLE = 'chats_message_fts'
+PG_CONFIGS = ('portuguese', 'spanish')
+
+
+def create_and_backfill(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        # Sem FK: o flush do Django faz TRUNCATE de chats_message sem CASCADE.
+        # Os deletes são sincronizados pelo post_delete de Message (chats.search)
+        schema_editor.execute(
+            f"CREATE TABLE IF NOT EXISTS {FTS_TABLE} ("
+            f"message_id bigint PRIMARY KEY, document tsvector NOT NULL)"
+        )
+        schema_editor.execute(f"CREATE INDEX IF NOT EXISTS {FTS_TABLE}_document_idx ON {FTS_TABLE} USING GIN (document)")
+        vector = ' || '.join(f"to_tsvector('{config}', %s)" for config in PG_CONFIGS)
+        insert = f"INSERT INTO {FTS_TABLE} (message_id, document) VALUES (%s, {vector}) ON CONFLICT (message_id) DO UPDATE SET document = EXCLUDED.document"
+    elif vendor == 'sqlite':
+        # Tabela FTS5 comum: a sem conteúdo (content='') não aceita DELETE nem UPDATE
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+            f"document, tokenize='unicode61 remove_diacritics 2')"
+        )
+        insert = f"INSERT INTO {FTS_TABLE} (rowid, document) VALUES (%s, %s)"
+    else:
+        return
+
+    Message = apps.get_model('chats', 'Message')
+    rows = Message.objects.order_by('id').values_list('id', 'content_input', 'content_output')
+    batch = []
+    for message_id, content_input, content_output in rows.iterator(chunk_size=2000):
+        document = ' '.join(part for part in (content_input, content_output) if part)
+        batch.append((message_id, *([document] * (len(PG_CONFIGS) if vendor == 'postgresql' else 1))))
+        if len(batch) >= 2000:
+            with schema_editor.connection.cursor() as cursor:
+                cursor.executemany(insert, batch)
+            batch = []
+    if batch:
+        with schema_editor.connection.cursor() as cursor:
+            cursor.executemany(insert, batch)
+
+
+def drop(apps, schema_editor):
+    if schema_editor.connection.vendor in ('postgresql', 'sqlite'):
+        schema_editor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chats', '0018_archived_chat_tier'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_and_backfill, drop),
+    ]
@@ -0,0 +1,102 @@
+# Generated by Django 5.2.4 on 2026-10-19 10:45
+
+import common.fields
+from django.db import migrations
+
+
+def copy_content(apps, model_name, source, target, batch_size=1000):
+    Model = apps.get_model('chats', model_name)
+    last_id = 0
+    while True:
+        rows = list(
+            Model.objects.filter(id__gt=last_id).order_by('id')
+            .values_list('id', f'content_input{source}', f'content_output{source}')[:batch_size]
+        )
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        Model.objects.bulk_update(
+            [
+                Model(id=message_id, **{f'content_input{target}': content_input, f'content_output{target}': content_output})
+                for message_id, content_input, content_output in rows
+            ],
+            [f'content_input{target}', f'content_output{target}']
+        )
+
+
+def compress_content(apps, schema_editor):
+    for model_name in ('Message', 'ArchivedMessage'):
+        copy_content(apps, model_name, '', '_compressed')
+
+
+def decompress_content(apps, schema_editor):
+    for model_name in ('Message', 'ArchivedMessage'):
+        copy_content(apps, model_name, '_compressed', '')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chats', '0019_message_search_index'),
+        ('common', '0003_compressiondictionary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='message',
+            name='content_input_compressed',
+            field=common.fields.CompressedTextField(blank=True, help_text='Input content for the chat', null=True),
+        ),
+        migrations.AddField(
+            model_name='message',
+            name='content_output_compressed',
+            field=common.fields.CompressedTextField(blank=True, help_text='Response content from the chat', null=True),
+        ),
+        migrations.AddField(
+            model_name='archivedmessage',
+            name='content_input_compressed',
+            field=common.fields.CompressedTextField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='archivedmessage',
+            name='content_output_compressed',
+            field=common.fields.CompressedTextField(blank=True, null=True),
+        ),
+        migrations.RunPython(compress_content, decompress_content),
+        migrations.RemoveField(
+            model_name='message',
+            name='content_input',
+        ),
+        migrations.RemoveField(
+            model_name='message',
+            name='content_output',
+        ),
+        migrations.RenameField(
+            model_name='message',
+            old_name='content_input_compressed',
+            new_name='content_input',
+        ),
+        migrations.RenameField(
+            model_name='message',
+            old_name='content_output_compressed',
+            new_name='content_output',
+        ),
+        migrations.RemoveField(
+            model_name='archivedmessage',
+            name='content_input',
+        ),
+        migrations.RemoveField(
+            model_name='archivedmessage',
+            name='content_output',
+        ),
+        migrations.RenameField(
+            model_name='archivedmessage',
+            old_name='content_input_compressed',
+            new_name='content_input',
+        ),
+        migrations.RenameField(
+            model_name='archivedmessage',
+            old_name='content_output_compressed',
+            new_name='content_output',
+        ),
+    ]
@@ -1,4 +1,5 @@
 from clients.models import Client
+from common.fields import CompressedTextField
 from common.models import Origin
 from django.db import models
 
@@ -22,6 +23,9 @@ class Chat(models.Model):
         help_text="Status of the chat"
     )
     language = models.CharField(max_length=20, default='unknow', null=True, blank=True, help_text="Language preference for the chat")
+    last_message_at = models.DateTimeField(null=True, blank=True, help_text="Timestamp of the last message of the chat")
+    message_count = models.PositiveIntegerField(default=0, help_text="Number of messages in the chat")
+    last_classified_message_id = models.BigIntegerField(null=True, blank=True, help_text="Last message considered by the closure classifier")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -32,14 +36,32 @@ class Chat(models.Model):
         ordering = ['-created_at']
         verbose_name = 'Chat'
         verbose_name_plural = 'Chats'
+        indexes = [
+            # validate: chat ativo mais recente do contato no cliente/origem (índice parcial)
+            models.Index(
+                fields=['client', 'origin', 'contact_id', '-created_at'],
+                condition=models.Q(status='active'),
+                name='chat_active_tenant_contact_idx'
+            ),
+            # sweeper: expiração e varredura dos chats ativos
+            models.Index(
+                fields=['created_at'],
+                condition=models.Q(status='active'),
+                name='chat_active_created_idx'
+            ),
+        ]
 
 class Message(models.Model):
     client = models.ForeignKey(Client, on_delete=models.CASCADE, related_name='messages')
     origin = models.ForeignKey(Origin, on_delete=models.CASCADE, related_name='messages', null=True, blank=True)
     chat = models.ForeignKey(Chat, on_delete=models.CASCADE, related_name='messages_chat_id')
     contact_id = models.CharField(max_length=255, help_text="Sender of message, e.g., phone number or username")
-    content_input = models.TextField(blank=True, null=True, help_text="Input content for the chat")
-    content_output = models.TextField(blank=True, null=True, help_text="Response content from the chat")
+    content_input = CompressedTextField(blank=True, null=True, help_text="Input content for the chat")
+    content_output = CompressedTextField(blank=True, null=True, help_text="Response content from the chat")
+    external_id = models.CharField(
+        max_length=255, null=True, blank=True,
+        help_text="Provider message ID (e.g. WhatsApp wamid), used to ignore webhook retries"
+    )
     timestamp = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
@@ -49,3 +71,101 @@ class Message(models.Model):
         ordering = ['timestamp']
         verbose_name = 'Message'
         verbose_name_plural = 'Messages'
+        indexes = [
+            # Mensagens recentes de um contato
+            models.Index(fields=['contact_id', 'timestamp'], name='message_contact_ts_idx'),
+            # chat/log: histórico do contato no cliente/origem
+            models.Index(fields=['client', 'origin', 'contact_id', 'timestamp'], name='message_context_ts_idx'),
+            # Transcript do classificador de encerramento (mensagens do chat por timestamp)
+            models.Index(fields=['chat', 'timestamp'], name='message_chat_ts_idx'),
+        ]
+        constraints = [
+            # Retries de webhook/n8n com o mesmo ID do provedor não geram mensagens duplicadas
+            models.UniqueConstraint(
+                fields=['client', 'origin', 'external_id'],
+                condition=models.Q(external_id__isnull=False),
+                name='message_unique_external_id'
+            ),
+            # NULLs são distintos na constraint acima: mensagens sem origem precisam da sua
+            models.UniqueConstraint(
+                fields=['client', 'external_id'],
+                condition=models.Q(external_id__isnull=False, origin__isnull=True),
+                name='message_unique_external_id_no_origin'
+            ),
+        ]
+
+class ArchivedChat(models.Model):
+    """Chats arquivados ou antigos movidos das tabelas quentes (comando archive_chats). Mantém o id original."""
+    id = models.BigIntegerField(primary_key=True)
+    client = models.ForeignKey(Client, on_delete=models.CASCADE, related_name='archived_chats')
+    origin = models.ForeignKey(Origin, on_delete=models.CASCADE, related_name='archived_chats', null=True, blank=True)
+    contact_id = models.CharField(max_length=255)
+    flow = models.BooleanField(default=False, null=True, blank=True)
+    flow_option = models.IntegerField(default=0, null=True, blank=True)
+    room_availability = models.BooleanField(default=False)
+    rooms = models.IntegerField(default=0, null=True, blank=True)
+    status = models.CharField(max_length=20, help_text="Status of the chat when it was archived")
+    language = models.CharField(max_length=20, null=True, blank=True)
+    last_message_at = models.DateTimeField(null=True, blank=True)
+    message_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Archived Chat {self.id} for Client {self.client_id}"
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = 'Archived Chat'
+        verbose_name_plural = 'Archived Chats'
+
+class ArchivedMessage(models.Model):
+    """Mensagens dos chats arquivados (mesmo id da Message original)."""
+    id = models.BigIntegerField(primary_key=True)
+    client = models.ForeignKey(Client, on_delete=models.CASCADE, related_name='archived_messages')
+    origin = models.ForeignKey(Origin, on_delete=models.CASCADE, related_name='archived_messages', null=True, blank=True)
+    chat = models.ForeignKey(ArchivedChat, on_delete=models.CASCADE, related_name='messages')
+    contact_id = models.CharField(max_length=255)
+    content_input = CompressedTextField(blank=True, null=True)
+    content_output = CompressedTextField(blank=True, null=True)
+    external_id = models.CharField(max_length=255, null=True, blank=True)
+    timestamp = models.DateTimeField()
+
+    def __str__(self):
+        return f"Archived Message {self.id} in Chat {self.chat_id} from {self.contact_id}"
+
+    class Meta:
+        ordering = ['timestamp']
+        verbose_name = 'Archived Message'
+        verbose_name_plural = 'Archived Messages'
+        indexes = [
+            # chat/log: histórico do contato no cliente/origem
+            models.Index(fields=['client', 'origin', 'contact_id', 'timestamp'], name='archived_msg_context_ts_idx'),
+        ]
+
+class ChatClosureLabel(models.Model):
+    """Decisões de encerramento (true/false) usadas para treinar o classificador local"""
+    # SET_NULL: os rótulos de treino sobrevivem ao arquivamento do chat
+    chat = models.ForeignKey(Chat, on_delete=models.SET_NULL, related_name='closure_labels', null=True, blank=True)
+    last_message_id = models.BigIntegerField(help_text="ID of the last message considered in the decision")
+    pairs = models.JSONField(help_text="Last [content_input, content_output] pairs seen by the classifier")
+    finished = models.BooleanField(help_text="Indicates if the conversation was classified as finished")
+    source = models.CharField(
+        max_length=20,
+        choices=[
+            ('llm', 'LLM'),
+            ('manual', 'Manual')
+        ],
+        default='llm',
+        help_text="Who produced the label"
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Label {self.id} for Chat {self.chat_id}: {self.finished}"
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = 'Chat Closure Label'
+        verbose_name_plural = 'Chat Closure Labels'
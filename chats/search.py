@@ -0,0 +1,147 @@
+"""
+Busca full-text no conteúdo das mensagens (content_input/content_output).
+
+O índice fica em uma tabela própria, chats_message_fts, criada pela
+migração 0019 conforme o banco:
+
+- PostgreSQL: (message_id, document tsvector) com índice GIN. O documento
+  combina as configurações 'portuguese' e 'spanish'. Sem FK para
+  chats_message: o TRUNCATE do flush do Django (manage.py flush,
+  TransactionTestCase) não conhece a tabela.
+- SQLite (dev): tabela virtual FTS5 (rowid = id da mensagem) com tokenizer
+  unicode61 sem acentos.
+
+O documento é montado na aplicação a partir do texto puro, por isso
+independe da forma como o conteúdo é armazenado em chats_message. A
+sincronização fica nos signals de Message: post_save (insert, ou update de
+content_input/content_output) reindexa e post_delete remove -- inclusive
+nos deletes em cascata (chat/cliente) e no archive_chats. O bulk_create não
+dispara signals: quem o usa chama index_messages (ingest_messages).
+"""
+import re
+from chats.models import Message
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+
+FTS_TABLE = 'chats_message_fts'
+PG_CONFIGS = ('portuguese', 'spanish')
+
+_TOKEN_RE = re.compile(r"\w+")
+
+
+def _document(content_input, content_output):
+    return ' '.join(str(part) for part in (content_input, content_output) if part)
+
+
+def index_messages(rows, using=None):
+    """
+    Indexa (ou reindexa) mensagens.
+
+    :param rows: Iterável de tuplas (id, content_input, content_output).
+    :param using: Alias do banco (padrão: default).
+    """
+    conn = connections[using or DEFAULT_DB_ALIAS]
+    params = [(message_id, _document(content_input, content_output)) for message_id, content_input, content_output in rows]
+    if not params:
+        return
+
+    with conn.cursor() as cursor:
+        if conn.vendor == 'postgresql':
+            vector = ' || '.join(f"to_tsvector('{config}', %s)" for config in PG_CONFIGS)
+            cursor.executemany(
+                f"INSERT INTO {FTS_TABLE} (message_id, document) VALUES (%s, {vector}) "
+                f"ON CONFLICT (message_id) DO UPDATE SET document = EXCLUDED.document",
+                [(message_id, *([document] * len(PG_CONFIGS))) for message_id, document in params]
+            )
+        elif conn.vendor == 'sqlite':
+            # FTS5 não tem upsert
+            cursor.executemany(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [(message_id,) for message_id, _ in params])
+            cursor.executemany(f"INSERT INTO {FTS_TABLE} (rowid, document) VALUES (%s, %s)", params)
+
+
+def unindex_messages(message_ids, using=None):
+    """Remove mensagens do índice."""
+    conn = connections[using or DEFAULT_DB_ALIAS]
+    params = [(message_id,) for message_id in message_ids]
+    if not params:
+        return
+
+    with conn.cursor() as cursor:
+        if conn.vendor == 'postgresql':
+            cursor.executemany(f"DELETE FROM {FTS_TABLE} WHERE message_id = %s", params)
+        elif conn.vendor == 'sqlite':
+            cursor.executemany(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", params)
+
+
+@receiver(post_save, sender=Message)
+def _message_saved(sender, instance, update_fields=None, using=None, **kwargs):
+    # Saves que não alteram o conteúdo (ex: update_fields=['chat']) não reindexam
+    if update_fields is not None and not {'content_input', 'content_output'} & set(update_fields):
+        return
+    index_messages([(instance.id, instance.content_input, instance.content_output)], using=using)
+
+
+@receiver(post_delete, sender=Message)
+def _message_deleted(sender, instance, using=None, **kwargs):
+    unindex_messages([instance.id], using=using)
+
+
+def _fts5_query(term):
+    # Cada palavra vira um termo entre aspas (AND implícito); evita a sintaxe do FTS5
+    tokens = _TOKEN_RE.findall(term)
+    return ' '.join(f'"{token}"' for token in tokens)
+
+
+def search_subquery(term):
+    """
+    SQL (e parâmetros) que retorna os ids das mensagens que casam com term,
+    para uso em filter(id__in=RawSQL(sql, params)).
+    """
+    if connection.vendor == 'postgresql':
+        query = ' || '.join(f"websearch_to_tsquery('{config}', %s)" for config in PG_CONFIGS)
+        return (
+            f"SELECT message_id FROM {FTS_TABLE} WHERE document @@ ({query})",
+            [term] * len(PG_CONFIGS)
+        )
+    return f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [_fts5_query(term) or '""']
+
+
+def search_message_ids(term, client_id=None, limit=20, offset=0):
+    """
+    Ids das mensagens que casam com term, ordenados por relevância e depois
+    pelas mais recentes, já paginados no banco.
+
+    :param client_id: Restringe às mensagens do cliente.
+    :return: Tupla (ids, há mais resultados).
+    """
+    client_filter = 'AND m.client_id = %s' if client_id is not None else ''
+    client_params = [client_id] if client_id is not None else []
+
+    if connection.vendor == 'postgresql':
+        query = ' || '.join(f"websearch_to_tsquery('{config}', %s)" for config in PG_CONFIGS)
+        sql = (
+            f"SELECT f.message_id FROM {FTS_TABLE} f "
+            f"JOIN chats_message m ON m.id = f.message_id "
+            f"CROSS JOIN (SELECT {query} AS query) q "
+            f"WHERE f.document @@ q.query {client_filter} "
+            f"ORDER BY ts_rank(f.document, q.query) DESC, f.message_id DESC LIMIT %s OFFSET %s"
+        )
+        params = [term] * len(PG_CONFIGS) + client_params
+    else:
+        match = _fts5_query(term)
+        if not match:
+            return [], False
+        sql = (
+            f"SELECT f.rowid FROM {FTS_TABLE} f JOIN chats_message m ON m.id = f.rowid "
+            f"WHERE {FTS_TABLE} MATCH %s {client_filter} "
+            f"ORDER BY f.rank, f.rowid DESC LIMIT %s OFFSET %s"
+        )
+        params = [match] + client_params
+
+    with connection.cursor() as cursor:
+        # +1 para saber se há próxima página sem count()
+        cursor.execute(sql, params + [limit + 1, offset])
+        ids = [row[0] for row in cursor.fetchall()]
+    return ids[:limit], len(ids) > limit
@@ -0,0 +1,195 @@
+"""
+Estado de sessão do chat: flow, flow_option, room_availability, rooms e language.
+
+O ChatUpdateFlowView é chamado várias vezes por conversa para alterar esses
+campos. O modo de gravação é definido por settings.CHAT_STATE_MODE:
+
+- 'sync' (padrão): cada atualização é um UPDATE só dos campos de estado,
+  sem ler a linha inteira nem salvar o chat completo. Não depende de cache
+  compartilhado; é o modo de testes e desenvolvimento.
+- 'write_behind': o estado fica no cache (chat_state:<id>) e a atualização
+  apenas grava no cache e enfileira o chat. flush_chat_states() agrupa as
+  alterações pendentes e grava com bulk_update(update_fields) -- várias
+  atualizações do mesmo chat entre dois flushes viram uma única escrita. O
+  flush roda a cada ciclo do sweeper (`sweep_chats`), antes de encerrar
+  conversas, e flush_chat_state() grava um chat na hora ao arquivá-lo.
+
+Durabilidade no modo write_behind: a API responde antes da gravação no
+banco. Se o cache for perdido (restart ou eviction) antes do flush, as
+alterações feitas desde o último flush (no máximo um intervalo do sweeper)
+são perdidas e o banco mantém o último estado gravado. O modo exige cache
+compartilhado entre os processos (CACHE_BACKEND Redis/Memcached): o flush
+roda no processo do sweeper, que não enxerga a fila de um LocMemCache dos
+workers. check_chat_state_mode() (chamado no ChatsConfig.ready) recusa a
+subida nessa combinação.
+"""
+import logging
+from chats.models import Chat
+from common.utils import is_shared_cache
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.utils import timezone
+
+
+logger = logging.getLogger(__name__)
+
+STATE_FIELDS = ['flow', 'flow_option', 'room_availability', 'rooms', 'language']
+
+SEQ_KEY = 'chat_state:seq'
+FLUSHED_KEY = 'chat_state:flushed'
+GAP_KEY = 'chat_state:gap'
+
+
+def _state_key(chat_id):
+    return f'chat_state:{chat_id}'
+
+
+def _pending_key(seq):
+    return f'chat_state:pending:{seq}'
+
+
+def _write_behind():
+    return settings.CHAT_STATE_MODE == 'write_behind'
+
+
+def check_chat_state_mode():
+    """
+    :raises ImproperlyConfigured: se CHAT_STATE_MODE for inválido ou 'write_behind'
+                                  com cache por processo.
+    """
+    if settings.CHAT_STATE_MODE not in ('sync', 'write_behind'):
+        raise ImproperlyConfigured(f"CHAT_STATE_MODE must be 'sync' or 'write_behind', not {settings.CHAT_STATE_MODE!r}")
+    if _write_behind() and not is_shared_cache():
+        raise ImproperlyConfigured(
+            "CHAT_STATE_MODE='write_behind' requires a cache shared between processes (CACHE_BACKEND); "
+            "with a per-process cache the sweeper never sees the pending states. Use 'sync'"
+        )
+
+
+def clean_chat_state(data):
+    """
+    Extrai e converte os campos de estado presentes em data.
+
+    :raises django.core.exceptions.ValidationError: se algum valor for inválido.
+    """
+    changes = {}
+    for name in STATE_FIELDS:
+        value = data.get(name)
+        if value is not None:
+            changes[name] = Chat._meta.get_field(name).to_python(value)
+    return changes
+
+
+def get_chat_state(chat_id, chat=None):
+    """
+    Estado atual do chat ({'client_id', <campos de estado>}) ou None se o chat
+    não existir. No modo write_behind o cache tem precedência sobre o banco.
+
+    :param chat: Instância já carregada, evita a consulta quando não há estado em cache.
+    """
+    state = cache.get(_state_key(chat_id)) if _write_behind() else None
+    if state is not None:
+        return state
+
+    if chat is not None:
+        state = {'client_id': chat.client_id, **{name: getattr(chat, name) for name in STATE_FIELDS}}
+    else:
+        state = Chat.objects.filter(id=chat_id).values('client_id', *STATE_FIELDS).first()
+        if state is None:
+            return None
+
+    if _write_behind():
+        # add: não sobrescreve um estado mais novo gravado em paralelo
+        cache.add(_state_key(chat_id), state, settings.CHAT_STATE_TTL)
+    return state
+
+
+def update_chat_state(chat_id, state, changes):
+    """
+    Aplica changes sobre state (obtido com get_chat_state) e persiste conforme
+    CHAT_STATE_MODE. Retorna o novo estado.
+    """
+    state = {**state, **changes}
+    if not changes:
+        return state
+
+    if not _write_behind():
+        Chat.objects.filter(id=chat_id).update(**changes, updated_at=timezone.now())
+        return state
+
+    cache.set(_state_key(chat_id), state, settings.CHAT_STATE_TTL)
+    cache.add(SEQ_KEY, 0, None)
+    seq = cache.incr(SEQ_KEY)
+    cache.set(_pending_key(seq), chat_id, settings.CHAT_STATE_TTL)
+    return state
+
+
+def flush_chat_state(chat_id):
+    """Grava imediatamente o estado em cache de um chat (ex: ao arquivá-lo)."""
+    if not _write_behind():
+        return False
+    state = cache.get(_state_key(chat_id))
+    if state is None:
+        return False
+    Chat.objects.filter(id=chat_id).update(
+        **{name: state[name] for name in STATE_FIELDS}, updated_at=timezone.now()
+    )
+    return True
+
+
+def flush_chat_states(batch_size=500):
+    """
+    Grava no banco os estados alterados desde o último flush (modo write_behind).
+
+    As alterações são lidas da fila chat_state:pending:<seq>; um chat alterado
+    várias vezes é gravado uma única vez, com o estado mais recente.
+
+    :return: Quantidade de chats gravados.
+    """
+    if not _write_behind():
+        return 0
+
+    current = cache.get(SEQ_KEY) or 0
+    flushed = cache.get(FLUSHED_KEY) or 0
+    if current <= flushed:
+        return 0
+
+    seqs = list(range(flushed + 1, current + 1))
+    pending = cache.get_many([_pending_key(seq) for seq in seqs])
+
+    chat_ids = {}
+    last_seq = flushed
+    for seq in seqs:
+        chat_id = pending.get(_pending_key(seq))
+        if chat_id is None:
+            # O incr já aconteceu mas a entrada ainda não foi gravada: espera um
+            # ciclo; se continuar faltando (eviction), segue adiante
+            if cache.get(GAP_KEY) != seq:
+                cache.set(GAP_KEY, seq, settings.CHAT_STATE_TTL)
+                break
+            logger.warning(f"[ChatState] entrada {seq} da fila perdida")
+        else:
+            chat_ids[str(chat_id)] = None
+        last_seq = seq
+
+    updated_at = timezone.now()
+    written = 0
+    chat_ids = list(chat_ids)
+    for start in range(0, len(chat_ids), batch_size):
+        batch = chat_ids[start:start + batch_size]
+        states = cache.get_many([_state_key(chat_id) for chat_id in batch])
+        chats = []
+        for chat_id in batch:
+            state = states.get(_state_key(chat_id))
+            if state is not None:
+                chats.append(Chat(id=chat_id, updated_at=updated_at, **{name: state[name] for name in STATE_FIELDS}))
+        if chats:
+            Chat.objects.bulk_update(chats, STATE_FIELDS + ['updated_at'])
+            written += len(chats)
+
+    cache.set(FLUSHED_KEY, last_seq, None)
+    cache.delete_many([_pending_key(seq) for seq in seqs if seq <= last_seq])
+    if written:
+        logger.info(f"[ChatState] {written} chat(s) gravado(s)")
+    return written
@@ -1,3 +1,567 @@
-from django.test import TestCase
+import tempfile
+from chats import functions
+from chats.archive import archive_chats
+from chats.functions import ingest_messages, sweep_active_chats
+from chats.management.commands.train_closure_model import Command as TrainClosureModelCommand
+from chats.models import ArchivedMessage, Chat, Message
+from chats.search import search_message_ids
+from chats.state import check_chat_state_mode, flush_chat_state, flush_chat_states, get_chat_state, update_chat_state
+from clients.models import Client
+from common import compression
+from common.models import Origin
+from common.origins import invalidate_origin_registry
+from datetime import timedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.exceptions import ImproperlyConfigured
+from django.db import IntegrityError, connection, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from unittest import mock
 
-# Create your tests here.
+
+def create_client(name='Hotel'):
+    return Client.objects.create(
+        name=name, business_name=name, phone='0', contact=name, email=f'{name.lower()}@example.com',
+        api_token=f'api-{name.lower()}', monthly_fee=0
+    )
+
+
+class MessageSearchIndexTests(TestCase):
+    """Sincronização do índice full-text (chats.search) com Message."""
+
+    def setUp(self):
+        self.client_obj = create_client()
+        self.chat = Chat.objects.create(client=self.client_obj, contact_id='5511999')
+
+    def search(self, term):
+        return search_message_ids(term, client_id=self.client_obj.id)[0]
+
+    def create_message(self, content_input, chat=None):
+        return Message.objects.create(
+            client=self.client_obj, chat=chat or self.chat, contact_id='5511999', content_input=content_input
+        )
+
+    def test_insert_is_indexed(self):
+        message = self.create_message('Quero reservar um quarto com piscina')
+        self.assertEqual(self.search('piscina'), [message.id])
+        # unicode61 sem acentos
+        self.assertEqual(self.create_message('Horário do café').id, self.search('cafe')[0])
+
+    def test_update_reindexes(self):
+        message = self.create_message('Quero reservar um quarto')
+        message.content_input = 'Qual o horário do café da manhã?'
+        message.save()
+        self.assertEqual(self.search('reservar'), [])
+        self.assertEqual(self.search('manhã'), [message.id])
+
+    def test_update_without_content_keeps_index(self):
+        message = self.create_message('Quero reservar um quarto')
+        message.contact_id = '5511888'
+        message.save(update_fields=['contact_id'])
+        self.assertEqual(self.search('reservar'), [message.id])
+
+    def test_delete_removes_from_index(self):
+        message = self.create_message('Quero reservar um quarto')
+        kept = self.create_message('Quero reservar uma suíte')
+        message.delete()
+        self.assertEqual(self.search('reservar'), [kept.id])
+
+    def test_cascade_delete_removes_from_index(self):
+        self.create_message('Quero reservar um quarto')
+        self.chat.delete()
+        self.assertEqual(self.search('reservar'), [])
+
+    def test_archive_removes_from_index(self):
+        archived = Chat.objects.create(client=self.client_obj, contact_id='5511777', status='archived')
+        self.create_message('Quero reservar um quarto', chat=archived)
+        kept = self.create_message('Quero reservar uma suíte')
+        stats = archive_chats()
+        self.assertEqual(stats, {'chats': 1, 'messages': 1})
+        self.assertEqual(self.search('reservar'), [kept.id])
+
+    def test_admin_search(self):
+        from chats.admin import MessageAdmin
+        from django.contrib.admin.sites import AdminSite
+
+        by_content = self.create_message('Quero reservar um quarto')
+        other = Chat.objects.create(client=self.client_obj, contact_id='5521777')
+        by_contact = Message.objects.create(client=self.client_obj, chat=other, contact_id='5521777', content_input='oi')
+        admin = MessageAdmin(Message, AdminSite())
+        for term, expected in (('reservar', [by_content.id]), ('21777', [by_contact.id]), ('5511', [by_content.id])):
+            with self.subTest(term=term):
+                queryset, _ = admin.get_search_results(None, Message.objects.all(), term)
+                self.assertEqual(sorted(queryset.values_list('id', flat=True)), expected)
+
+    def test_bulk_ingestion_is_indexed(self):
+        results = ingest_messages(self.client_obj, [
+            {'chat_id': self.chat.id, 'contact_id': '5511999', 'content_input': 'Aceitam pix?'},
+            {'chat_id': self.chat.id, 'contact_id': '5511999', 'content_output': 'Sim, aceitamos pix'},
+        ])
+        self.assertEqual(sorted(self.search('pix')), sorted(result['message_id'] for result in results))
+
+
+class MessageIdempotencyTests(TestCase):
+    """Retries com o mesmo external_id (MessageCreateView / MessageBulkCreateView)."""
+
+    def setUp(self):
+        invalidate_origin_registry()
+        self.client_obj = create_client()
+        self.origin = Origin.objects.create(name='whatsapp')
+        self.chat = Chat.objects.create(client=self.client_obj, contact_id='5511999')
+        self.headers = {'HTTP_AUTHORIZATION': f'Bearer {self.client_obj.token}'}
+
+    def post(self, name, body):
+        url = reverse(f'chats:{name}', kwargs={'client_type': 'n8n'})
+        return self.client.post(url, body, content_type='application/json', **self.headers)
+
+    def body(self, **kwargs):
+        return {'chat_id': self.chat.id, 'contact_id': '5511999', 'content_input': 'oi', 'external_id': 'wamid.1', **kwargs}
+
+    def test_single_post_is_idempotent(self):
+        for origin in ('whatsapp', None):
+            first = self.post('message-create', self.body(origin=origin))
+            second = self.post('message-create', self.body(origin=origin))
+            self.assertEqual(first.status_code, 201)
+            self.assertEqual(second.status_code, 200)
+            self.assertTrue(second.json()['duplicate'])
+            self.assertEqual(second.json()['message_id'], first.json()['message_id'])
+        self.assertEqual(Message.objects.count(), 2)
+        self.chat.refresh_from_db()
+        self.assertEqual(self.chat.message_count, 2)
+
+    def test_single_post_unknown_chat(self):
+        response = self.post('message-create', self.body(chat_id=999999))
+        self.assertEqual(response.status_code, 404)
+
+    def test_bulk_post_is_idempotent(self):
+        items = [self.body(), self.body(), self.body(external_id='wamid.2', origin='whatsapp'), self.body(external_id=None)]
+        first = self.post('message-bulk-create', {'messages': items}).json()
+        self.assertEqual([bool(r.get('duplicate')) for r in first['results']], [False, True, False, False])
+        self.assertEqual(first['results'][1]['message_id'], first['results'][0]['message_id'])
+
+        second = self.post('message-bulk-create', {'messages': items}).json()
+        self.assertEqual([bool(r.get('duplicate')) for r in second['results']], [True, True, True, False])
+        self.assertEqual(Message.objects.count(), 4)
+
+    def test_concurrent_retry_is_reported_as_duplicate(self):
+        # Outro retry grava a mensagem entre a verificação e o INSERT
+        existing = Message.objects.create(
+            client=self.client_obj, chat=self.chat, contact_id='5511999', external_id='wamid.1'
+        )
+        real_find = functions.find_messages_by_external_id
+        calls = []
+
+        def find(client, keys):
+            calls.append(keys)
+            return {} if len(calls) == 1 else real_find(client, keys)
+
+        with mock.patch.object(functions, 'find_messages_by_external_id', side_effect=find):
+            result = ingest_messages(self.client_obj, [self.body()])[0]
+        self.assertEqual((result['message_id'], result['duplicate']), (existing.id, True))
+        self.assertEqual(Message.objects.count(), 1)
+
+    def test_concurrent_retry_in_batch(self):
+        existing = Message.objects.create(
+            client=self.client_obj, chat=self.chat, contact_id='5511999', external_id='wamid.1'
+        )
+        real_find = functions.find_messages_by_external_id
+        calls = []
+
+        def find(client, keys):
+            calls.append(keys)
+            return {} if len(calls) == 1 else real_find(client, keys)
+
+        items = [self.body(), self.body(external_id='wamid.2'), self.body(external_id='wamid.3')]
+        with mock.patch.object(functions, 'find_messages_by_external_id', side_effect=find):
+            results = ingest_messages(self.client_obj, items)
+        self.assertEqual([bool(result.get('duplicate')) for result in results], [True, False, False])
+        self.assertEqual(results[0]['message_id'], existing.id)
+        self.assertEqual(
+            sorted(Message.objects.values_list('external_id', flat=True)), ['wamid.1', 'wamid.2', 'wamid.3']
+        )
+        # Só as chaves em conflito são relidas
+        self.assertEqual(calls[1], {(None, 'wamid.1')})
+
+    def test_null_origin_external_id_is_unique(self):
+        Message.objects.create(client=self.client_obj, chat=self.chat, contact_id='5511999', external_id='wamid.1')
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Message.objects.create(client=self.client_obj, chat=self.chat, contact_id='5511999', external_id='wamid.1')
+
+
+class MessageBulkCreateTests(TestCase):
+    """Validação por item e limite do MessageBulkCreateView."""
+
+    def setUp(self):
+        self.client_obj = create_client()
+        self.chat = Chat.objects.create(client=self.client_obj, contact_id='5511999')
+        self.headers = {'HTTP_AUTHORIZATION': f'Bearer {self.client_obj.token}'}
+
+    def post(self, items):
+        url = reverse('chats:message-bulk-create', kwargs={'client_type': 'n8n'})
+        return self.client.post(url, {'messages': items}, content_type='application/json', **self.headers)
+
+    def item(self, **kwargs):
+        return {'chat_id': self.chat.id, 'contact_id': '5511999', 'content_input': 'oi', **kwargs}
+
+    def test_invalid_items_do_not_break_the_batch(self):
+        response = self.post([
+            self.item(),
+            self.item(content_input=123),
+            self.item(contact_id={'a': 1}),
+            self.item(external_id=['wamid.1']),
+            self.item(content_output={'text': 'oi'}),
+            {'contact_id': '5511999'},
+            'oi',
+            self.item(contact_id=5511999, external_id=42),
+        ])
+        self.assertEqual(response.status_code, 201)
+        body = response.json()
+        self.assertEqual((body['created'], body['duplicates'], body['errors']), (2, 0, 6))
+        self.assertEqual([result['index'] for result in body['results']], list(range(8)))
+        self.assertEqual(
+            [index for index, result in enumerate(body['results']) if 'error' in result], [1, 2, 3, 4, 5, 6]
+        )
+        self.assertEqual(
+            list(Message.objects.order_by('id').values_list('contact_id', 'external_id')),
+            [('5511999', None), ('5511999', '42')]
+        )
+
+    def test_only_invalid_items(self):
+        response = self.post([self.item(content_input=123)])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['results'], [{'index': 0, 'error': 'content_input must be a string or null'}])
+        self.assertFalse(Message.objects.exists())
+
+    @override_settings(CHAT_BULK_MAX_MESSAGES=2)
+    def test_batch_size_is_capped(self):
+        self.assertEqual(self.post([self.item(), self.item(), self.item()]).status_code, 400)
+        self.assertFalse(Message.objects.exists())
+        self.assertEqual(self.post([self.item(), self.item()]).status_code, 201)
+
+
+class ChatStateTests(TestCase):
+    """Modos de gravação do estado de sessão (chats.state)."""
+
+    def setUp(self):
+        cache.clear()
+        self.client_obj = create_client()
+        self.chat = Chat.objects.create(client=self.client_obj, contact_id='5511999')
+
+    def update(self, chat, **changes):
+        return update_chat_state(chat.id, get_chat_state(chat.id), changes)
+
+    def stored(self, chat):
+        return Chat.objects.values('flow_option', 'rooms').get(id=chat.id)
+
+    @override_settings(CHAT_STATE_MODE='sync')
+    def test_sync_writes_immediately(self):
+        self.update(self.chat, flow_option=2, rooms=1)
+        self.assertEqual(self.stored(self.chat), {'flow_option': 2, 'rooms': 1})
+        self.assertEqual(flush_chat_states(), 0)
+
+    @override_settings(CHAT_STATE_MODE='write_behind')
+    def test_write_behind_defers_until_flush(self):
+        state = self.update(self.chat, flow_option=2)
+        self.assertEqual(state['flow_option'], 2)
+        self.assertEqual(get_chat_state(self.chat.id)['flow_option'], 2)
+        self.assertEqual(self.stored(self.chat)['flow_option'], 0)
+
+        self.assertEqual(flush_chat_states(), 1)
+        self.assertEqual(self.stored(self.chat)['flow_option'], 2)
+        # Nada pendente depois do flush
+        self.assertEqual(flush_chat_states(), 0)
+
+    @override_settings(CHAT_STATE_MODE='write_behind')
+    def test_write_behind_coalesces_updates(self):
+        other = Chat.objects.create(client=self.client_obj, contact_id='5511888')
+        for option in (1, 2, 3):
+            self.update(self.chat, flow_option=option)
+        self.update(other, rooms=4)
+        self.update(self.chat, rooms=2)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(flush_chat_states(), 2)
+        self.assertEqual(self.stored(self.chat), {'flow_option': 3, 'rooms': 2})
+        self.assertEqual(self.stored(other), {'flow_option': 0, 'rooms': 4})
+
+    @override_settings(CHAT_STATE_MODE='write_behind')
+    def test_flush_single_chat(self):
+        self.update(self.chat, rooms=3)
+        self.assertTrue(flush_chat_state(self.chat.id))
+        self.assertEqual(self.stored(self.chat)['rooms'], 3)
+
+    def test_write_behind_requires_shared_cache(self):
+        with override_settings(CHAT_STATE_MODE='write_behind'):
+            with self.assertRaises(ImproperlyConfigured):
+                check_chat_state_mode()
+        with tempfile.TemporaryDirectory() as directory:
+            shared = {**settings.CACHES, 'default': {
+                'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': directory
+            }}
+            with override_settings(CHAT_STATE_MODE='write_behind', CACHES=shared):
+                check_chat_state_mode()
+        with override_settings(CHAT_STATE_MODE='later'):
+            with self.assertRaises(ImproperlyConfigured):
+                check_chat_state_mode()
+
+
+class CompressMessageContentMigrationTests(TransactionTestCase):
+    """Migration 0020 (texto -> CompressedTextField) e a sua reversão."""
+
+    before = [('chats', '0019_message_search_index')]
+    after = [('chats', '0020_compress_message_content')]
+    texts = ['', 'Olá!', 'Quero reservar um quarto para duas pessoas. ' * 20, 'Café às 7h ✅ 日本語 ' * 10, None]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def create_messages(self, apps):
+        Client = apps.get_model('clients', 'Client')
+        Chat = apps.get_model('chats', 'Chat')
+        Message = apps.get_model('chats', 'Message')
+        client = Client.objects.create(
+            name='Hotel', business_name='Hotel', phone='0', contact='Hotel', email='hotel@example.com',
+            api_token='api-hotel', monthly_fee=0
+        )
+        chat = Chat.objects.create(client=client, contact_id='5511999')
+        return [
+            Message.objects.create(
+                client=client, chat=chat, contact_id='5511999', content_input=text, content_output=text
+            ).id
+            for text in self.texts
+        ]
+
+    def contents(self, apps, ids):
+        Message = apps.get_model('chats', 'Message')
+        rows = dict(Message.objects.filter(id__in=ids).values_list('id', 'content_input'))
+        return [rows[message_id] for message_id in ids]
+
+    def test_forwards_and_backwards(self):
+        ids = self.create_messages(self.migrate(self.before))
+
+        compressed = self.migrate(self.after)
+        self.assertEqual(self.contents(compressed, ids), self.texts)
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT content_input FROM chats_message WHERE id = %s", [ids[2]])
+            self.assertIsInstance(cursor.fetchone()[0], bytes)
+
+        self.assertEqual(self.contents(self.migrate(self.before), ids), self.texts)
+
+
+class ChatLogViewTests(TestCase):
+    """Parâmetros de /chat/log/<chat_id>/ (ChatLogView)."""
+
+    def setUp(self):
+        self.client_obj = create_client()
+        self.chat = Chat.objects.create(client=self.client_obj, contact_id='5511999')
+        for text in ('oi', 'quero reservar', 'para amanhã'):
+            Message.objects.create(client=self.client_obj, chat=self.chat, contact_id='5511999', content_input=text)
+        self.headers = {'HTTP_AUTHORIZATION': f'Bearer {self.client_obj.token}'}
+
+    def get(self, **params):
+        url = reverse('chats:chat-log', kwargs={'chat_id': self.chat.id})
+        return self.client.get(url, params, **self.headers)
+
+    def test_limits_messages(self):
+        response = self.get(max_messages=2)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.json()['messages_count'], response.json()['truncated']), (2, True))
+        self.assertEqual(self.get(max_messages=0).json()['messages_count'], 3)
+
+    def test_rejects_invalid_limits(self):
+        for params in ({'max_messages': -1}, {'max_tokens': -5}, {'max_messages': 'dez'}):
+            with self.subTest(params=params):
+                self.assertEqual(self.get(**params).status_code, 400)
+
+
+class ArchiveTests(TestCase):
+    """Cópia das mensagens para a camada fria (chats.archive)."""
+
+    def test_content_is_copied_compressed(self):
+        client = create_client()
+        chat = Chat.objects.create(client=client, contact_id='5511999', status='archived')
+        text = 'Quero reservar um quarto para duas pessoas no fim de semana. ' * 20
+        message = Message.objects.create(
+            client=client, chat=chat, contact_id='5511999', content_input=text, content_output='Ok!'
+        )
+
+        with mock.patch('common.fields.compress_text', wraps=compression.compress_text) as compress:
+            self.assertEqual(archive_chats(), {'chats': 1, 'messages': 1})
+        # Os bytes gravados são copiados sem comprimir de novo
+        compress.assert_not_called()
+
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT content_input FROM chats_archivedmessage WHERE id = %s", [message.id])
+            self.assertEqual(bytes(cursor.fetchone()[0])[0], compression.DEFLATE)
+        archived = ArchivedMessage.objects.get(id=message.id)
+        self.assertEqual((archived.content_input, archived.content_output), (text, 'Ok!'))
+
+
+@override_settings(CHAT_ACTIVE_WINDOW_HOURS=24, CHAT_CLOSURE_IDLE_MINUTES=30)
+class SweepActiveChatsTests(TestCase):
+    """Encerramento de conversas pelo sweeper (sweep_active_chats)."""
+
+    def setUp(self):
+        cache.clear()
+        self.client_obj = create_client()
+
+    def create_chat(self, contact_id, created_ago=timedelta(minutes=10), message_ago=timedelta(minutes=1)):
+        chat = Chat.objects.create(client=self.client_obj, contact_id=contact_id)
+        now = timezone.now()
+        last_message_id = None
+        if message_ago is not None:
+            last_message_id = ingest_messages(self.client_obj, [
+                {'chat_id': chat.id, 'contact_id': contact_id, 'content_input': 'oi'}
+            ])[0]['message_id']
+            Chat.objects.filter(id=chat.id).update(last_message_at=now - message_ago)
+        Chat.objects.filter(id=chat.id).update(created_at=now - created_ago)
+        return chat, last_message_id
+
+    def status(self, chat):
+        return Chat.objects.values_list('status', flat=True).get(id=chat.id)
+
+    def test_sweep(self):
+        expired, _ = self.create_chat('1', created_ago=timedelta(days=2))
+        idle, _ = self.create_chat('2', message_ago=timedelta(hours=1))
+        finished, _ = self.create_chat('3')
+        ongoing, _ = self.create_chat('4')
+        skipped, message_id = self.create_chat('5')
+        Chat.objects.filter(id=skipped.id).update(last_classified_message_id=message_id)
+        answers = {finished.id: 'true', ongoing.id: 'false'}
+
+        def classify(chat_id, messages, key, client_id):
+            return answers[chat_id]
+
+        with mock.patch.object(functions, 'get_chat_finished_cached', side_effect=classify) as classifier:
+            stats = sweep_active_chats()
+        self.assertEqual(
+            {key: stats[key] for key in ('expired', 'idle', 'checked', 'skipped', 'finished')},
+            {'expired': 1, 'idle': 1, 'checked': 2, 'skipped': 1, 'finished': 1}
+        )
+        self.assertEqual(sorted(call.args[0] for call in classifier.call_args_list), [finished.id, ongoing.id])
+        self.assertEqual(
+            [self.status(chat) for chat in (expired, idle, finished, ongoing, skipped)],
+            ['inactive', 'inactive', 'inactive', 'active', 'active']
+        )
+        ongoing.refresh_from_db()
+        self.assertEqual(ongoing.last_classified_message_id, Message.objects.filter(chat=ongoing).get().id)
+
+        # Sem mensagem nova o chat não é classificado de novo
+        with mock.patch.object(functions, 'get_chat_finished_cached') as classifier:
+            self.assertEqual(sweep_active_chats()['skipped'], 2)
+        classifier.assert_not_called()
+
+    def test_message_during_classification_keeps_chat_active(self):
+        chat, _ = self.create_chat('1')
+
+        def classify(chat_id, messages, key, client_id):
+            # O usuário escreve enquanto o LLM classifica
+            ingest_messages(self.client_obj, [{'chat_id': chat_id, 'contact_id': '1', 'content_input': 'ainda estou aqui'}])
+            return 'true'
+
+        with mock.patch.object(functions, 'get_chat_finished_cached', side_effect=classify):
+            stats = sweep_active_chats()
+        self.assertEqual((stats['checked'], stats['finished']), (1, 0))
+        self.assertEqual(self.status(chat), 'active')
+
+
+class TrainClosureModelTests(TestCase):
+    """Separação treino/avaliação do train_closure_model."""
+
+    def test_split_keeps_each_chat_on_one_side(self):
+        samples = [(chat_id, [(str(chat_id), f'janela {window}')], window == 0) for chat_id in range(200) for window in range(4)]
+        train, test = TrainClosureModelCommand()._split(samples, 0.2)
+        self.assertEqual(len(train) + len(test), len(samples))
+        self.assertTrue(0.1 < len(test) / len(samples) < 0.3)
+        sides = {}
+        for side, rows in (('train', train), ('test', test)):
+            for pairs, _ in rows:
+                sides.setdefault(pairs[0][0], set()).add(side)
+        self.assertTrue(all(len(side) == 1 for side in sides.values()))
+
+    def test_command_trains_from_history(self):
+        client = create_client()
+        for contact_id in range(20):
+            for status in ('inactive', 'active'):
+                chat = Chat.objects.create(client=client, contact_id=str(contact_id), status=status)
+                Message.objects.bulk_create([
+                    Message(client=client, chat=chat, contact_id=str(contact_id), content_input=f'mensagem {i}', content_output='ok')
+                    for i in range(5)
+                ])
+        with tempfile.TemporaryDirectory() as directory:
+            output = f'{directory}/closure.json'
+            call_command('train_closure_model', '--source', 'history', '--output', output, stdout=mock.MagicMock())
+
+
+@override_settings(CHAT_ACTIVE_WINDOW_HOURS=24, CHAT_CLOSURE_IDLE_MINUTES=30)
+class ChatCreateOrExistsViewTests(TestCase):
+    """Reaproveitamento do chat ativo no /validate/ (ChatCreateOrExistsView)."""
+
+    def setUp(self):
+        invalidate_origin_registry()
+        self.client_obj = create_client()
+        self.whatsapp = Origin.objects.create(name='whatsapp')
+        self.instagram = Origin.objects.create(name='instagram')
+
+    def validate(self, client=None, origin='whatsapp', contact_id='5511999'):
+        client = client or self.client_obj
+        return self.client.post(
+            reverse('chats:chat-create-or-exists'), {'contact_id': contact_id, 'origin': origin},
+            content_type='application/json', HTTP_AUTHORIZATION=f'Bearer {client.token}'
+        )
+
+    def create_chat(self, client=None, origin=None, message_ago=timedelta(minutes=1), **kwargs):
+        return Chat.objects.create(
+            client=client or self.client_obj, origin=origin or self.whatsapp, contact_id='5511999',
+            last_message_at=timezone.now() - message_ago, **kwargs
+        )
+
+    def test_returns_active_chat(self):
+        chat = self.create_chat()
+        response = self.validate()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.json()['chat_exists'], response.json()['chat_id']), (True, chat.id))
+
+    def test_first_message_creates_chat(self):
+        response = self.validate()
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.validate().json()['chat_id'], response.json()['chat_id'])
+
+    def test_other_client_or_origin_is_not_returned(self):
+        other_client = create_client('Pousada')
+        self.create_chat(client=other_client)
+        self.create_chat(origin=self.instagram)
+
+        response = self.validate()
+        self.assertEqual(response.status_code, 201)
+        chat = Chat.objects.get(id=response.json()['chat_id'])
+        self.assertEqual((chat.client_id, chat.origin_id), (self.client_obj.id, self.whatsapp.id))
+
+    def test_idle_expired_or_closed_chat_starts_a_new_one(self):
+        for kwargs in (
+            {'message_ago': timedelta(hours=1)},
+            {'status': 'inactive'},
+        ):
+            with self.subTest(**kwargs):
+                old = self.create_chat(**kwargs)
+                response = self.validate()
+                self.assertEqual(response.status_code, 201)
+                self.assertNotEqual(response.json()['chat_id'], old.id)
+                Chat.objects.all().delete()
+
+        expired = self.create_chat()
+        Chat.objects.filter(id=expired.id).update(created_at=timezone.now() - timedelta(days=2))
+        response = self.validate()
+        self.assertEqual(response.status_code, 201)
+        self.assertNotEqual(response.json()['chat_id'], expired.id)
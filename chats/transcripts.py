@@ -0,0 +1,67 @@
+import heapq
+from django.conf import settings
+from operator import itemgetter
+from systems.llm import estimate_tokens
+
+
+def build_transcript(messages, max_messages=None, max_tokens=None, archived_messages=None):
+    """
+    Monta o transcript "Input: ... / Output: ..." das últimas mensagens.
+
+    Busca apenas content_input/content_output (values_list), percorre as
+    mensagens da mais recente para a mais antiga e para ao atingir a janela
+    (max_messages) ou o orçamento de tokens (max_tokens). As linhas são unidas
+    uma única vez no final.
+
+    :param messages: QuerySet de Message ordenado por timestamp.
+    :param max_messages: Máximo de mensagens (None = sem limite).
+    :param max_tokens: Orçamento aproximado de tokens (None = sem limite).
+    :param archived_messages: QuerySet opcional de ArchivedMessage (camada fria),
+                              intercalado por timestamp com messages.
+    :return: Tupla (transcript, mensagens incluídas, truncado).
+    """
+    tiers = [messages] if archived_messages is None else [messages, archived_messages]
+    streams = []
+    for queryset in tiers:
+        rows = queryset.reverse().values_list('timestamp', 'content_input', 'content_output')
+        if max_messages:
+            # +1 para saber se houve corte sem uma consulta de count()
+            rows = rows[:max_messages + 1]
+        streams.append(rows.iterator(chunk_size=200))
+    rows = streams[0] if len(streams) == 1 else heapq.merge(*streams, key=itemgetter(0), reverse=True)
+
+    parts = []
+    included = 0
+    tokens = 0
+    truncated = False
+    for _, content_input, content_output in rows:
+        if max_messages and included >= max_messages:
+            truncated = True
+            break
+
+        message_parts = []
+        if content_output:
+            message_parts.append(f"Output: {content_output.strip()}")
+        if content_input:
+            message_parts.append(f"Input: {content_input.strip()}")
+
+        message_tokens = sum(estimate_tokens(part) for part in message_parts)
+        if max_tokens and included and tokens + message_tokens > max_tokens:
+            truncated = True
+            break
+
+        tokens += message_tokens
+        parts.extend(message_parts)
+        included += 1
+
+    parts.reverse()
+    return "\n".join(parts), included, truncated
+
+
+def build_classification_transcript(messages):
+    """Transcript limitado pela janela configurada para o classificador de encerramento."""
+    return build_transcript(
+        messages,
+        max_messages=settings.CHAT_TRANSCRIPT_MAX_MESSAGES,
+        max_tokens=settings.CHAT_TRANSCRIPT_MAX_TOKENS
+    )
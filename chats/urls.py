@@ -3,7 +3,9 @@ from chats.views import (
     ChatCreateOrExistsView,
     ChatDeleteView,
     ChatUpdateFlowView,
+    MessageBulkCreateView,
     MessageCreateView,
+    MessageSearchView,
     ChatLogView,
 )
 
@@ -14,5 +16,7 @@ urlpatterns = [
     path('chat/update/', ChatUpdateFlowView.as_view(), name='chat-update-flow'),
     path('validate/', ChatCreateOrExistsView.as_view(), name='chat-create-or-exists'),
     path('messages/<str:client_type>/', MessageCreateView.as_view(), name='message-create'),
+    path('messages/<str:client_type>/bulk/', MessageBulkCreateView.as_view(), name='message-bulk-create'),
+    path('search/messages/', MessageSearchView.as_view(), name='message-search'),
     path('delete/chat/<str:client_type>/', ChatDeleteView.as_view(), name='chat-delete'),
 ]
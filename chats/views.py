@@ -1,14 +1,19 @@
-import datetime
 import logging
-from chats.models import Chat, Message
-from common.models import Origin
+from chats.functions import ingest_messages
+from chats.models import ArchivedChat, ArchivedMessage, Chat, Message
+from chats.search import search_message_ids
+from chats.state import clean_chat_state, flush_chat_state, get_chat_state, update_chat_state
+from chats.transcripts import build_transcript
+from common.origins import resolve_origin
 from clients.models import Client
 from datetime import timedelta
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import Q
 from django.utils import timezone
 from django.utils.timezone import now
 from drf_yasg import openapi
 from drf_yasg.utils import swagger_auto_schema
-from chats.functions import get_chat_finished
 from rest_framework import status
 from rest_framework.response import Response
 from rest_framework.views import APIView
@@ -61,10 +66,6 @@ class ChatCreateOrExistsView(APIView):
         }
     )
     def post(self, request):
-        current_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-
-        print(f"[{current_time}] ChatCreateOrExistsView called")
-        print(f"[{current_time}] Request data: {request.data}")
         try:
             auth_header = request.headers.get('Authorization', '')
             if not auth_header.startswith('Bearer '):
@@ -83,74 +84,44 @@ class ChatCreateOrExistsView(APIView):
             # flow_option = request.data.get('flow_option', 0)
             origin_name = request.data.get('origin')
 
-            if not all([contact_id]):
+            if not all([contact_id, origin_name]):
                 return Response({'detail': 'Missing required fields'}, status=400)
 
-            # Verificando se existe algum chat ativo para o contact_id nas últimas 12 horas
-            time_threshold = timezone.now() - timedelta(hours=12)
+            # Origem resolvida em memória (common.origins), sem consulta ao banco
+            origin = resolve_origin(origin_name)
+            if not origin:
+                return Response({'detail': f"Origin '{origin_name}' not found"}, status=404)
+
+            # Chat ativo do contato no próprio cliente e origem, em uma única consulta:
+            # criado dentro da janela CHAT_ACTIVE_WINDOW_HOURS e com mensagem recente
+            # (Chat.last_message_at, dentro de CHAT_CLOSURE_IDLE_MINUTES). O encerramento
+            # por conteúdo é decidido em background pelo comando sweep_chats.
+            request_time = timezone.now()
+            time_threshold = request_time - timedelta(hours=settings.CHAT_ACTIVE_WINDOW_HOURS)
+            idle_threshold = request_time - timedelta(minutes=settings.CHAT_CLOSURE_IDLE_MINUTES)
             existing_chat = Chat.objects.filter(
+                Q(last_message_at__gte=idle_threshold) |
+                Q(last_message_at__isnull=True, created_at__gte=idle_threshold),
+                client=client,
+                origin=origin,
                 contact_id=contact_id,
                 status='active',
                 created_at__gte=time_threshold
             ).first()
-            print('irá verificar se o chat existe')
 
             if existing_chat:
-                print('chat existente nas últimas 12 horas.')
-                # Filtra mensagens do contato nas últimas 12h
-                messages_12h = Message.objects.filter(
-                    contact_id=contact_id,
-                    timestamp__gte=time_threshold
-                ).order_by('timestamp')
-                
-                if not messages_12h.exists():
-                    print('Não existem mensagens nas últimas 12 horas.')
-                    origin = Origin.objects.filter(name__iexact=origin_name).first()
-                    if not origin:
-                        return Response({'detail': f"Origin '{origin_name}' not found"}, status=404)
-
-                    chat = Chat.objects.create(
-                        client=client,
-                        origin=origin,
-                        contact_id=contact_id,
-                        status='active'
-                    )
-
-                    return Response({
-                        "chat_exists": False,
-                        "chat_created": chat.created_at,
-                        "chat_id": chat.id,
-                        "room_availability": False,
-                        "rooms": 0,
-                        "language": "espanhol"
-                    }, status=201)                     
-                
-                print('existem mensagens nas ultimas 24 horas, verificando se o chat foi finalizado...')
-                chat_log = ""
-                for msg in messages_12h:
-                    if msg.content_input:
-                        chat_log += f"Input: {msg.content_input.strip()}\n"
-                    if msg.content_output:
-                        chat_log += f"Output: {msg.content_output.strip()}\n"
-
-                chat_log += "\nAnalisando os inputs e outputs, que é uma conversa, essa conversa foi encerrada? Você deve apenas responder com True ou False." 
-                chat_finished = get_chat_finished(chat_log)
-                # chat_finished = "false"  # Simulando a resposta da IA, deve ser substituído pela chamada real
-                
-                if isinstance(chat_finished, str) and "false" in chat_finished.lower():
-                    return Response({
-                        "chat_exists": True, 
-                        "chat_id": existing_chat.id,
-                        "flow": existing_chat.flow,
-                        "flow_option": existing_chat.flow_option,
-                        "room_availability": existing_chat.room_availability,
-                        "rooms": existing_chat.rooms,
-                        "language": existing_chat.language
-                    }, status=200)               
-
-            origin = Origin.objects.filter(name__iexact=origin_name).first()
-            if not origin:
-                return Response({'detail': f"Origin '{origin_name}' not found"}, status=404)
+                state = get_chat_state(existing_chat.id, chat=existing_chat)
+                return Response({
+                    "chat_exists": True, 
+                    "chat_id": existing_chat.id,
+                    "flow": state['flow'],
+                    "flow_option": state['flow_option'],
+                    "room_availability": state['room_availability'],
+                    "rooms": state['rooms'],
+                    "language": state['language'],
+                    "message_count": existing_chat.message_count,
+                    "last_message_at": existing_chat.last_message_at
+                }, status=200)               
 
             chat = Chat.objects.create(
                 client=client,
@@ -158,20 +129,7 @@ class ChatCreateOrExistsView(APIView):
                 contact_id=contact_id,
                 status='active'
             )
-            current_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-
-            chat_data = {
-                "chat_exists": False,
-                "chat_created": chat.created_at,
-                "chat_id": chat.id,
-                "room_availability": False,
-                "rooms": 0,
-                "language": "espanhol"
-            }
-            
-            # formatted_json = json.dumps(chat_data, indent=4)
-
-            print(f"[{current_time}] Chat Criado: {chat_data}")       
+            logger.debug(f"[Validate] chat {chat.id} criado para o cliente {client.id}")
 
             return Response({
                 "chat_exists": False,
@@ -249,41 +207,26 @@ class ChatUpdateFlowView(APIView):
             if not chat_id:
                 return Response({'detail': 'Missing chat_id'}, status=400)
 
-            chat = Chat.objects.filter(id=chat_id, client=client).first()
-            if not chat:
+            # Estado de sessão do chat (chats.state): só os campos de estado são lidos e gravados
+            state = get_chat_state(chat_id)
+            if not state or state['client_id'] != client.id:
                 return Response({'detail': 'Chat not found'}, status=404)
 
             # Atualiza os campos se forem fornecidos
-            flow = request.data.get('flow')
-            flow_option = request.data.get('flow_option')
-            room_availability = request.data.get('room_availability')
-            rooms = request.data.get('rooms')
-            language = request.data.get('language')
-
-            if flow is not None:
-                chat.flow = flow
-
-            if flow_option is not None:
-                chat.flow_option = flow_option
-
-            if room_availability is not None:
-                chat.room_availability = room_availability
-            
-            if rooms is not None:
-                chat.rooms = rooms
-            
-            if language is not None:
-                chat.language = language
+            try:
+                changes = clean_chat_state(request.data)
+            except ValidationError as e:
+                return Response({'detail': e.messages}, status=400)
 
-            chat.save()
+            state = update_chat_state(chat_id, state, changes)
 
             return Response({
-                'chat_id': chat.id,
-                'flow': chat.flow,
-                'flow_option': chat.flow_option,
-                'room_availability': chat.room_availability,
-                'rooms': chat.rooms,
-                'language': chat.language
+                'chat_id': int(chat_id),
+                'flow': state['flow'],
+                'flow_option': state['flow_option'],
+                'room_availability': state['room_availability'],
+                'rooms': state['rooms'],
+                'language': state['language']
             }, status=200)
 
         except Exception as e:
@@ -314,12 +257,16 @@ class MessageCreateView(APIView):
                 'contact_id': openapi.Schema(type=openapi.TYPE_STRING, description='ID do contato'),
                 'chat_id': openapi.Schema(type=openapi.TYPE_STRING, description='ID do chat'),
                 'content_input': openapi.Schema(type=openapi.TYPE_STRING, description='Mensagem recebida do usuário'),
-                'content_output': openapi.Schema(type=openapi.TYPE_STRING, description='Resposta da IA')
+                'content_output': openapi.Schema(type=openapi.TYPE_STRING, description='Resposta da IA'),
+                'external_id': openapi.Schema(type=openapi.TYPE_STRING, description='ID da mensagem no provedor (evita duplicatas em retries)')
             }
         ),
         responses={
+            200: openapi.Response('Mensagem já registrada (mesmo external_id)'),
             201: openapi.Response('Mensagem registrada com sucesso'),
+            400: openapi.Response('Campos obrigatórios ausentes ou de tipo inválido'),
             403: openapi.Response('Token inválido ou cliente inativo'),
+            404: openapi.Response('Chat não encontrado para o cliente'),
             500: openapi.Response('Erro interno')
         }
     )
@@ -339,29 +286,120 @@ class MessageCreateView(APIView):
             if 'chat_id' not in data or 'contact_id' not in data:
                 return Response({'detail': 'chat_id and contact_id are required'}, status=400)
             
-            origin = None
-            if 'origin' in data:
-                origin = Origin.objects.filter(name__iexact=data.get('origin')).first()
-
-            chat = Chat.objects.filter(id=data['chat_id'], client=client).first()
-            message = Message.objects.create(
-                client=client,
-                origin=origin,
-                chat=chat,
-                contact_id=data['contact_id'],
-                content_input=data.get('content_input'),
-                content_output=data.get('content_output')
-            )
+            # Mesmo caminho do endpoint em lote: retries com o mesmo external_id
+            # devolvem a mensagem já gravada, inclusive quando chegam ao mesmo tempo
+            result = ingest_messages(client, [data])[0]
+            if 'error' in result:
+                status_code = 404 if result['error'] == 'Chat not found for this client' else 400
+                return Response({'detail': result['error']}, status=status_code)
+            if result.get('duplicate'):
+                return Response({
+                    'message_id': result['message_id'],
+                    'timestamp': result['timestamp'],
+                    'duplicate': True
+                }, status=200)
 
             return Response({
-                'message_id': message.id,
-                'timestamp': message.timestamp
+                'message_id': result['message_id'],
+                'timestamp': result['timestamp']
             }, status=201)
 
         except Exception as e:
             logger.exception("Erro ao registrar mensagem")
             return Response({"detail": str(e)}, status=500)
 
+class MessageBulkCreateView(APIView):
+    """
+    Registra várias mensagens (de um ou mais chats do cliente) em uma única requisição.
+    Indicado para backfills e canais de alto volume.
+    """
+    authentication_classes = []
+    permission_classes = []
+
+    @swagger_auto_schema(
+        operation_description="Registra um lote de mensagens trocadas entre usuários e IA",
+        manual_parameters=[
+            openapi.Parameter(
+                name='Authorization',
+                in_=openapi.IN_HEADER,
+                type=openapi.TYPE_STRING,
+                description="Bearer {client_token}",
+                required=True,
+                default="Bearer seu_token_aqui"
+            )
+        ],
+        request_body=openapi.Schema(
+            type=openapi.TYPE_OBJECT,
+            required=['messages'],
+            properties={
+                'messages': openapi.Schema(
+                    type=openapi.TYPE_ARRAY,
+                    description='Mensagens no mesmo formato do endpoint unitário',
+                    items=openapi.Schema(
+                        type=openapi.TYPE_OBJECT,
+                        required=['chat_id', 'contact_id'],
+                        properties={
+                            'origin': openapi.Schema(type=openapi.TYPE_STRING, description='Origem da mensagem (e.g., whatsapp)'),
+                            'contact_id': openapi.Schema(type=openapi.TYPE_STRING, description='ID do contato'),
+                            'chat_id': openapi.Schema(type=openapi.TYPE_STRING, description='ID do chat'),
+                            'content_input': openapi.Schema(type=openapi.TYPE_STRING, description='Mensagem recebida do usuário'),
+                            'content_output': openapi.Schema(type=openapi.TYPE_STRING, description='Resposta da IA'),
+                            'external_id': openapi.Schema(type=openapi.TYPE_STRING, description='ID da mensagem no provedor')
+                        }
+                    )
+                )
+            }
+        ),
+        responses={
+            201: openapi.Response('Lote processado', openapi.Schema(
+                type=openapi.TYPE_OBJECT,
+                properties={
+                    'created': openapi.Schema(type=openapi.TYPE_INTEGER),
+                    'duplicates': openapi.Schema(type=openapi.TYPE_INTEGER),
+                    'errors': openapi.Schema(type=openapi.TYPE_INTEGER),
+                    'results': openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Schema(type=openapi.TYPE_OBJECT)),
+                }
+            )),
+            400: openapi.Response('Lote inválido ou nenhuma mensagem registrada'),
+            403: openapi.Response('Token inválido ou cliente inativo'),
+            500: openapi.Response('Erro interno')
+        }
+    )
+    def post(self, request, client_type):
+        try:
+            auth_header = request.headers.get('Authorization', '')
+            if not auth_header.startswith('Bearer '):
+                return Response({'detail': 'Authorization header missing or invalid'}, status=403)
+
+            token = auth_header.split(' ')[1]
+            client = Client.objects.filter(token=token, active=True).first()
+            if not client:
+                return Response({'detail': 'Invalid or inactive client'}, status=403)
+
+            items = request.data.get('messages') if isinstance(request.data, dict) else None
+            if not isinstance(items, list) or not items:
+                return Response({'detail': "'messages' must be a non-empty list"}, status=400)
+            if len(items) > settings.CHAT_BULK_MAX_MESSAGES:
+                return Response(
+                    {'detail': f"At most {settings.CHAT_BULK_MAX_MESSAGES} messages per request"},
+                    status=400
+                )
+
+            results = ingest_messages(client, items)
+            duplicates = sum(1 for result in results if result.get('duplicate'))
+            created = sum(1 for result in results if 'message_id' in result) - duplicates
+
+            return Response({
+                'created': created,
+                'duplicates': duplicates,
+                'errors': len(results) - created - duplicates,
+                'results': results
+            }, status=201 if created or duplicates else 400)
+
+        except Exception as e:
+            logger.exception("Erro ao registrar lote de mensagens")
+            return Response({"detail": str(e)}, status=500)
+
 class ChatDeleteView(APIView):
     authentication_classes = []
     permission_classes = []
@@ -411,8 +449,10 @@ class ChatDeleteView(APIView):
             if not chat:
                 return Response({'detail': 'Chat not found for this client'}, status=404)
 
+            # Grava o estado de sessão pendente antes de encerrar a conversa
+            flush_chat_state(chat.id)
             chat.status = 'archived'
-            chat.save()
+            chat.save(update_fields=['status', 'updated_at'])
 
             return Response(status=204)
 
@@ -425,7 +465,7 @@ class ChatLogView(APIView):
     permission_classes = []
 
     @swagger_auto_schema(
-        operation_description="Retorna o histórico completo (Input/Output) do chat no formato de texto",
+        operation_description="Retorna o histórico (Input/Output) do chat no formato de texto, limitado às mensagens mais recentes",
         manual_parameters=[
             openapi.Parameter(
                 name='Authorization',
@@ -442,6 +482,20 @@ class ChatLogView(APIView):
                 description="ID do chat",
                 required=True
             ),
+            openapi.Parameter(
+                name='max_messages',
+                in_=openapi.IN_QUERY,
+                type=openapi.TYPE_INTEGER,
+                description="Máximo de mensagens mais recentes (0 = todas)",
+                required=False
+            ),
+            openapi.Parameter(
+                name='max_tokens',
+                in_=openapi.IN_QUERY,
+                type=openapi.TYPE_INTEGER,
+                description="Orçamento aproximado de tokens do chat_log (0 = sem limite)",
+                required=False
+            ),
         ],
         responses={
             200: openapi.Response('OK', openapi.Schema(
@@ -449,10 +503,14 @@ class ChatLogView(APIView):
                 properties={
                     'chat_id': openapi.Schema(type=openapi.TYPE_INTEGER),
                     'contact_id': openapi.Schema(type=openapi.TYPE_STRING),
+                    'chat_message_count': openapi.Schema(type=openapi.TYPE_INTEGER),
+                    'last_message_at': openapi.Schema(type=openapi.TYPE_STRING, format=openapi.FORMAT_DATETIME),
                     'messages_count': openapi.Schema(type=openapi.TYPE_INTEGER),
+                    'truncated': openapi.Schema(type=openapi.TYPE_BOOLEAN),
                     'chat_log': openapi.Schema(type=openapi.TYPE_STRING),
                 }
             )),
+            400: openapi.Response('Parâmetros inválidos'),
             403: openapi.Response('Unauthorized'),
             404: openapi.Response('Chat not found'),
             500: openapi.Response('Internal server error'),
@@ -472,35 +530,160 @@ class ChatLogView(APIView):
             if client.active is False:
                 return Response({'detail': 'Client is inactive'}, status=403)
 
-            # Busca o chat do próprio cliente
+            # Busca o chat do próprio cliente na camada quente e, se já foi movido, no arquivo
             chat = Chat.objects.filter(id=chat_id, client=client).first()
+            if not chat:
+                chat = ArchivedChat.objects.filter(id=chat_id, client=client).first()
             if not chat:
                 return Response({'detail': 'Chat not found'}, status=404)
 
-            # Busca TODAS as mensagens que pertencem ao mesmo contexto do chat
-            messages = Message.objects.filter(
-                client=chat.client,
-                origin=chat.origin,
-                contact_id=chat.contact_id,
-            ).order_by('timestamp')
-
-            # Monta o chat_log
-            chat_log_parts = []
-            for msg in messages:
-                if msg.content_input:
-                    chat_log_parts.append(f"Input: {msg.content_input.strip()}")
-                if msg.content_output:
-                    chat_log_parts.append(f"Output: {msg.content_output.strip()}")
-
-            chat_log = "\n".join(chat_log_parts)
+            try:
+                max_messages = int(request.query_params.get('max_messages', settings.CHAT_LOG_MAX_MESSAGES))
+                max_tokens = int(request.query_params.get('max_tokens', settings.CHAT_LOG_MAX_TOKENS))
+            except ValueError:
+                return Response({'detail': "'max_messages' and 'max_tokens' must be integers"}, status=400)
+            if max_messages < 0 or max_tokens < 0:
+                return Response({'detail': "'max_messages' and 'max_tokens' must not be negative"}, status=400)
+
+            # Mensagens que pertencem ao mesmo contexto do chat (nas duas camadas),
+            # limitadas às mais recentes
+            context = {
+                'client_id': chat.client_id,
+                'origin_id': chat.origin_id,
+                'contact_id': chat.contact_id,
+            }
+            messages = Message.objects.filter(**context).order_by('timestamp')
+            archived_messages = ArchivedMessage.objects.filter(**context).order_by('timestamp')
+
+            chat_log, messages_count, truncated = build_transcript(
+                messages,
+                max_messages=max_messages or None,
+                max_tokens=max_tokens or None,
+                archived_messages=archived_messages
+            )
 
             return Response({
                 "chat_id": chat.id,
                 "contact_id": chat.contact_id,
-                "messages_count": messages.count(),
+                "chat_message_count": chat.message_count,
+                "last_message_at": chat.last_message_at,
+                "messages_count": messages_count,
+                "truncated": truncated,
                 "chat_log": chat_log
             }, status=200)
 
         except Exception as e:
             logger.exception(f"Error generating chat log: {str(e)}")
             return Response({"detail": f"Internal server error: {str(e)}"}, status=500)
+
+class MessageSearchView(APIView):
+    """
+    Busca full-text no conteúdo das mensagens do cliente (índice chats.search),
+    ordenada por relevância e paginada.
+    """
+    authentication_classes = []
+    permission_classes = []
+
+    @swagger_auto_schema(
+        operation_description="Busca mensagens do cliente pelo conteúdo (full-text), com paginação",
+        manual_parameters=[
+            openapi.Parameter(
+                name='Authorization',
+                in_=openapi.IN_HEADER,
+                type=openapi.TYPE_STRING,
+                description="Bearer {client_token}",
+                required=True,
+                default="Bearer seu_token_aqui"
+            ),
+            openapi.Parameter(
+                name='q',
+                in_=openapi.IN_QUERY,
+                type=openapi.TYPE_STRING,
+                description="Termos de busca",
+                required=True
+            ),
+            openapi.Parameter(
+                name='page',
+                in_=openapi.IN_QUERY,
+                type=openapi.TYPE_INTEGER,
+                description="Página (começa em 1)",
+                required=False
+            ),
+            openapi.Parameter(
+                name='page_size',
+                in_=openapi.IN_QUERY,
+                type=openapi.TYPE_INTEGER,
+                description=f"Resultados por página (máximo {settings.CHAT_SEARCH_MAX_PAGE_SIZE})",
+                required=False
+            ),
+        ],
+        responses={
+            200: openapi.Response('Resultados da busca', openapi.Schema(
+                type=openapi.TYPE_OBJECT,
+                properties={
+                    'query': openapi.Schema(type=openapi.TYPE_STRING),
+                    'page': openapi.Schema(type=openapi.TYPE_INTEGER),
+                    'page_size': openapi.Schema(type=openapi.TYPE_INTEGER),
+                    'has_next': openapi.Schema(type=openapi.TYPE_BOOLEAN),
+                    'results': openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Schema(type=openapi.TYPE_OBJECT)),
+                }
+            )),
+            400: openapi.Response('Parâmetros inválidos'),
+            403: openapi.Response('Unauthorized'),
+            500: openapi.Response('Erro interno'),
+        }
+    )
+    def get(self, request):
+        try:
+            auth_header = request.headers.get('Authorization', '')
+            if not auth_header.startswith('Bearer '):
+                return Response({'detail': 'Authorization header missing or invalid'}, status=403)
+
+            token = auth_header.split(' ')[1]
+            client = Client.objects.filter(token=token, active=True).first()
+            if not client:
+                return Response({'detail': 'Invalid or inactive client'}, status=403)
+
+            query = request.query_params.get('q', '').strip()
+            if not query:
+                return Response({'detail': "'q' is required"}, status=400)
+
+            try:
+                page = int(request.query_params.get('page', 1))
+                page_size = int(request.query_params.get('page_size', settings.CHAT_SEARCH_PAGE_SIZE))
+            except ValueError:
+                return Response({'detail': "'page' and 'page_size' must be integers"}, status=400)
+            if page < 1 or page_size < 1:
+                return Response({'detail': "'page' and 'page_size' must be positive"}, status=400)
+            page_size = min(page_size, settings.CHAT_SEARCH_MAX_PAGE_SIZE)
+
+            ids, has_next = search_message_ids(query, client_id=client.id, limit=page_size, offset=(page - 1) * page_size)
+
+            rows = Message.objects.filter(id__in=ids).values(
+                'id', 'chat_id', 'contact_id', 'origin_id', 'timestamp', 'content_input', 'content_output'
+            )
+            by_id = {row['id']: row for row in rows}
+            results = [
+                {
+                    'message_id': row['id'],
+                    'chat_id': row['chat_id'],
+                    'contact_id': row['contact_id'],
+                    'origin_id': row['origin_id'],
+                    'timestamp': row['timestamp'],
+                    'content_input': row['content_input'],
+                    'content_output': row['content_output'],
+                }
+                for row in (by_id.get(message_id) for message_id in ids) if row
+            ]
+
+            return Response({
+                'query': query,
+                'page': page,
+                'page_size': page_size,
+                'has_next': has_next,
+                'results': results
+            }, status=200)
+
+        except Exception as e:
+            logger.exception(f"Error searching messages: {str(e)}")
+            return Response({"detail": f"Internal server error: {str(e)}"}, status=500)
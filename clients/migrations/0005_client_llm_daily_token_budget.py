@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-19 10:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clients', '0004_client_information_basic_client_prompt_ai'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='client',
+            name='llm_daily_token_budget',
+            field=models.PositiveIntegerField(default=0, help_text='Daily LLM token budget (prompt + completion). 0 = unlimited. When exceeded, only local classifiers are used'),
+        ),
+    ]
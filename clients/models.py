@@ -25,6 +25,10 @@ class Client(models.Model):
     information_basic = models.TextField(blank=True)
     prompt_ai = models.TextField(blank=True)
     monthly_fee = models.DecimalField(max_digits=10, decimal_places=2)
+    llm_daily_token_budget = models.PositiveIntegerField(
+        default=0,
+        help_text="Daily LLM token budget (prompt + completion). 0 = unlimited. When exceeded, only local classifiers are used"
+    )
     created_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='clients_created', blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -5,6 +5,7 @@ from rest_framework.response import Response
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
 from clients.models import Client
+from systems.llm import LLMBudgetExceeded, chat_completion
 
 # Configurar o logger
 logger = logging.getLogger(__name__)
@@ -127,7 +128,7 @@ class ProcessAndSaveContextView(APIView):
                 return Response({"detail": "Campo 'raw_text' é obrigatório"}, status=400)
             
             # 3. Processar com OpenAI
-            structured_context = self.process_with_openai(raw_text)
+            structured_context = self.process_with_openai(raw_text, client)
             
             # 4. Salvar no banco
             client.information_basic = json.dumps(structured_context, ensure_ascii=False)
@@ -138,11 +139,13 @@ class ProcessAndSaveContextView(APIView):
                 "structured_context": structured_context
             }, status=200)
             
+        except LLMBudgetExceeded as e:
+            return Response({"detail": str(e)}, status=429)
         except Exception as e:
             logger.exception("Erro ao processar contexto")
             return Response({"detail": str(e)}, status=500)
     
-    def process_with_openai(self, raw_text: str) -> dict:
+    def process_with_openai(self, raw_text: str, client=None) -> dict:
         """
         Usa OpenAI para estruturar o texto em categorias
         """
@@ -204,17 +207,19 @@ Retorne APENAS um JSON válido no seguinte formato:
 """
         
         try:
-            response = client_openai.chat.completions.create(
-                model="gpt-4o-mini",  # ou gpt-4o para melhor qualidade
-                messages=[
+            result = chat_completion(
+                [
                     {"role": "system", "content": "Você é um especialista em estruturar informações de hotéis. Retorne apenas JSON válido."},
                     {"role": "user", "content": prompt}
                 ],
+                model="gpt-4o-mini",  # ou gpt-4o para melhor qualidade
                 temperature=0.3,  # Baixa para mais consistência
-                response_format={"type": "json_object"}  # Força resposta JSON
+                response_format={"type": "json_object"},  # Força resposta JSON
+                client=client,
+                purpose='structure_context'
             )
             
-            structured_data = json.loads(response.choices[0].message.content)
+            structured_data = json.loads(result.content)
             return structured_data
             
         except Exception as e:
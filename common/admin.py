@@ -1,4 +1,4 @@
-from common.models import Country, State, City, Origin
+from common.models import CompressionDictionary, Country, State, City, Origin
 from django.contrib import admin
 
 
@@ -26,4 +26,10 @@ class CityAdmin(admin.ModelAdmin):
 class OriginAdmin(admin.ModelAdmin):
     list_display = ('name',  'created_at', 'updated_at')
     search_fields = ('name',)
-    ordering = ('name',)
\ No newline at end of file
+    ordering = ('name',)
+
+@admin.register(CompressionDictionary)
+class CompressionDictionaryAdmin(admin.ModelAdmin):
+    list_display = ('id', 'name', 'created_at')
+    exclude = ('data',)
+    readonly_fields = ('name', 'created_at')
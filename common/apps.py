@@ -1,6 +1,18 @@
 from django.apps import AppConfig
+from django.core import checks
 
 
 class CommonConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'common'
+
+    def ready(self):
+        # Conecta os signals que invalidam o registro de origens em memória
+        import common.origins  # noqa: F401
+
+        # Id do dicionário de compressão fora do cabeçalho (2 bytes) impede a subida;
+        # dicionário inexistente aparece no check com --database (e no migrate)
+        from common.compression import check_compression_dictionary, check_compression_settings
+
+        check_compression_settings()
+        checks.register(check_compression_dictionary, checks.Tags.database)
@@ -0,0 +1,188 @@
+"""
+Compressão de textos longos (common.fields.CompressedTextField).
+
+Formato gravado no banco: 1 byte de cabeçalho seguido do conteúdo.
+
+    0x00  texto UTF-8 sem compressão (textos curtos ou que não diminuem)
+    0x01  deflate (zlib, sem cabeçalho/checksum)
+    0x02  id do dicionário (2 bytes, big-endian) + deflate com dicionário pré-definido
+
+O dicionário compartilhado (CompressionDictionary) ajuda nos textos que repetem
+o mesmo boilerplate milhares de vezes. A escrita usa o dicionário de
+settings.COMPRESSION_DICTIONARY_ID; a leitura carrega qualquer dicionário
+pelo id gravado no cabeçalho, por isso dicionários antigos nunca são apagados.
+Se o dicionário configurado não existir, a escrita segue sem dicionário.
+"""
+import logging
+import re
+import threading
+import zlib
+from collections import Counter
+from django.conf import settings
+from django.core import checks
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DatabaseError
+
+
+RAW = 0x00
+DEFLATE = 0x01
+DEFLATE_DICT = 0x02
+
+MAX_DICTIONARY_SIZE = 32 * 1024
+# O id do dicionário ocupa 2 bytes no cabeçalho
+MAX_DICTIONARY_ID = 0xFFFF
+
+# Quebra em linhas e frases para encontrar os trechos repetidos
+_PIECE_RE = re.compile(r'\n+|(?<=[.!?])\s+')
+
+_dictionaries = {}
+_missing_dictionaries = set()
+_lock = threading.Lock()
+
+logger = logging.getLogger(__name__)
+
+
+def check_compression_settings():
+    """Valida COMPRESSION_DICTIONARY_ID na inicialização (CommonConfig.ready)."""
+    dictionary_id = settings.COMPRESSION_DICTIONARY_ID
+    if not 0 <= dictionary_id <= MAX_DICTIONARY_ID:
+        raise ImproperlyConfigured(
+            f"COMPRESSION_DICTIONARY_ID must be between 0 and {MAX_DICTIONARY_ID}, got {dictionary_id}"
+        )
+
+
+def check_compression_dictionary(app_configs=None, databases=None, **kwargs):
+    """System check (tag database): o dicionário configurado precisa existir no banco."""
+    dictionary_id = settings.COMPRESSION_DICTIONARY_ID
+    if not dictionary_id or not databases:
+        return []
+
+    from common.models import CompressionDictionary
+
+    try:
+        exists = CompressionDictionary.objects.filter(id=dictionary_id).exists()
+    except DatabaseError:
+        # Banco ainda sem as migrações
+        return []
+    if exists:
+        return []
+    return [checks.Error(
+        f"Compression dictionary {dictionary_id} not found; messages are being written without it",
+        hint="Fix COMPRESSION_DICTIONARY_ID or run train_message_dictionary",
+        obj='settings.COMPRESSION_DICTIONARY_ID',
+        id='common.E001',
+    )]
+
+
+def get_dictionary(dictionary_id):
+    """Bytes do dicionário (carregado uma vez por processo; dicionários são imutáveis)."""
+    data = _dictionaries.get(dictionary_id)
+    if data is None:
+        from common.models import CompressionDictionary
+
+        with _lock:
+            data = _dictionaries.get(dictionary_id)
+            if data is None:
+                row = CompressionDictionary.objects.filter(id=dictionary_id).values_list('data', flat=True).first()
+                if row is None:
+                    raise ValueError(f"Compression dictionary {dictionary_id} not found")
+                data = _dictionaries[dictionary_id] = bytes(row)
+    return data
+
+
+def _configured_dictionary():
+    """Dicionário de COMPRESSION_DICTIONARY_ID, ou None se ele não existir (avisa uma vez por processo)."""
+    dictionary_id = settings.COMPRESSION_DICTIONARY_ID
+    if not dictionary_id or dictionary_id in _missing_dictionaries:
+        return 0, None
+    try:
+        return dictionary_id, get_dictionary(dictionary_id)
+    except ValueError:
+        _missing_dictionaries.add(dictionary_id)
+        logger.error(f"[Compression] dicionário {dictionary_id} não encontrado; gravando sem dicionário")
+        return 0, None
+
+
+def _deflate(raw, zdict=None):
+    if zdict:
+        compressor = zlib.compressobj(settings.COMPRESSION_LEVEL, zlib.DEFLATED, -15, zdict=zdict)
+    else:
+        compressor = zlib.compressobj(settings.COMPRESSION_LEVEL, zlib.DEFLATED, -15)
+    return compressor.compress(raw) + compressor.flush()
+
+
+def compress_text(text, dictionary_id=None):
+    """
+    Converte o texto para o formato gravado. Textos menores que
+    COMPRESSION_MIN_LENGTH, ou que não diminuem, ficam sem compressão.
+    Sem dictionary_id usa o dicionário configurado (COMPRESSION_DICTIONARY_ID).
+    """
+    if dictionary_id and not 0 < dictionary_id <= MAX_DICTIONARY_ID:
+        raise ValueError(f"Compression dictionary id must be between 1 and {MAX_DICTIONARY_ID}, got {dictionary_id}")
+
+    raw = text.encode('utf-8')
+    if len(raw) < settings.COMPRESSION_MIN_LENGTH:
+        return bytes([RAW]) + raw
+
+    if dictionary_id is None:
+        dictionary_id, zdict = _configured_dictionary()
+    else:
+        zdict = get_dictionary(dictionary_id) if dictionary_id else None
+    if zdict:
+        data = bytes([DEFLATE_DICT]) + dictionary_id.to_bytes(2, 'big') + _deflate(raw, zdict)
+    else:
+        data = bytes([DEFLATE]) + _deflate(raw)
+
+    if len(data) >= len(raw) + 1:
+        return bytes([RAW]) + raw
+    return data
+
+
+def decompress_text(data):
+    data = bytes(data)
+    if not data:
+        return ''
+
+    header = data[0]
+    if header == RAW:
+        return data[1:].decode('utf-8')
+    if header == DEFLATE:
+        return zlib.decompressobj(-15).decompress(data[1:]).decode('utf-8')
+    if header == DEFLATE_DICT:
+        zdict = get_dictionary(int.from_bytes(data[1:3], 'big'))
+        return zlib.decompressobj(-15, zdict=zdict).decompress(data[3:]).decode('utf-8')
+    raise ValueError(f"Unknown compressed text header {header:#04x}")
+
+
+def train_dictionary(samples, size=MAX_DICTIONARY_SIZE, min_count=2):
+    """
+    Monta um dicionário zlib a partir de textos de exemplo.
+
+    Textos, linhas e frases que se repetem entre os textos são ordenadas por ganho
+    (ocorrências x tamanho); as mais valiosas ficam no fim do dicionário,
+    onde o deflate as alcança com as menores distâncias.
+    """
+    counts = Counter()
+    for text in samples:
+        if not text:
+            continue
+        counts[text] += 1
+        for piece in _PIECE_RE.split(text):
+            piece = piece.strip()
+            if len(piece) >= 8:
+                counts[piece] += 1
+
+    candidates = [(count * len(piece), piece) for piece, count in counts.items() if count >= min_count]
+    candidates.sort(reverse=True)
+
+    chosen = []
+    total = 0
+    for _, piece in candidates:
+        encoded = piece.encode('utf-8')
+        if total + len(encoded) + 1 > size:
+            continue
+        chosen.append(encoded)
+        total += len(encoded) + 1
+
+    chosen.reverse()
+    return b'\n'.join(chosen)
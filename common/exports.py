@@ -0,0 +1,149 @@
+import csv
+import json
+from datetime import date, datetime, time
+from decimal import Decimal
+from django.apps import apps
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+
+# Datasets exportáveis em streaming. Cada entrada define o model, o campo de data
+# usado no filtro por período, o campo do cliente e as colunas exportadas.
+EXPORT_DATASETS = {
+    'log_integrations': {
+        'model': 'systems.LogIntegration',
+        'date_field': 'created_at',
+        'client_field': 'client_id',
+        'fields': (
+            'id', 'client_id', 'contact_id', 'origin', 'to',
+            'content', 'response', 'status_http',
+            'response_time', 'created_at', 'updated_at'
+        ),
+    },
+    'chats': {
+        'model': 'chats.Chat',
+        'date_field': 'created_at',
+        'client_field': 'client',
+        'fields': (
+            'id', 'client', 'origin', 'contact_id', 'flow', 'flow_option',
+            'room_availability', 'rooms', 'status', 'language',
+            'created_at', 'updated_at'
+        ),
+    },
+    'messages': {
+        'model': 'chats.Message',
+        'date_field': 'timestamp',
+        'client_field': 'client',
+        'fields': (
+            'id', 'client', 'origin', 'chat', 'contact_id',
+            'content_input', 'content_output', 'timestamp'
+        ),
+    },
+}
+
+EXPORT_FORMATS = ('csv', 'jsonl')
+
+# Quantidade de linhas buscadas por vez no cursor do banco
+EXPORT_CHUNK_SIZE = 2000
+
+
+class Echo:
+    """
+    Pseudo-buffer para o csv.writer: devolve a linha em vez de guardá-la,
+    assim nada é acumulado em memória.
+    """
+    def write(self, value):
+        return value
+
+
+def parse_export_date(value, end_of_day=False):
+    """
+    Converte 'YYYY-MM-DD' ou ISO datetime em datetime com timezone.
+    Para datas simples, end_of_day=True retorna o último instante do dia.
+    """
+    if not value:
+        return None
+
+    # Data simples primeiro: parse_datetime também aceita 'YYYY-MM-DD' (meia-noite)
+    try:
+        parsed_date = parse_date(value)
+        parsed = None if parsed_date else parse_datetime(value)
+    except ValueError:
+        parsed_date = parsed = None
+    if parsed_date:
+        parsed = datetime.combine(parsed_date, time.max if end_of_day else time.min)
+    elif parsed is None:
+        raise ValueError(f"Invalid date '{value}'. Use YYYY-MM-DD")
+
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def get_export_queryset(dataset, date_from=None, date_to=None, client_id=None):
+    """
+    Monta o queryset (values_list) do dataset com os filtros de data e cliente.
+    """
+    if dataset not in EXPORT_DATASETS:
+        raise ValueError(f"Unknown dataset '{dataset}'. Options: {', '.join(EXPORT_DATASETS)}")
+
+    spec = EXPORT_DATASETS[dataset]
+    model = apps.get_model(spec['model'])
+    queryset = model.objects.all()
+
+    if date_from:
+        queryset = queryset.filter(**{f"{spec['date_field']}__gte": date_from})
+    if date_to:
+        queryset = queryset.filter(**{f"{spec['date_field']}__lte": date_to})
+    if client_id:
+        queryset = queryset.filter(**{spec['client_field']: client_id})
+
+    # Ordena pela PK para aproveitar o índice e manter a exportação estável
+    return queryset.order_by('pk').values_list(*spec['fields'])
+
+
+def _to_text(value):
+    if value is None:
+        return ''
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def _to_json(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def iter_csv(dataset, queryset):
+    """
+    Gera o CSV linha a linha (cabeçalho + registros) usando .iterator().
+    """
+    fields = EXPORT_DATASETS[dataset]['fields']
+    writer = csv.writer(Echo())
+    yield writer.writerow(fields)
+    for row in queryset.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        yield writer.writerow([_to_text(value) for value in row])
+
+
+def iter_jsonl(dataset, queryset):
+    """
+    Gera um objeto JSON por linha usando .iterator().
+    """
+    fields = EXPORT_DATASETS[dataset]['fields']
+    for row in queryset.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        record = {field: _to_json(value) for field, value in zip(fields, row)}
+        yield json.dumps(record, ensure_ascii=False) + '\n'
+
+
+def iter_export(dataset, export_format, queryset):
+    if export_format == 'csv':
+        return iter_csv(dataset, queryset)
+    if export_format == 'jsonl':
+        return iter_jsonl(dataset, queryset)
+    raise ValueError(f"Unknown format '{export_format}'. Options: {', '.join(EXPORT_FORMATS)}")
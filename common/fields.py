@@ -0,0 +1,51 @@
+from common.compression import compress_text, decompress_text
+from django import forms
+from django.db import models
+
+
+class CompressedTextField(models.BinaryField):
+    """
+    Texto gravado comprimido em uma coluna binária (ver common.compression).
+    Leitura e escrita pelo ORM são transparentes: o atributo é sempre str.
+    Filtros por conteúdo (icontains, etc.) não são suportados; use o índice
+    full-text (chats.search).
+    """
+    description = "Text stored compressed (zlib, optional shared dictionary)"
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault('editable', True)
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        if kwargs.get('editable') is True:
+            del kwargs['editable']
+        return name, path, args, kwargs
+
+    def from_db_value(self, value, expression, connection):
+        if value is None:
+            return value
+        return decompress_text(value)
+
+    def to_python(self, value):
+        if value is None or isinstance(value, str):
+            return value
+        return decompress_text(value)
+
+    def get_db_prep_value(self, value, connection, prepared=False):
+        # Como no TextField, valores que não são texto (ex: números vindos do JSON) viram str
+        if value is not None and not isinstance(value, (str, bytes, bytearray, memoryview)):
+            value = str(value)
+        if isinstance(value, str):
+            value = compress_text(value)
+        return super().get_db_prep_value(value, connection, prepared)
+
+    def value_to_string(self, obj):
+        return self.value_from_object(obj)
+
+    def formfield(self, **kwargs):
+        return models.Field.formfield(self, **{
+            'form_class': forms.CharField,
+            'widget': forms.Textarea,
+            **kwargs,
+        })
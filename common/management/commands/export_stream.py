@@ -0,0 +1,47 @@
+import sys
+from common.exports import (
+    EXPORT_DATASETS,
+    EXPORT_FORMATS,
+    get_export_queryset,
+    iter_export,
+    parse_export_date,
+)
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = "Exporta logs de integração, chats ou mensagens em streaming (CSV ou JSONL), com memória constante."
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', choices=list(EXPORT_DATASETS), help="Dataset a exportar")
+        parser.add_argument('--format', dest='export_format', choices=EXPORT_FORMATS, default='csv')
+        parser.add_argument('--date-from', help="Data inicial (YYYY-MM-DD ou ISO datetime)")
+        parser.add_argument('--date-to', help="Data final (YYYY-MM-DD ou ISO datetime)")
+        parser.add_argument('--client-id', type=int, help="ID do cliente")
+        parser.add_argument('--output', '-o', help="Arquivo de saída (padrão: stdout)")
+
+    def handle(self, *args, **options):
+        try:
+            date_from = parse_export_date(options['date_from'])
+            date_to = parse_export_date(options['date_to'], end_of_day=True)
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        queryset = get_export_queryset(
+            options['dataset'], date_from, date_to, options['client_id']
+        )
+        chunks = iter_export(options['dataset'], options['export_format'], queryset)
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8', newline='') as output:
+                total = self._write(chunks, output)
+            self.stderr.write(self.style.SUCCESS(f"{total} linha(s) escrita(s) em {options['output']}"))
+        else:
+            self._write(chunks, sys.stdout)
+
+    def _write(self, chunks, output):
+        total = 0
+        for chunk in chunks:
+            output.write(chunk)
+            total += 1
+        return total
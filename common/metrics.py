@@ -0,0 +1,40 @@
+from django.core.cache import cache
+
+
+# Contadores simples guardados no cache do Django. Com LocMemCache os valores
+# são por processo; para somar entre workers configure um cache compartilhado
+# (CACHE_BACKEND / CACHE_LOCATION no .env).
+METRICS_PREFIX = 'metrics:'
+
+# Nomes conhecidos, registrados pelos módulos que geram métricas
+DECLARED_METRICS = set()
+
+
+def declare(*names):
+    DECLARED_METRICS.update(names)
+
+
+def incr(name, amount=1):
+    key = METRICS_PREFIX + name
+    try:
+        return cache.incr(key, amount)
+    except ValueError:
+        # Chave ainda não existe (ou expirou)
+        if cache.add(key, amount, timeout=None):
+            return amount
+        return cache.incr(key, amount)
+
+
+def get(name):
+    return cache.get(METRICS_PREFIX + name, 0)
+
+
+def snapshot(names=None):
+    names = sorted(names or DECLARED_METRICS)
+    values = cache.get_many([METRICS_PREFIX + name for name in names])
+    return {name: values.get(METRICS_PREFIX + name, 0) for name in names}
+
+
+def hit_rate(hits, misses):
+    total = hits + misses
+    return round(hits / total, 4) if total else None
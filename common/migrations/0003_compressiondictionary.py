@@ -0,0 +1,26 @@
+# Generated by Django 5.2.4 on 2026-10-19 10:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('common', '0002_origin'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CompressionDictionary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(help_text='What the dictionary was trained on, e.g. messages', max_length=100)),
+                ('data', models.BinaryField(help_text='zlib preset dictionary (up to 32 KB)')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Compression Dictionary',
+                'verbose_name_plural': 'Compression Dictionaries',
+            },
+        ),
+    ]
@@ -47,4 +47,16 @@ class Origin(models.Model):
         return f'{self.name}'
     
     class Meta:
-        abstract = False
\ No newline at end of file
+        abstract = False
+# Dicionários compartilhados de compressão (common.compression), treinados a partir dos dados
+class CompressionDictionary(models.Model):
+    name = models.CharField(max_length=100, help_text="What the dictionary was trained on, e.g. messages")
+    data = models.BinaryField(help_text="zlib preset dictionary (up to 32 KB)")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f'{self.name} #{self.id}'
+
+    class Meta:
+        verbose_name = 'Compression Dictionary'
+        verbose_name_plural = 'Compression Dictionaries'
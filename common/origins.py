@@ -0,0 +1,56 @@
+"""
+Registro em memória das origens (whatsapp, instagram, ...).
+
+São poucas linhas que quase nunca mudam, então o mapa nome (case-folded) ->
+Origin é carregado uma vez por processo, na primeira consulta, e resolvido
+sem ir ao banco. O save/delete de uma Origin invalida o registro do próprio
+processo (signals); os demais processos recarregam após ORIGIN_REGISTRY_TTL
+segundos.
+"""
+import threading
+import time
+from common.models import Origin
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+
+_registry = None
+_loaded_at = 0.0
+_lock = threading.Lock()
+
+
+def _key(name):
+    return name.strip().casefold()
+
+
+def get_origin_registry():
+    """Retorna o mapa {nome case-folded: Origin}, carregando-o se necessário."""
+    global _registry, _loaded_at
+    registry = _registry
+    if registry is not None and time.monotonic() - _loaded_at < settings.ORIGIN_REGISTRY_TTL:
+        return registry
+    with _lock:
+        if _registry is None or time.monotonic() - _loaded_at >= settings.ORIGIN_REGISTRY_TTL:
+            _registry = {_key(origin.name): origin for origin in Origin.objects.all()}
+            _loaded_at = time.monotonic()
+        return _registry
+
+
+def resolve_origin(name):
+    """Origin pelo nome, sem diferenciar maiúsculas/minúsculas, ou None."""
+    if not isinstance(name, str) or not name.strip():
+        return None
+    return get_origin_registry().get(_key(name))
+
+
+def invalidate_origin_registry():
+    global _registry
+    with _lock:
+        _registry = None
+
+
+@receiver(post_save, sender=Origin)
+@receiver(post_delete, sender=Origin)
+def _origin_changed(sender, **kwargs):
+    invalidate_origin_registry()
@@ -1,3 +1,244 @@
-from django.test import TestCase
+import csv
+import io
+import json
+import tempfile
+from chats.models import Chat, Message
+from chats.resources import MessageResource
+from clients.models import Client
+from common import compression
+from common.compression import compress_text, decompress_text
+from common.exports import EXPORT_DATASETS, get_export_queryset, iter_csv, iter_jsonl, parse_export_date
+from common.models import CompressionDictionary
+from datetime import datetime
+from django.contrib.auth.models import User
+from django.core import serializers
+from django.core.management import CommandError, call_command
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
 
-# Create your tests here.
+
+TEXTS = {
+    'empty': '',
+    'short': 'Olá!',
+    'long': 'Quero reservar um quarto para duas pessoas no fim de semana. ' * 20,
+    'non_ascii': 'Reserva confirmada ✅ — café da manhã incluso, check-in às 14h. 日本語 ' * 5,
+}
+
+BOILERPLATE = 'Obrigado por entrar em contato com o Hotel Central! Nosso horário de atendimento é das 8h às 22h. '
+
+
+def create_client(name='Hotel'):
+    return Client.objects.create(
+        name=name, business_name=name, phone='0', contact=name, email=f'{name.lower()}@example.com',
+        api_token=f'api-{name.lower()}', monthly_fee=0
+    )
+
+
+class CompressionTests(TestCase):
+    """Formato gravado pelo common.compression."""
+
+    def setUp(self):
+        compression._dictionaries.clear()
+        compression._missing_dictionaries.clear()
+        self.addCleanup(compression._dictionaries.clear)
+        self.addCleanup(compression._missing_dictionaries.clear)
+        self.dictionary = CompressionDictionary.objects.create(name='messages', data=BOILERPLATE.encode('utf-8') * 4)
+
+    def test_round_trip(self):
+        for dictionary_id in (0, self.dictionary.id):
+            for name, text in TEXTS.items():
+                with self.subTest(name=name, dictionary_id=dictionary_id):
+                    self.assertEqual(decompress_text(compress_text(text, dictionary_id)), text)
+
+    def test_headers(self):
+        self.assertEqual(compress_text(TEXTS['short'])[0], compression.RAW)
+        self.assertEqual(compress_text(TEXTS['long'], 0)[0], compression.DEFLATE)
+
+        data = compress_text(TEXTS['long'], self.dictionary.id)
+        self.assertEqual(data[0], compression.DEFLATE_DICT)
+        self.assertEqual(int.from_bytes(data[1:3], 'big'), self.dictionary.id)
+
+    def test_dictionary_shrinks_boilerplate(self):
+        text = BOILERPLATE + 'Como posso ajudar?'
+        self.assertLess(len(compress_text(text, self.dictionary.id)), len(compress_text(text, 0)))
+
+    def test_configured_dictionary_is_used_on_write(self):
+        with override_settings(COMPRESSION_DICTIONARY_ID=self.dictionary.id):
+            self.assertEqual(compress_text(TEXTS['long'])[0], compression.DEFLATE_DICT)
+        with override_settings(COMPRESSION_DICTIONARY_ID=0):
+            self.assertEqual(compress_text(TEXTS['long'])[0], compression.DEFLATE)
+
+    def test_missing_configured_dictionary_falls_back(self):
+        with override_settings(COMPRESSION_DICTIONARY_ID=9999):
+            with self.assertLogs('common.compression', 'ERROR'):
+                data = compress_text(TEXTS['long'])
+            self.assertEqual(data[0], compression.DEFLATE)
+            self.assertEqual(decompress_text(data), TEXTS['long'])
+            self.assertEqual(
+                [error.id for error in compression.check_compression_dictionary(databases=['default'])],
+                ['common.E001']
+            )
+
+    def test_dictionary_id_is_capped(self):
+        with self.assertRaises(ValueError):
+            compress_text(TEXTS['long'], compression.MAX_DICTIONARY_ID + 1)
+        for dictionary_id in (-1, compression.MAX_DICTIONARY_ID + 1):
+            with override_settings(COMPRESSION_DICTIONARY_ID=dictionary_id):
+                with self.assertRaises(ImproperlyConfigured):
+                    compression.check_compression_settings()
+
+
+class CompressedTextFieldTests(TestCase):
+    """CompressedTextField pelo ORM (Message.content_input/content_output)."""
+
+    def setUp(self):
+        self.client_obj = create_client()
+        self.chat = Chat.objects.create(client=self.client_obj, contact_id='5511999')
+
+    def create_message(self, content_input, content_output=None):
+        return Message.objects.create(
+            client=self.client_obj, chat=self.chat, contact_id='5511999',
+            content_input=content_input, content_output=content_output
+        )
+
+    def test_round_trip(self):
+        for name, text in TEXTS.items():
+            with self.subTest(name=name):
+                message = self.create_message(text)
+                self.assertEqual(Message.objects.get(id=message.id).content_input, text)
+                self.assertEqual(
+                    Message.objects.filter(id=message.id).values_list('content_input', flat=True).get(), text
+                )
+        self.assertIsNone(Message.objects.get(id=self.create_message(None).id).content_input)
+
+    def test_non_string_values_are_stored_as_text(self):
+        message = self.create_message(123, 4.5)
+        message = Message.objects.get(id=message.id)
+        self.assertEqual((message.content_input, message.content_output), ('123', '4.5'))
+
+        Message.objects.bulk_create([Message(client=self.client_obj, chat=self.chat, contact_id='5511999', content_input=7)])
+        self.assertIn('7', Message.objects.values_list('content_input', flat=True))
+
+    def test_stored_compressed(self):
+        message = self.create_message(TEXTS['long'])
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT content_input FROM chats_message WHERE id = %s", [message.id])
+            stored = bytes(cursor.fetchone()[0])
+        self.assertEqual(stored[0], compression.DEFLATE)
+        self.assertLess(len(stored), len(TEXTS['long'].encode('utf-8')))
+
+    def test_serializer_and_export_output(self):
+        message = self.create_message(TEXTS['non_ascii'], TEXTS['long'])
+
+        fields = json.loads(serializers.serialize('json', [message]))[0]['fields']
+        self.assertEqual((fields['content_input'], fields['content_output']), (TEXTS['non_ascii'], TEXTS['long']))
+
+        dataset = MessageResource().export()
+        self.assertEqual(dataset.dict[0]['content_input'], TEXTS['non_ascii'])
+
+        queryset = get_export_queryset('messages', client_id=self.client_obj.id)
+        record = json.loads(next(iter_jsonl('messages', queryset)))
+        self.assertEqual((record['content_input'], record['content_output']), (TEXTS['non_ascii'], TEXTS['long']))
+        self.assertIn(TEXTS['non_ascii'].strip(), ''.join(iter_csv('messages', queryset)))
+
+
+class StreamingExportTests(TestCase):
+    """Exportação em streaming (common.exports, export_stream e StreamingExportView)."""
+
+    def setUp(self):
+        self.hotel = create_client()
+        self.pousada = create_client('Pousada')
+        self.chats = []
+        for client, contact_id, created_at in (
+            (self.hotel, 'contato, "vip"', datetime(2026, 1, 10, 9)),
+            (self.hotel, '5511999', datetime(2026, 1, 20, 9)),
+            (self.pousada, '5511888', datetime(2026, 1, 15, 18)),
+        ):
+            chat = Chat.objects.create(client=client, contact_id=contact_id)
+            Chat.objects.filter(id=chat.id).update(created_at=timezone.make_aware(created_at))
+            self.chats.append(chat.id)
+
+    def exported_ids(self, date_from=None, date_to=None, client_id=None):
+        queryset = get_export_queryset(
+            'chats', parse_export_date(date_from), parse_export_date(date_to, end_of_day=True), client_id
+        )
+        return [row[0] for row in queryset]
+
+    def test_filters(self):
+        first, second, third = self.chats
+        self.assertEqual(self.exported_ids(), [first, second, third])
+        # date_to com data simples inclui o dia inteiro
+        self.assertEqual(self.exported_ids('2026-01-10', '2026-01-15'), [first, third])
+        self.assertEqual(self.exported_ids('2026-01-15T12:00:00'), [second, third])
+        self.assertEqual(self.exported_ids(client_id=self.hotel.id), [first, second])
+        self.assertEqual(self.exported_ids('2026-01-11', client_id=self.hotel.id), [second])
+        self.assertEqual(parse_export_date('2026-01-15', end_of_day=True).time(), datetime.max.time())
+        for value in ('10/01/2026', '2026-02-30'):
+            with self.assertRaises(ValueError):
+                parse_export_date(value)
+        with self.assertRaises(ValueError):
+            get_export_queryset('clientes')
+
+    def test_csv(self):
+        output = ''.join(iter_csv('chats', get_export_queryset('chats', client_id=self.hotel.id)))
+        rows = list(csv.reader(io.StringIO(output)))
+        self.assertEqual(rows[0], list(EXPORT_DATASETS['chats']['fields']))
+        self.assertEqual(len(rows), 3)
+        record = dict(zip(rows[0], rows[1]))
+        self.assertEqual(record['contact_id'], 'contato, "vip"')
+        self.assertIn('"contato, ""vip"""', output)
+        self.assertEqual(record['origin'], '')
+        self.assertEqual(datetime.fromisoformat(record['created_at']), timezone.make_aware(datetime(2026, 1, 10, 9)))
+
+    def test_jsonl(self):
+        lines = list(iter_jsonl('chats', get_export_queryset('chats')))
+        self.assertEqual(len(lines), 3)
+        self.assertTrue(all(line.endswith('\n') for line in lines))
+        record = json.loads(lines[0])
+        self.assertEqual(list(record), list(EXPORT_DATASETS['chats']['fields']))
+        self.assertEqual((record['id'], record['client'], record['contact_id']), (self.chats[0], self.hotel.id, 'contato, "vip"'))
+        self.assertIsNone(record['origin'])
+
+    def test_command(self):
+        with tempfile.NamedTemporaryFile(suffix='.jsonl') as output:
+            call_command(
+                'export_stream', 'chats', '--format', 'jsonl', '--client-id', str(self.hotel.id),
+                '--date-from', '2026-01-11', '--output', output.name, stderr=io.StringIO()
+            )
+            records = [json.loads(line) for line in open(output.name, encoding='utf-8')]
+        self.assertEqual([record['id'] for record in records], [self.chats[1]])
+
+        with tempfile.NamedTemporaryFile(suffix='.csv') as output:
+            call_command('export_stream', 'chats', '--date-to', '2026-01-15', '-o', output.name, stderr=io.StringIO())
+            with open(output.name, encoding='utf-8', newline='') as file:
+                rows = list(csv.reader(file))
+        self.assertEqual([int(row[0]) for row in rows[1:]], [self.chats[0], self.chats[2]])
+
+        with self.assertRaises(CommandError):
+            call_command('export_stream', 'chats', '--date-from', 'ontem')
+
+    def test_view(self):
+        url = reverse('common:streaming-export', kwargs={'dataset': 'chats'})
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+        self.client.force_login(User.objects.create_user('admin', is_staff=True))
+        response = self.client.get(url, {'client_id': self.pousada.id, 'file_format': 'jsonl'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('application/x-ndjson'))
+        self.assertIn('attachment; filename="chats_', response['Content-Disposition'])
+        content = b''.join(response.streaming_content).decode('utf-8')
+        self.assertEqual([json.loads(line)['id'] for line in content.splitlines()], [self.chats[2]])
+
+        response = self.client.get(url, {'date_from': '2026-01-20'})
+        self.assertTrue(response['Content-Type'].startswith('text/csv'))
+        self.assertEqual(len(b''.join(response.streaming_content).decode('utf-8').splitlines()), 2)
+
+        for params in ({'file_format': 'xlsx'}, {'date_from': '20/01/2026'}, {'client_id': 'abc'}):
+            with self.subTest(**params):
+                self.assertEqual(self.client.get(url, params).status_code, 400)
+        self.assertEqual(
+            self.client.get(reverse('common:streaming-export', kwargs={'dataset': 'clientes'})).status_code, 404
+        )
@@ -0,0 +1,12 @@
+from django.urls import path
+from common.views import MetricsView, StreamingExportView
+
+
+app_name = 'common'
+
+urlpatterns = [
+    # Exportação em streaming (CSV/JSONL) para staff
+    path('exports/<str:dataset>/', StreamingExportView.as_view(), name='streaming-export'),
+    # Contadores internos (cache hit/miss, etc.)
+    path('metrics/', MetricsView.as_view(), name='metrics'),
+]
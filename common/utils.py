@@ -1,3 +1,18 @@
+from django.conf import settings
+
+
+# Backends de cache cujo conteúdo não é visto pelos outros processos
+PROCESS_LOCAL_CACHE_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def is_shared_cache(alias='default'):
+    """True se o cache `alias` é compartilhado entre processos (workers, sweeper)."""
+    return settings.CACHES[alias]['BACKEND'] not in PROCESS_LOCAL_CACHE_BACKENDS
+
+
 def parse_int(data, key, required=True):
     val = data.get(key, None)
     if val is None:
@@ -1,3 +1,141 @@
-from django.shortcuts import render
+import logging
+from common import metrics
+from common.exports import (
+    EXPORT_DATASETS,
+    EXPORT_FORMATS,
+    get_export_queryset,
+    iter_export,
+    parse_export_date,
+)
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from drf_yasg import openapi
+from drf_yasg.utils import swagger_auto_schema
+from rest_framework.authentication import SessionAuthentication
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.views import APIView
 
-# Create your views here.
+
+logger = logging.getLogger(__name__)
+
+class StreamingExportView(APIView):
+    """
+    Exporta logs de integração, chats e mensagens em streaming (CSV ou JSONL).
+    Diferente do export do admin (tablib), não monta o arquivo em memória.
+    Restrito a usuários staff (sessão do admin).
+    """
+    authentication_classes = [SessionAuthentication]
+    permission_classes = [IsAdminUser]
+
+    @swagger_auto_schema(
+        operation_description="Exporta dados em streaming (CSV ou JSONL)",
+        manual_parameters=[
+            openapi.Parameter(
+                name='dataset',
+                in_=openapi.IN_PATH,
+                type=openapi.TYPE_STRING,
+                description=f"Dataset: {', '.join(EXPORT_DATASETS)}",
+                required=True
+            ),
+            openapi.Parameter(
+                name='file_format',
+                in_=openapi.IN_QUERY,
+                type=openapi.TYPE_STRING,
+                description="csv (padrão) ou jsonl",
+                required=False
+            ),
+            openapi.Parameter(
+                name='date_from',
+                in_=openapi.IN_QUERY,
+                type=openapi.TYPE_STRING,
+                description="Data inicial (YYYY-MM-DD ou ISO datetime)",
+                required=False
+            ),
+            openapi.Parameter(
+                name='date_to',
+                in_=openapi.IN_QUERY,
+                type=openapi.TYPE_STRING,
+                description="Data final (YYYY-MM-DD ou ISO datetime)",
+                required=False
+            ),
+            openapi.Parameter(
+                name='client_id',
+                in_=openapi.IN_QUERY,
+                type=openapi.TYPE_INTEGER,
+                description="ID do cliente",
+                required=False
+            ),
+        ],
+        responses={
+            200: openapi.Response('Arquivo exportado em streaming'),
+            400: openapi.Response('Parâmetros inválidos'),
+            403: openapi.Response('Unauthorized'),
+            404: openapi.Response('Dataset not found'),
+        }
+    )
+    def get(self, request, dataset):
+        if dataset not in EXPORT_DATASETS:
+            return Response({'detail': f"Dataset '{dataset}' not found"}, status=404)
+
+        export_format = request.query_params.get('file_format', 'csv').lower()
+        if export_format not in EXPORT_FORMATS:
+            return Response({'detail': f"Invalid file_format. Options: {', '.join(EXPORT_FORMATS)}"}, status=400)
+
+        try:
+            date_from = parse_export_date(request.query_params.get('date_from'))
+            date_to = parse_export_date(request.query_params.get('date_to'), end_of_day=True)
+        except ValueError as e:
+            return Response({'detail': str(e)}, status=400)
+
+        client_id = request.query_params.get('client_id')
+        if client_id and not client_id.isdigit():
+            return Response({'detail': "'client_id' must be an integer"}, status=400)
+
+        queryset = get_export_queryset(dataset, date_from, date_to, client_id)
+
+        content_type = 'text/csv' if export_format == 'csv' else 'application/x-ndjson'
+        filename = f"{dataset}_{timezone.now().strftime('%Y%m%d_%H%M%S')}.{export_format}"
+
+        logger.info(f"[Export] {request.user} exportando {dataset} ({export_format})")
+
+        response = StreamingHttpResponse(
+            iter_export(dataset, export_format, queryset),
+            content_type=f'{content_type}; charset=utf-8'
+        )
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+
+class MetricsView(APIView):
+    """
+    Retorna os contadores de métricas (hits/misses de cache, etc.) e as taxas de acerto.
+    Restrito a usuários staff (sessão do admin).
+    """
+    authentication_classes = [SessionAuthentication]
+    permission_classes = [IsAdminUser]
+
+    @swagger_auto_schema(
+        operation_description="Retorna os contadores de métricas internas",
+        responses={
+            200: openapi.Response('Métricas', openapi.Schema(
+                type=openapi.TYPE_OBJECT,
+                properties={
+                    'counters': openapi.Schema(type=openapi.TYPE_OBJECT),
+                    'hit_rates': openapi.Schema(type=openapi.TYPE_OBJECT),
+                }
+            )),
+            403: openapi.Response('Unauthorized'),
+        }
+    )
+    def get(self, request):
+        counters = metrics.snapshot()
+
+        # Para cada par <grupo>.hit / <grupo>.miss calcula a taxa de acerto
+        hit_rates = {}
+        for name, value in counters.items():
+            if name.endswith('.hit'):
+                group = name[:-len('.hit')]
+                hit_rates[group] = metrics.hit_rate(value, counters.get(f'{group}.miss', 0))
+
+        return Response({'counters': counters, 'hit_rates': hit_rates}, status=200)
@@ -1,7 +1,8 @@
 from django.contrib import admin
 from import_export.admin import ImportExportModelAdmin
-from systems.models import LogIntegration, HotelRooms, LogApiSystem, SystemPrompt, ContextCategory
+from systems.models import LogIntegration, HotelRooms, LogApiSystem, SystemPrompt, ContextCategory, ContextPassage, LogLLMUsage, LLMUsageHourly, LLMUsageDaily
 from django.utils.html import format_html
+from systems.rag import invalidate_context_index
 from systems.resources import LogIntegrationResource 
 
 @admin.register(LogIntegration)
@@ -40,9 +41,41 @@ class LogApiSystemAdmin(admin.ModelAdmin):
     ordering = ('-created_at',)
     readonly_fields = ('created_at',)
 
+@admin.register(LogLLMUsage)
+class LogLLMUsageAdmin(admin.ModelAdmin):
+    list_display = ('client_id', 'purpose', 'model', 'prompt_tokens', 'completion_tokens', 'latency_ms', 'outcome', 'calls', 'created_at')
+    list_filter = ('outcome', 'purpose', 'client_id', 'created_at')
+    ordering = ('-created_at',)
+    readonly_fields = ('created_at',)
+
+@admin.register(LLMUsageHourly)
+class LLMUsageHourlyAdmin(admin.ModelAdmin):
+    list_display = ('hour', 'client_id', 'purpose', 'calls', 'cached_calls', 'errors', 'throttled', 'prompt_tokens', 'completion_tokens', 'avg_latency_ms', 'max_latency_ms')
+    list_filter = ('purpose', 'client_id', 'hour')
+    ordering = ('-hour',)
+
+@admin.register(LLMUsageDaily)
+class LLMUsageDailyAdmin(admin.ModelAdmin):
+    list_display = ('day', 'client_id', 'tokens')
+    list_filter = ('client_id', 'day')
+    ordering = ('-day',)
+
+class ContextPassageInline(admin.TabularInline):
+    """Passagens do contexto (somente leitura: recalculadas ao salvar o conteúdo)"""
+    model = ContextPassage
+    fields = ['position', 'token_count', 'overlap', 'normalized_keywords', 'content']
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+    classes = ['collapse']
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
 @admin.register(ContextCategory)
 class ContextCategoryAdmin(admin.ModelAdmin):
-    list_display = ['client', 'category', 'priority', 'active', 'keywords_preview', 'updated_at']
+    list_display = ['client', 'category', 'priority', 'active', 'token_count', 'keywords_preview', 'updated_at']
     list_filter = ['client', 'category', 'active', 'priority']
     search_fields = ['category', 'content', 'keywords']
     ordering = ['-priority', 'category']
@@ -61,12 +94,13 @@ class ContextCategoryAdmin(admin.ModelAdmin):
             'classes': ('collapse',)
         }),
         ('Metadados', {
-            'fields': ('created_at', 'updated_at'),
+            'fields': ('token_count', 'created_at', 'updated_at'),
             'classes': ('collapse',)
         }),
     )
     
-    readonly_fields = ['created_at', 'updated_at']
+    readonly_fields = ['token_count', 'created_at', 'updated_at']
+    inlines = [ContextPassageInline]
     
     def keywords_preview(self, obj):
         """Mostra preview das keywords"""
@@ -103,13 +137,21 @@ class ContextCategoryAdmin(admin.ModelAdmin):
     
     def activate_contexts(self, request, queryset):
         """Ativa contextos selecionados"""
+        client_ids = set(queryset.values_list('client_id', flat=True))
         updated = queryset.update(active=True)
+        # update() não dispara signals
+        for client_id in client_ids:
+            invalidate_context_index(client_id)
         self.message_user(request, f"{updated} contexto(s) ativado(s)")
     activate_contexts.short_description = "Ativar contextos"
     
     def deactivate_contexts(self, request, queryset):
         """Desativa contextos selecionados"""
+        client_ids = set(queryset.values_list('client_id', flat=True))
         updated = queryset.update(active=False)
+        # update() não dispara signals
+        for client_id in client_ids:
+            invalidate_context_index(client_id)
         self.message_user(request, f"{updated} contexto(s) desativado(s)")
     deactivate_contexts.short_description = "Desativar contextos"        
 
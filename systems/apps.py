@@ -1,6 +1,22 @@
+import logging
 from django.apps import AppConfig
 
 
+logger = logging.getLogger(__name__)
+
+
 class SystemsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'systems'
+
+    def ready(self):
+        from django.conf import settings
+
+        # Conecta os signals que invalidam o índice de contextos RAG em memória
+        import systems.rag  # noqa: F401
+
+        if not settings.DEBUG and settings.CONTEXT_CACHE_TTL > 0 and not systems.rag.result_cache_enabled():
+            logger.warning(
+                "[RAG] cache 'rag' é por processo (RAG_CACHE_BACKEND): respostas do RAG não serão "
+                "guardadas em cache; configure um backend compartilhado para ativá-las"
+            )
@@ -0,0 +1,73 @@
+"""
+Busca de várias keywords em uma única passada (Aho-Corasick).
+
+O KeywordAutomaton é compilado uma vez a partir das keywords normalizadas de
+um cliente (systems.rag.ContextIndex) e encontra, percorrendo a mensagem um
+caractere por vez, todas as keywords contidas nela -- palavra inteira, parte
+de palavra ou várias palavras -- com o mesmo resultado de `keyword in texto`
+para cada uma.
+
+As transições são pré-resolvidas na compilação (cada estado já aponta para o
+destino final de cada caractere do alfabeto das keywords), então cada
+caractere da mensagem custa uma consulta de dicionário; caracteres fora do
+alfabeto voltam à raiz.
+"""
+from collections import deque
+
+
+class KeywordAutomaton:
+
+    def __init__(self, keywords):
+        """
+        :param keywords: Sequência de keywords (já normalizadas); os resultados
+                         de findall são as posições nessa sequência.
+        """
+        self.keywords = tuple(keywords)
+        # Keyword vazia está contida em qualquer texto
+        self._always = frozenset(i for i, keyword in enumerate(self.keywords) if not keyword)
+
+        goto = [{}]
+        outputs = [[]]
+        for i, keyword in enumerate(self.keywords):
+            if not keyword:
+                continue
+            state = 0
+            for ch in keyword:
+                next_state = goto[state].get(ch)
+                if next_state is None:
+                    goto.append({})
+                    outputs.append([])
+                    next_state = len(goto) - 1
+                    goto[state][ch] = next_state
+                state = next_state
+            outputs[state].append(i)
+
+        # Busca em largura: o estado de falha de um nó é sempre mais raso, então
+        # suas transições e saídas já estão resolvidas quando o nó é visitado
+        fail = [0] * len(goto)
+        delta = [None] * len(goto)
+        delta[0] = dict(goto[0])
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            if state:
+                outputs[state] = outputs[state] + outputs[fail[state]]
+                delta[state] = {**delta[fail[state]], **goto[state]}
+            for ch, child in goto[state].items():
+                fail[child] = delta[fail[state]].get(ch, 0) if state else 0
+                queue.append(child)
+
+        self._delta = delta
+        self._outputs = [tuple(output) for output in outputs]
+
+    def findall(self, text):
+        """Posições (em self.keywords) das keywords contidas em text."""
+        found = set(self._always)
+        delta = self._delta
+        outputs = self._outputs
+        state = 0
+        for ch in text:
+            state = delta[state].get(ch, 0)
+            if outputs[state]:
+                found.update(outputs[state])
+        return found
@@ -0,0 +1,368 @@
+"""
+Gateway único para chamadas de LLM (chat completions no formato da OpenAI).
+
+Todas as chamadas do projeto devem passar por chat_completion(), que cuida de:
+- sessão HTTP com pool de conexões reaproveitada entre requisições;
+- timeouts de conexão e leitura;
+- retry com backoff exponencial e jitter para 429/5xx/erros de rede;
+- semáforo limitando chamadas simultâneas por processo;
+- cache determinístico (temperature=0) para prompts idênticos;
+- ledger por cliente e finalidade (LogLLMUsage: tokens, latência e resultado).
+  Respostas do cache são contadas em memória e gravadas em lote (uma linha
+  com calls = N por cliente/finalidade a cada LLM_CACHED_FLUSH_INTERVAL
+  segundos), fora do caminho de cada resposta;
+- orçamento diário de tokens por cliente (Client.llm_daily_token_budget): ao
+  ultrapassar, as chamadas levantam LLMBudgetExceeded e os chamadores usam o
+  caminho local mais barato. O consumo do dia fica em LLMUsageDaily,
+  incrementado com F() no banco, então vale entre todos os processos (workers
+  e sweeper) independentemente do backend de cache;
+- backend plugável (settings.LLM_BACKEND):
+    'openai' -> API da OpenAI ou qualquer servidor compatível (LLM_BASE_URL),
+                inclusive o servidor stub local (`manage.py llm_stub_server`);
+    'stub'   -> respostas locais em processo, sem rede (testes e carga offline).
+"""
+import atexit
+import hashlib
+import json
+import logging
+import random
+import threading
+import time
+import requests
+from clients.models import Client
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+from requests.adapters import HTTPAdapter
+from systems.models import LLMUsageDaily, LogLLMUsage
+
+
+logger = logging.getLogger(__name__)
+
+
+class LLMError(Exception):
+    """Falha definitiva na chamada ao LLM (após os retries)."""
+
+
+class LLMBudgetExceeded(LLMError):
+    """O cliente já consumiu o orçamento diário de tokens."""
+
+
+class LLMResult:
+    def __init__(self, content, usage=None, model=None, cached=False, latency_ms=0.0):
+        self.content = content
+        self.usage = usage or {}
+        self.model = model
+        self.cached = cached
+        self.latency_ms = latency_ms
+
+    @property
+    def prompt_tokens(self):
+        return self.usage.get('prompt_tokens', 0)
+
+    @property
+    def completion_tokens(self):
+        return self.usage.get('completion_tokens', 0)
+
+
+def estimate_tokens(text):
+    # Aproximação usada quando o backend não informa o uso (~4 caracteres por token)
+    return max(1, len(text or '') // 4)
+
+
+class OpenAIBackend:
+    """Backend HTTP compatível com /chat/completions da OpenAI."""
+    RETRY_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+    def __init__(self):
+        self.base_url = settings.LLM_BASE_URL.rstrip('/')
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=settings.LLM_POOL_SIZE,
+            pool_maxsize=settings.LLM_POOL_SIZE
+        )
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def complete(self, payload):
+        api_key = settings.LLM_API_KEY
+        if not api_key:
+            raise LLMError("OPENAI_API_KEY não configurada")
+
+        headers = {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {api_key}",
+        }
+        url = f"{self.base_url}/chat/completions"
+        timeout = (settings.LLM_CONNECT_TIMEOUT, settings.LLM_READ_TIMEOUT)
+
+        last_error = None
+        for attempt in range(settings.LLM_MAX_RETRIES + 1):
+            if attempt:
+                # Backoff exponencial com jitter para não sincronizar os retries
+                base = settings.LLM_RETRY_BACKOFF * (2 ** (attempt - 1))
+                time.sleep(base + random.uniform(0, base))
+            try:
+                response = self.session.post(url, headers=headers, json=payload, timeout=timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                last_error = f"{type(e).__name__}: {e}"
+                logger.warning(f"[LLM] tentativa {attempt + 1} falhou: {last_error}")
+                continue
+
+            if response.status_code == 200:
+                try:
+                    return response.json()
+                except ValueError:
+                    # 200 com corpo que não é JSON (proxy, página de erro): não repete
+                    raise LLMError(f"Invalid LLM response: {response.text[:300]}")
+
+            last_error = f"HTTP {response.status_code}: {response.text[:300]}"
+            if response.status_code not in self.RETRY_STATUS:
+                break
+            logger.warning(f"[LLM] tentativa {attempt + 1} falhou: {last_error}")
+
+        raise LLMError(last_error)
+
+
+class StubBackend:
+    """
+    Backend local e determinístico, sem rede. Responde JSON vazio quando
+    response_format é json_object e settings.LLM_STUB_RESPONSE nos demais casos.
+    """
+
+    def complete(self, payload):
+        if settings.LLM_STUB_LATENCY_MS:
+            time.sleep(settings.LLM_STUB_LATENCY_MS / 1000)
+
+        if (payload.get('response_format') or {}).get('type') == 'json_object':
+            content = '{}'
+        else:
+            content = settings.LLM_STUB_RESPONSE
+
+        prompt = ''.join(m.get('content') or '' for m in payload.get('messages', []))
+        return {
+            'id': 'stub-' + hashlib.sha1(prompt.encode('utf-8')).hexdigest()[:12],
+            'object': 'chat.completion',
+            'model': payload.get('model'),
+            'choices': [{
+                'index': 0,
+                'message': {'role': 'assistant', 'content': content},
+                'finish_reason': 'stop',
+            }],
+            'usage': {
+                'prompt_tokens': estimate_tokens(prompt),
+                'completion_tokens': estimate_tokens(content),
+                'total_tokens': estimate_tokens(prompt) + estimate_tokens(content),
+            },
+        }
+
+
+BACKENDS = {
+    'openai': OpenAIBackend,
+    'stub': StubBackend,
+}
+
+_backend = None
+_backend_lock = threading.Lock()
+_semaphore = None
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                if settings.LLM_BACKEND not in BACKENDS:
+                    raise LLMError(f"Unknown LLM_BACKEND '{settings.LLM_BACKEND}'. Options: {', '.join(BACKENDS)}")
+                _backend = BACKENDS[settings.LLM_BACKEND]()
+    return _backend
+
+
+def _get_semaphore():
+    global _semaphore
+    if _semaphore is None:
+        with _backend_lock:
+            if _semaphore is None:
+                _semaphore = threading.BoundedSemaphore(settings.LLM_MAX_CONCURRENCY)
+    return _semaphore
+
+
+def _cache_key(payload):
+    raw = json.dumps([settings.LLM_BACKEND, payload], sort_keys=True, ensure_ascii=False)
+    return 'llm:' + hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def _client_pk(client):
+    return getattr(client, 'pk', client)
+
+
+def get_daily_tokens(client_id):
+    """Tokens consumidos hoje pelo cliente (LLMUsageDaily)."""
+    return LLMUsageDaily.objects.filter(client_id_id=client_id, day=timezone.localdate()).values_list(
+        'tokens', flat=True
+    ).first() or 0
+
+
+def _add_daily_tokens(client_id, tokens):
+    day = timezone.localdate()
+    rows = LLMUsageDaily.objects.filter(client_id_id=client_id, day=day)
+    if rows.update(tokens=F('tokens') + tokens):
+        return
+    try:
+        with transaction.atomic():
+            LLMUsageDaily.objects.create(client_id_id=client_id, day=day, tokens=tokens)
+    except IntegrityError:
+        # Outro processo criou a linha do dia entre o UPDATE e o INSERT
+        rows.update(tokens=F('tokens') + tokens)
+
+
+def get_client_budget(client_id):
+    key = f"llm_budget_limit:{client_id}"
+    budget = cache.get(key)
+    if budget is None:
+        budget = Client.objects.filter(pk=client_id).values_list('llm_daily_token_budget', flat=True).first() or 0
+        cache.set(key, budget, settings.LLM_BUDGET_CACHE_TTL)
+    return budget
+
+
+def budget_exceeded(client):
+    """True se o cliente tem orçamento diário e já o consumiu."""
+    client_id = _client_pk(client)
+    if not client_id:
+        return False
+    budget = get_client_budget(client_id)
+    return bool(budget) and get_daily_tokens(client_id) >= budget
+
+
+def _record_usage(client_id, purpose, model, usage, latency_ms, outcome):
+    prompt_tokens = usage.get('prompt_tokens', 0) or 0
+    completion_tokens = usage.get('completion_tokens', 0) or 0
+    try:
+        LogLLMUsage.objects.create(
+            client_id_id=client_id,
+            purpose=purpose,
+            model=model,
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            latency_ms=latency_ms,
+            outcome=outcome
+        )
+    except Exception:
+        logger.exception("[LLM] erro ao gravar LogLLMUsage")
+
+    if client_id and (prompt_tokens or completion_tokens):
+        try:
+            _add_daily_tokens(client_id, prompt_tokens + completion_tokens)
+        except Exception:
+            logger.exception("[LLM] erro ao atualizar LLMUsageDaily")
+
+
+_cached_hits = {}
+_cached_hits_lock = threading.Lock()
+_cached_hits_flushed_at = time.monotonic()
+
+
+def _record_cached_hit(client_id, purpose, model):
+    """Conta uma resposta do cache; grava o lote pendente a cada LLM_CACHED_FLUSH_INTERVAL segundos."""
+    global _cached_hits, _cached_hits_flushed_at
+    with _cached_hits_lock:
+        key = (client_id, purpose, model)
+        _cached_hits[key] = _cached_hits.get(key, 0) + 1
+        if time.monotonic() - _cached_hits_flushed_at < settings.LLM_CACHED_FLUSH_INTERVAL:
+            return
+        pending, _cached_hits = _cached_hits, {}
+        _cached_hits_flushed_at = time.monotonic()
+    _write_cached_hits(pending)
+
+
+def flush_cached_hits():
+    """Grava no ledger as respostas do cache ainda pendentes neste processo."""
+    global _cached_hits, _cached_hits_flushed_at
+    with _cached_hits_lock:
+        pending, _cached_hits = _cached_hits, {}
+        _cached_hits_flushed_at = time.monotonic()
+    _write_cached_hits(pending)
+
+
+def _write_cached_hits(pending):
+    if not pending:
+        return
+    try:
+        LogLLMUsage.objects.bulk_create([
+            LogLLMUsage(client_id_id=client_id, purpose=purpose, model=model, outcome='cached', calls=calls)
+            for (client_id, purpose, model), calls in pending.items()
+        ])
+    except Exception:
+        logger.exception("[LLM] erro ao gravar LogLLMUsage")
+
+
+# Não perde as contagens pendentes quando o worker é encerrado normalmente
+atexit.register(flush_cached_hits)
+
+
+def chat_completion(messages, model=None, temperature=0, max_tokens=None, response_format=None,
+                    use_cache=True, client=None, purpose='general'):
+    """
+    Executa um chat completion pelo backend configurado.
+
+    :param messages: Lista de mensagens no formato da OpenAI ({'role', 'content'}).
+    :param model: Modelo (padrão: settings.LLM_DEFAULT_MODEL).
+    :param use_cache: Reaproveita respostas de prompts idênticos quando temperature=0.
+    :param client: Client (ou id) a quem a chamada é atribuída no ledger e no orçamento.
+    :param purpose: Finalidade da chamada, registrada no ledger (ex: 'chat_closure').
+    :return: LLMResult.
+    :raises LLMBudgetExceeded: se o cliente já consumiu o orçamento diário.
+    :raises LLMError: em caso de falha definitiva ou excesso de chamadas simultâneas.
+    """
+    client_id = _client_pk(client)
+    payload = {
+        'model': model or settings.LLM_DEFAULT_MODEL,
+        'messages': messages,
+        'temperature': temperature,
+    }
+    if max_tokens is not None:
+        payload['max_tokens'] = max_tokens
+    if response_format is not None:
+        payload['response_format'] = response_format
+
+    cacheable = use_cache and temperature == 0 and settings.LLM_CACHE_TTL > 0
+    if cacheable:
+        cached = cache.get(_cache_key(payload))
+        if cached is not None:
+            _record_cached_hit(client_id, purpose, payload['model'])
+            return LLMResult(cached['content'], cached['usage'], payload['model'], cached=True)
+
+    if budget_exceeded(client_id):
+        _record_usage(client_id, purpose, payload['model'], {}, 0, 'budget_exceeded')
+        raise LLMBudgetExceeded(f"LLM daily token budget exceeded for client {client_id}")
+
+    semaphore = _get_semaphore()
+    if not semaphore.acquire(timeout=settings.LLM_ACQUIRE_TIMEOUT):
+        _record_usage(client_id, purpose, payload['model'], {}, 0, 'error')
+        raise LLMError("Too many concurrent LLM calls")
+
+    start_time = time.monotonic()
+    try:
+        data = get_backend().complete(payload)
+    except LLMError:
+        latency_ms = round((time.monotonic() - start_time) * 1000, 1)
+        _record_usage(client_id, purpose, payload['model'], {}, latency_ms, 'error')
+        raise
+    finally:
+        semaphore.release()
+    latency_ms = round((time.monotonic() - start_time) * 1000, 1)
+
+    try:
+        content = data['choices'][0]['message']['content']
+    except (KeyError, IndexError, TypeError):
+        _record_usage(client_id, purpose, payload['model'], {}, latency_ms, 'error')
+        raise LLMError(f"Invalid LLM response: {str(data)[:300]}")
+
+    usage = data.get('usage') or {}
+    _record_usage(client_id, purpose, data.get('model') or payload['model'], usage, latency_ms, 'ok')
+    if cacheable:
+        cache.set(_cache_key(payload), {'content': content, 'usage': usage}, settings.LLM_CACHE_TTL)
+
+    return LLMResult(content, usage, data.get('model') or payload['model'], latency_ms=latency_ms)
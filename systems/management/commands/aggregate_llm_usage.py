@@ -0,0 +1,71 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max, Q, Sum
+from django.db.models.functions import TruncHour
+from django.utils import timezone
+from systems.models import LLMUsageHourly, LogLLMUsage
+
+
+class Command(BaseCommand):
+    help = (
+        "Agrega o ledger de uso do LLM (LogLLMUsage) por cliente, finalidade e hora em LLMUsageHourly "
+        "e remove as linhas brutas antigas. Rodar de hora em hora (cron)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=int, default=48, help="Horas completas (re)agregadas")
+        parser.add_argument('--keep-days', type=int, default=7, help="Dias de linhas brutas mantidas no ledger")
+
+    def handle(self, *args, **options):
+        if options['keep_days'] < 1 or options['hours'] > options['keep_days'] * 24:
+            # As horas reagregadas precisam ter as linhas brutas completas
+            raise CommandError("--hours must be <= --keep-days * 24 and --keep-days >= 1")
+
+        current_hour = timezone.now().replace(minute=0, second=0, microsecond=0)
+        since = current_hour - timedelta(hours=options['hours'])
+
+        rows = LogLLMUsage.objects.filter(
+            created_at__gte=since, created_at__lt=current_hour
+        ).annotate(hour=TruncHour('created_at')).values('client_id', 'purpose', 'hour').annotate(
+            # Respostas do cache são gravadas em lotes (uma linha com calls = N)
+            total_calls=Sum('calls'),
+            cached_calls=Sum('calls', filter=Q(outcome='cached')),
+            errors=Sum('calls', filter=Q(outcome='error')),
+            throttled=Sum('calls', filter=Q(outcome='budget_exceeded')),
+            prompt_tokens=Sum('prompt_tokens'),
+            completion_tokens=Sum('completion_tokens'),
+            total_latency_ms=Sum('latency_ms'),
+            max_latency_ms=Max('latency_ms'),
+        )
+
+        total = 0
+        for row in rows:
+            # Valores absolutos: reexecutar o comando não duplica a contagem
+            LLMUsageHourly.objects.update_or_create(
+                client_id_id=row['client_id'],
+                purpose=row['purpose'],
+                hour=row['hour'],
+                defaults={
+                    'calls': row['total_calls'],
+                    'cached_calls': row['cached_calls'] or 0,
+                    'errors': row['errors'] or 0,
+                    'throttled': row['throttled'] or 0,
+                    'prompt_tokens': row['prompt_tokens'] or 0,
+                    'completion_tokens': row['completion_tokens'] or 0,
+                    'total_latency_ms': row['total_latency_ms'] or 0,
+                    'max_latency_ms': row['max_latency_ms'] or 0,
+                }
+            )
+            total += 1
+
+        cutoff = timezone.now() - timedelta(days=options['keep_days'])
+        deleted = 0
+        while True:
+            ids = list(LogLLMUsage.objects.filter(created_at__lt=cutoff).values_list('id', flat=True)[:5000])
+            if not ids:
+                break
+            deleted += LogLLMUsage.objects.filter(id__in=ids).delete()[0]
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{total} linha(s) horária(s) atualizada(s), {deleted} linha(s) bruta(s) removida(s)"
+        ))
@@ -0,0 +1,125 @@
+import random
+import time
+from chats.models import Message
+from clients.models import Client
+from django.core.management.base import BaseCommand, CommandError
+from systems.keywords import KeywordAutomaton
+from systems.rag import ContextIndex
+from systems.text import normalize_keywords, normalize_text
+
+
+VOCABULARY = [
+    'quarto', 'suíte', 'cama', 'casal', 'solteiro', 'reserva', 'reservar', 'diária', 'preço', 'valor',
+    'café da manhã', 'almoço', 'jantar', 'restaurante', 'piscina', 'academia', 'wi-fi', 'estacionamento',
+    'check-in', 'check-out', 'horário', 'pix', 'cartão', 'parcelar', 'cancelamento', 'pet', 'criança',
+    'transfer', 'aeroporto', 'praia', 'passeio', 'evento', 'habitación', 'precio', 'desayuno', 'cochera',
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara o tempo por mensagem do scoring de contextos RAG: loop original (keywords x palavras), "
+        "varredura das keywords distintas e autômato Aho-Corasick, e confere que os três produzem "
+        "os mesmos scores. Usa os contextos de --client ou dados sintéticos."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--client', type=int, help="Id do cliente (padrão: contextos sintéticos)")
+        parser.add_argument('--contexts', type=int, default=15, help="Contextos sintéticos")
+        parser.add_argument('--keywords', type=int, default=30, help="Keywords por contexto sintético")
+        parser.add_argument('--messages', type=int, default=500, help="Mensagens por rodada")
+        parser.add_argument('--rounds', type=int, default=5)
+
+    def handle(self, *args, **options):
+        rng = random.Random(42)
+        if options['client']:
+            client = Client.objects.filter(id=options['client']).first()
+            if client is None:
+                raise CommandError(f"Cliente {options['client']} não encontrado")
+            contexts = ContextIndex.load(client.id).contexts
+            messages = list(
+                Message.objects.filter(client=client, content_input__isnull=False)
+                .order_by('-id').values_list('content_input', flat=True)[:options['messages']]
+            )
+        else:
+            contexts = self._synthetic_contexts(rng, options['contexts'], options['keywords'])
+            messages = []
+        if not contexts:
+            raise CommandError("Nenhum contexto ativo para comparar")
+        while len(messages) < options['messages']:
+            messages.append(' '.join(rng.choices(VOCABULARY + ['quero', 'um', 'para', 'hoje', 'olá'], k=rng.randint(2, 12))))
+        messages = [message.lower() for message in messages]
+
+        scan = ContextIndex(contexts)
+        scan.automaton = None
+        automaton = ContextIndex(contexts)
+        automaton.automaton = KeywordAutomaton(automaton.keywords)
+
+        for message in messages:
+            expected = self._legacy_scores(contexts, message)
+            for index in (scan, automaton):
+                found = [(c['category'], c['score'], c.get('matched_keywords')) for c in index.search(message, len(contexts))]
+                if found != expected:
+                    raise CommandError(f"Scores diferentes para {message!r}: {expected} != {found}")
+
+        self.stdout.write(
+            f"{len(contexts)} contexto(s), {len(scan.keywords)} keyword(s) distinta(s), "
+            f"{len(messages)} mensagem(ns); scores idênticos nas três implementações"
+        )
+        for name, func in (
+            ('original', lambda message: self._legacy_scores(contexts, message)),
+            ('varredura', lambda message: scan.search(message, 3)),
+            ('aho-corasick', lambda message: automaton.search(message, 3)),
+        ):
+            best = min(self._time(func, messages) for _ in range(options['rounds']))
+            self.stdout.write(f"  {name:<13} {best * 1e6 / len(messages):9.1f} µs/mensagem")
+
+    def _time(self, func, messages):
+        start = time.perf_counter()
+        for message in messages:
+            func(message)
+        return time.perf_counter() - start
+
+    def _synthetic_contexts(self, rng, total, keywords_per_context):
+        extra = [
+            ''.join(rng.choices('abcdefghijklmnopqrstuvwxyz', k=rng.randint(4, 10)))
+            for _ in range(total * keywords_per_context)
+        ]
+        contexts = []
+        for i in range(total):
+            keywords = rng.sample(VOCABULARY, min(5, keywords_per_context)) + rng.sample(extra, max(0, keywords_per_context - 5))
+            contexts.append({
+                'id': i, 'category': f'categoria_{i}', 'content': '', 'keywords': keywords,
+                'normalized_keywords': normalize_keywords(keywords), 'term_frequencies': {}, 'term_count': 0,
+                'token_count': 0,
+                'priority': rng.choice([0, 0, 1, 2, 5]),
+            })
+        contexts.sort(key=lambda c: (-c['priority'], c['category']))
+        return contexts
+
+    def _legacy_scores(self, contexts, message):
+        # Loop do GetRelevantContextView antes do índice em memória (sem a consulta ao banco)
+        normalized_message = normalize_text(message)
+        message_words = set(normalized_message.split())
+        scored = []
+        for ctx in contexts:
+            score = 0
+            matched_keywords = []
+            for keyword in ctx['keywords'] or []:
+                normalized_keyword = normalize_text(keyword)
+                if normalized_keyword in normalized_message:
+                    score += 3
+                    matched_keywords.append(keyword)
+                elif normalized_keyword in message_words:
+                    score += 2
+                    matched_keywords.append(keyword)
+                elif any(normalized_keyword in word for word in message_words):
+                    score += 1
+                    matched_keywords.append(keyword)
+            score += ctx['priority'] * 2
+            if score > 0 or ctx['priority'] >= 10:
+                scored.append((ctx['category'], score, ctx['priority'], matched_keywords[:3]))
+        scored.sort(key=lambda x: (x[1], x[2]), reverse=True)
+        if not scored:
+            return [(ctx['category'], 0, None) for ctx in contexts]
+        return [(category, score, matched) for category, score, _, matched in scored]
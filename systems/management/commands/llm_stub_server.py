@@ -0,0 +1,52 @@
+import json
+from django.core.management.base import BaseCommand
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from systems.llm import StubBackend
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    backend = StubBackend()
+
+    def do_POST(self):
+        if not self.path.rstrip('/').endswith('/chat/completions'):
+            self._send(404, {'error': {'message': 'Not found'}})
+            return
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            payload = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError:
+            self._send(400, {'error': {'message': 'Invalid JSON'}})
+            return
+        self._send(200, self.backend.complete(payload))
+
+    def _send(self, status_code, data):
+        body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        self.send_response(status_code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Sobe um servidor local compatível com /v1/chat/completions da OpenAI para testes de carga offline. "
+        "Use LLM_BACKEND=openai LLM_BASE_URL=http://127.0.0.1:8765/v1 e OPENAI_API_KEY com qualquer valor."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8765)
+
+    def handle(self, *args, **options):
+        server = ThreadingHTTPServer((options['host'], options['port']), StubHandler)
+        self.stdout.write(f"LLM stub ouvindo em http://{options['host']}:{options['port']}/v1/chat/completions")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
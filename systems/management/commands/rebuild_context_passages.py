@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from systems.models import ContextCategory
+from systems.rag import invalidate_context_index
+from systems.text import normalize_keywords
+
+
+class Command(BaseCommand):
+    help = (
+        "Recria as passagens (ContextPassage) dos contextos RAG. Rodar após alterar "
+        "CONTEXT_PASSAGE_MAX_TOKENS/CONTEXT_PASSAGE_OVERLAP ou inserir contextos por SQL."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--client', type=int, help="Id do cliente (padrão: todos)")
+
+    def handle(self, *args, **options):
+        contexts = ContextCategory.objects.order_by('client_id', 'id')
+        if options['client']:
+            contexts = contexts.filter(client_id=options['client'])
+
+        client_ids = set()
+        passages = 0
+        for context in contexts.iterator():
+            # Linhas inseridas por SQL ficam com normalized_keywords vazio (db_default)
+            context.normalized_keywords = normalize_keywords(context.keywords)
+            with transaction.atomic():
+                passages += len(context.rebuild_passages())
+            client_ids.add(context.client_id)
+
+        # As passagens não passam pelo save do contexto (não disparam os signals do RAG)
+        for client_id in client_ids:
+            invalidate_context_index(client_id)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{passages} passagem(ns) de {len(client_ids)} cliente(s) recriada(s)"
+        ))
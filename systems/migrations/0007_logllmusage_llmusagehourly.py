@@ -0,0 +1,76 @@
+# Generated by Django 5.2.4 on 2026-10-19 10:24
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clients', '0005_client_llm_daily_token_budget'),
+        ('systems', '0006_alter_contextcategory_options_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='contextcategory',
+            name='category',
+            field=models.CharField(choices=[('quartos', 'Informações sobre Quartos'), ('horarios', 'Horários e Check-in/out'), ('pagamento', 'Formas de Pagamento'), ('servicos', 'Serviços e Amenidades'), ('contato', 'Telefones e Contato'), ('politicas', 'Políticas do Hotel'), ('fluxo_reserva', 'Instruções de Reserva'), ('informacoes_gerais', 'Informações Gerais'), ('eventos', 'Eventos e Atividades'), ('transporte', 'Transporte'), ('localizacao', 'Localização e Atrações'), ('alimentacao', 'Restaurantes e Alimentação'), ('instrucoes_tools', 'Instruções sobre Tools'), ('instrucoes_sistema', 'Instruções do Sistema'), ('informacao_marketing_geral', 'Informações de Marketing')], max_length=50, verbose_name='Categoria'),
+        ),
+        migrations.CreateModel(
+            name='LLMUsageHourly',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('purpose', models.CharField(max_length=50)),
+                ('hour', models.DateTimeField(help_text='Start of the aggregated hour')),
+                ('calls', models.PositiveIntegerField(default=0)),
+                ('cached_calls', models.PositiveIntegerField(default=0)),
+                ('errors', models.PositiveIntegerField(default=0)),
+                ('throttled', models.PositiveIntegerField(default=0, help_text='Calls skipped because the budget was exceeded')),
+                ('prompt_tokens', models.PositiveBigIntegerField(default=0)),
+                ('completion_tokens', models.PositiveBigIntegerField(default=0)),
+                ('total_latency_ms', models.FloatField(default=0)),
+                ('max_latency_ms', models.FloatField(default=0)),
+                ('client_id', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='llm_usages_hourly', to='clients.client')),
+            ],
+            options={
+                'verbose_name': 'LLM Usage (hourly)',
+                'verbose_name_plural': 'LLM Usage (hourly)',
+                'ordering': ['-hour'],
+                'unique_together': {('client_id', 'purpose', 'hour')},
+            },
+        ),
+        migrations.CreateModel(
+            name='LLMUsageDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('tokens', models.PositiveBigIntegerField(default=0, help_text='Prompt + completion tokens')),
+                ('client_id', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='llm_usages_daily', to='clients.client')),
+            ],
+            options={
+                'verbose_name': 'LLM Usage (daily)',
+                'verbose_name_plural': 'LLM Usage (daily)',
+                'ordering': ['-day'],
+                'unique_together': {('client_id', 'day')},
+            },
+        ),
+        migrations.CreateModel(
+            name='LogLLMUsage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('purpose', models.CharField(help_text='What the call was used for, e.g. chat_closure', max_length=50)),
+                ('model', models.CharField(blank=True, max_length=100, null=True)),
+                ('prompt_tokens', models.PositiveIntegerField(default=0)),
+                ('completion_tokens', models.PositiveIntegerField(default=0)),
+                ('latency_ms', models.FloatField(default=0, help_text='Latency in milliseconds')),
+                ('outcome', models.CharField(choices=[('ok', 'OK'), ('cached', 'Cached'), ('error', 'Error'), ('budget_exceeded', 'Budget exceeded')], default='ok', max_length=20)),
+                ('calls', models.PositiveIntegerField(default=1, help_text='Calls represented by the row (cached hits are recorded in batches)')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('client_id', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='llm_usages', to='clients.client')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['client_id', 'created_at'], name='systems_log_client__d8da12_idx'), models.Index(fields=['created_at'], name='systems_log_created_46eb13_idx')],
+            },
+        ),
+    ]
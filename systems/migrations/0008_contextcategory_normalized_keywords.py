@@ -0,0 +1,28 @@
+# Generated by Django 5.2.4 on 2026-10-19 10:41
+
+from django.db import migrations, models
+from systems.text import normalize_keywords
+
+
+def backfill_normalized_keywords(apps, schema_editor):
+    ContextCategory = apps.get_model('systems', 'ContextCategory')
+    contexts = list(ContextCategory.objects.only('id', 'keywords'))
+    for context in contexts:
+        context.normalized_keywords = normalize_keywords(context.keywords)
+    ContextCategory.objects.bulk_update(contexts, ['normalized_keywords'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('systems', '0007_logllmusage_llmusagehourly'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='contextcategory',
+            name='normalized_keywords',
+            field=models.JSONField(default=list, editable=False, help_text='Keywords sem acentos/minúsculas, calculadas ao salvar (usadas pelo índice do RAG)', verbose_name='Palavras-chave normalizadas'),
+        ),
+        migrations.RunPython(backfill_normalized_keywords, migrations.RunPython.noop),
+    ]
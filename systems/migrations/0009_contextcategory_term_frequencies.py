@@ -0,0 +1,39 @@
+# Generated by Django 5.2.4 on 2026-10-19 10:45
+
+from django.db import migrations, models
+from systems.text import term_frequencies
+
+
+def backfill_term_frequencies(apps, schema_editor):
+    ContextCategory = apps.get_model('systems', 'ContextCategory')
+    contexts = list(ContextCategory.objects.only('id', 'content', 'keywords'))
+    for context in contexts:
+        context.term_frequencies = term_frequencies(context.content, context.keywords)
+        context.term_count = sum(context.term_frequencies.values())
+    ContextCategory.objects.bulk_update(contexts, ['term_frequencies', 'term_count'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('systems', '0008_contextcategory_normalized_keywords'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='contextcategory',
+            name='term_count',
+            field=models.PositiveIntegerField(db_default=0, default=0, editable=False, verbose_name='Total de termos'),
+        ),
+        migrations.AddField(
+            model_name='contextcategory',
+            name='term_frequencies',
+            field=models.JSONField(db_default={}, default=dict, editable=False, help_text='Frequência dos termos de conteúdo + keywords, calculada ao salvar (ranking BM25)', verbose_name='Frequência dos termos'),
+        ),
+        migrations.AlterField(
+            model_name='contextcategory',
+            name='normalized_keywords',
+            field=models.JSONField(db_default=[], default=list, editable=False, help_text='Keywords sem acentos/minúsculas, calculadas ao salvar (usadas pelo índice do RAG)', verbose_name='Palavras-chave normalizadas'),
+        ),
+        migrations.RunPython(backfill_term_frequencies, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.4 on 2026-10-19 10:47
+
+from django.db import migrations, models
+from systems.vectors import context_embedding
+
+
+def backfill_embeddings(apps, schema_editor):
+    ContextCategory = apps.get_model('systems', 'ContextCategory')
+    contexts = list(ContextCategory.objects.only('id', 'content', 'keywords'))
+    for context in contexts:
+        context.embedding = context_embedding(context.content, context.keywords)
+    ContextCategory.objects.bulk_update(contexts, ['embedding'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('systems', '0009_contextcategory_term_frequencies'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='contextcategory',
+            name='embedding',
+            field=models.BinaryField(help_text='Contagens das features (float32) de conteúdo + keywords, calculadas ao salvar (busca vetorial)', null=True, verbose_name='Embedding'),
+        ),
+        migrations.RunPython(backfill_embeddings, migrations.RunPython.noop),
+    ]
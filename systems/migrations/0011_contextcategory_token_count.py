@@ -0,0 +1,28 @@
+# Generated by Django 5.2.4 on 2026-10-19 10:49
+
+from django.db import migrations, models
+from systems.text import count_tokens
+
+
+def backfill_token_count(apps, schema_editor):
+    ContextCategory = apps.get_model('systems', 'ContextCategory')
+    contexts = list(ContextCategory.objects.only('id', 'content'))
+    for context in contexts:
+        context.token_count = count_tokens(context.content)
+    ContextCategory.objects.bulk_update(contexts, ['token_count'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('systems', '0010_contextcategory_embedding'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='contextcategory',
+            name='token_count',
+            field=models.PositiveIntegerField(db_default=0, default=0, editable=False, help_text='Tokens estimados do conteúdo, calculados ao salvar (orçamento max_tokens do RAG)', verbose_name='Tokens'),
+        ),
+        migrations.RunPython(backfill_token_count, migrations.RunPython.noop),
+    ]
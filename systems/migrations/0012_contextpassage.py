@@ -0,0 +1,54 @@
+# Generated by Django 5.2.4 on 2026-10-19 10:52
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from systems.passages import build_passages
+from systems.text import normalize_keywords
+
+
+def backfill_passages(apps, schema_editor):
+    ContextCategory = apps.get_model('systems', 'ContextCategory')
+    ContextPassage = apps.get_model('systems', 'ContextPassage')
+    passages = []
+    for context in ContextCategory.objects.only('id', 'content', 'keywords').iterator():
+        passages.extend(
+            ContextPassage(context_id=context.id, **passage)
+            for passage in build_passages(
+                context.content, normalize_keywords(context.keywords),
+                settings.CONTEXT_PASSAGE_MAX_TOKENS, settings.CONTEXT_PASSAGE_OVERLAP
+            )
+        )
+    ContextPassage.objects.bulk_create(passages, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('systems', '0011_contextcategory_token_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContextPassage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.PositiveIntegerField(verbose_name='Posição')),
+                ('content', models.TextField(verbose_name='Conteúdo')),
+                ('overlap', models.PositiveSmallIntegerField(default=0, help_text='Parágrafos iniciais repetidos da passagem anterior', verbose_name='Sobreposição')),
+                ('normalized_keywords', models.JSONField(default=list, help_text='Keywords normalizadas do contexto que aparecem no trecho', verbose_name='Palavras-chave normalizadas')),
+                ('term_frequencies', models.JSONField(default=dict, verbose_name='Frequência dos termos')),
+                ('term_count', models.PositiveIntegerField(default=0, verbose_name='Total de termos')),
+                ('token_count', models.PositiveIntegerField(default=0, verbose_name='Tokens')),
+                ('context', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='passages', to='systems.contextcategory', verbose_name='Contexto')),
+            ],
+            options={
+                'verbose_name': 'Passagem de contexto',
+                'verbose_name_plural': 'Passagens de contexto',
+                'db_table': 'context_passages',
+                'ordering': ['context', 'position'],
+                'unique_together': {('context', 'position')},
+            },
+        ),
+        migrations.RunPython(backfill_passages, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,9 @@
 from clients.models import Client
-from django.db import models
+from django.conf import settings
+from django.db import models, transaction
+from systems.passages import build_passages
+from systems.text import count_tokens, normalize_keywords, term_frequencies
+from systems.vectors import context_embedding
 
 
 class LogIntegration(models.Model):
@@ -29,6 +33,67 @@ class LogApiSystem(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+class LogLLMUsage(models.Model):
+    """Ledger de chamadas ao LLM: uma linha por chamada (respostas do cache: uma linha por lote, ver calls)"""
+    OUTCOME_CHOICES = [
+        ('ok', 'OK'),
+        ('cached', 'Cached'),
+        ('error', 'Error'),
+        ('budget_exceeded', 'Budget exceeded'),
+    ]
+
+    client_id = models.ForeignKey(Client, on_delete=models.CASCADE, related_name='llm_usages', null=True, blank=True)
+    purpose = models.CharField(max_length=50, help_text="What the call was used for, e.g. chat_closure")
+    model = models.CharField(max_length=100, null=True, blank=True)
+    prompt_tokens = models.PositiveIntegerField(default=0)
+    completion_tokens = models.PositiveIntegerField(default=0)
+    latency_ms = models.FloatField(default=0, help_text="Latency in milliseconds")
+    outcome = models.CharField(max_length=20, choices=OUTCOME_CHOICES, default='ok')
+    calls = models.PositiveIntegerField(default=1, help_text="Calls represented by the row (cached hits are recorded in batches)")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['client_id', 'created_at']),
+            models.Index(fields=['created_at']),
+        ]
+
+class LLMUsageHourly(models.Model):
+    """Agregação horária do LogLLMUsage (comando aggregate_llm_usage)"""
+    client_id = models.ForeignKey(Client, on_delete=models.CASCADE, related_name='llm_usages_hourly', null=True, blank=True)
+    purpose = models.CharField(max_length=50)
+    hour = models.DateTimeField(help_text="Start of the aggregated hour")
+    calls = models.PositiveIntegerField(default=0)
+    cached_calls = models.PositiveIntegerField(default=0)
+    errors = models.PositiveIntegerField(default=0)
+    throttled = models.PositiveIntegerField(default=0, help_text="Calls skipped because the budget was exceeded")
+    prompt_tokens = models.PositiveBigIntegerField(default=0)
+    completion_tokens = models.PositiveBigIntegerField(default=0)
+    total_latency_ms = models.FloatField(default=0)
+    max_latency_ms = models.FloatField(default=0)
+
+    class Meta:
+        ordering = ['-hour']
+        unique_together = ['client_id', 'purpose', 'hour']
+        verbose_name = 'LLM Usage (hourly)'
+        verbose_name_plural = 'LLM Usage (hourly)'
+
+    @property
+    def avg_latency_ms(self):
+        return round(self.total_latency_ms / self.calls, 1) if self.calls else 0
+
+class LLMUsageDaily(models.Model):
+    """Tokens consumidos por cliente e dia, incrementados atomicamente a cada chamada (orçamento diário)"""
+    client_id = models.ForeignKey(Client, on_delete=models.CASCADE, related_name='llm_usages_daily')
+    day = models.DateField()
+    tokens = models.PositiveBigIntegerField(default=0, help_text="Prompt + completion tokens")
+
+    class Meta:
+        ordering = ['-day']
+        unique_together = ['client_id', 'day']
+        verbose_name = 'LLM Usage (daily)'
+        verbose_name_plural = 'LLM Usage (daily)'
+
 class HotelRooms(models.Model):
     client_id = models.ForeignKey(Client, on_delete=models.CASCADE, related_name='hotel_rooms')
     room_code = models.CharField(max_length=100, help_text="Code of the hotel room")
@@ -81,6 +146,39 @@ class ContextCategory(models.Model):
         verbose_name='Palavras-chave',
         blank=True
     )
+    normalized_keywords = models.JSONField(
+        default=list,
+        db_default=[],
+        editable=False,
+        help_text="Keywords sem acentos/minúsculas, calculadas ao salvar (usadas pelo índice do RAG)",
+        verbose_name='Palavras-chave normalizadas'
+    )
+    term_frequencies = models.JSONField(
+        default=dict,
+        db_default={},
+        editable=False,
+        help_text="Frequência dos termos de conteúdo + keywords, calculada ao salvar (ranking BM25)",
+        verbose_name='Frequência dos termos'
+    )
+    term_count = models.PositiveIntegerField(
+        default=0,
+        db_default=0,
+        editable=False,
+        verbose_name='Total de termos'
+    )
+    token_count = models.PositiveIntegerField(
+        default=0,
+        db_default=0,
+        editable=False,
+        help_text="Tokens estimados do conteúdo, calculados ao salvar (orçamento max_tokens do RAG)",
+        verbose_name='Tokens'
+    )
+    embedding = models.BinaryField(
+        null=True,
+        editable=False,
+        help_text="Contagens das features (float32) de conteúdo + keywords, calculadas ao salvar (busca vetorial)",
+        verbose_name='Embedding'
+    )
     priority = models.IntegerField(
         default=0, 
         help_text="Maior = mais importante. Contextos com prioridade maior aparecem primeiro.",
@@ -109,6 +207,83 @@ class ContextCategory(models.Model):
     def __str__(self):
         return f"{self.get_category_display()} (Prioridade: {self.priority})"
 
+    # Campos calculados a partir de content/keywords no save (o db_default permite
+    # inserts por SQL, ex: sql_new_context.sql; o RAG completa essas linhas ao carregar)
+    DERIVED_FIELDS = ('normalized_keywords', 'term_frequencies', 'term_count', 'token_count', 'embedding')
+
+    def save(self, *args, **kwargs):
+        self.normalized_keywords = normalize_keywords(self.keywords)
+        self.term_frequencies = term_frequencies(self.content, self.keywords)
+        self.term_count = sum(self.term_frequencies.values())
+        self.token_count = count_tokens(self.content)
+        self.embedding = context_embedding(self.content, self.keywords)
+        update_fields = kwargs.get('update_fields')
+        changed = update_fields is None or bool({'content', 'keywords'} & set(update_fields))
+        if update_fields is not None and changed:
+            kwargs['update_fields'] = {*update_fields, *self.DERIVED_FIELDS}
+        # Passagens gravadas na mesma transação: o RAG nunca vê o conteúdo novo com as passagens antigas
+        with transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
+            if changed:
+                self.rebuild_passages()
+
+    def rebuild_passages(self):
+        """Recria as passagens (ContextPassage) a partir de content/keywords e as retorna."""
+        passages = build_passages(
+            self.content, self.normalized_keywords,
+            settings.CONTEXT_PASSAGE_MAX_TOKENS, settings.CONTEXT_PASSAGE_OVERLAP
+        )
+        self.passages.all().delete()
+        return ContextPassage.objects.bulk_create([ContextPassage(context=self, **passage) for passage in passages])
+
+
+class ContextPassage(models.Model):
+    """Trecho de um ContextCategory (ver systems.passages), recalculado no save do contexto"""
+    context = models.ForeignKey(
+        ContextCategory,
+        on_delete=models.CASCADE,
+        related_name='passages',
+        verbose_name='Contexto'
+    )
+    position = models.PositiveIntegerField(
+        verbose_name='Posição'
+    )
+    content = models.TextField(
+        verbose_name='Conteúdo'
+    )
+    overlap = models.PositiveSmallIntegerField(
+        default=0,
+        help_text="Parágrafos iniciais repetidos da passagem anterior",
+        verbose_name='Sobreposição'
+    )
+    normalized_keywords = models.JSONField(
+        default=list,
+        help_text="Keywords normalizadas do contexto que aparecem no trecho",
+        verbose_name='Palavras-chave normalizadas'
+    )
+    term_frequencies = models.JSONField(
+        default=dict,
+        verbose_name='Frequência dos termos'
+    )
+    term_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Total de termos'
+    )
+    token_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Tokens'
+    )
+
+    class Meta:
+        db_table = 'context_passages'
+        ordering = ['context', 'position']
+        unique_together = ['context', 'position']
+        verbose_name = 'Passagem de contexto'
+        verbose_name_plural = 'Passagens de contexto'
+
+    def __str__(self):
+        return f"{self.context.category} #{self.position}"
+
 
 class SystemPrompt(models.Model):
     """Armazena prompts base do sistema"""
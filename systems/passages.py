@@ -0,0 +1,139 @@
+"""
+Divisão do conteúdo de um ContextCategory em passagens (ContextPassage).
+
+O conteúdo é separado em parágrafos (linhas em branco) e agrupado em seções,
+cada uma começando em um título: linha em markdown (#), linha seguida de um
+traço horizontal (━━━, ===, ---) ou linha curta quase toda em maiúsculas.
+Seções pequenas (< max_tokens / 4) são unidas à seguinte e seções grandes
+são quebradas em passagens de até max_tokens; cada passagem seguinte repete
+o título da seção e os últimos `overlap` parágrafos da anterior, para não
+perder o contexto do trecho. Um parágrafo maior que max_tokens é quebrado
+por linhas. Cada passagem guarda quantos dos seus parágrafos iniciais são
+essa repetição (overlap), para que a resposta do RAG os remova quando leva
+também a passagem anterior, sem mexer nos parágrafos que se repetem no
+próprio conteúdo (traços ━━━, listas iguais em seções diferentes).
+
+As passagens são recalculadas no save do ContextCategory (e pelo comando
+`rebuild_context_passages` após alterar CONTEXT_PASSAGE_MAX_TOKENS ou
+CONTEXT_PASSAGE_OVERLAP).
+"""
+import re
+from systems.text import count_tokens, normalize_text, term_frequencies
+
+
+_PARAGRAPH_RE = re.compile(r"\n\s*\n")
+_RULE_RE = re.compile(r"^[\s━─═=\-_*~]{3,}$")
+
+
+def _first_line(block):
+    """Primeira linha que não é um traço horizontal, e se ela é seguida de um traço."""
+    lines = block.splitlines()
+    for i, line in enumerate(lines):
+        if not _RULE_RE.match(line):
+            followed_by_rule = i + 1 < len(lines) and bool(_RULE_RE.match(lines[i + 1]))
+            return line.strip(), followed_by_rule
+    return '', False
+
+
+def _heading(block):
+    """Título da seção iniciada por block, ou None."""
+    line, followed_by_rule = _first_line(block)
+    if not line:
+        return None
+    if line.startswith('#') or followed_by_rule:
+        return line
+    letters = [c for c in line if c.isalpha()]
+    if len(line) <= 80 and len(letters) >= 4 and sum(c.isupper() for c in letters) >= 0.6 * len(letters):
+        return line
+    return None
+
+
+def _tokens(blocks):
+    return count_tokens('\n\n'.join(blocks))
+
+
+def _split_block(block, max_tokens):
+    """Quebra um parágrafo maior que max_tokens em grupos de linhas."""
+    if count_tokens(block) <= max_tokens:
+        return [block]
+    parts = []
+    current = []
+    for line in block.splitlines():
+        if current and count_tokens('\n'.join(current + [line])) > max_tokens:
+            parts.append('\n'.join(current))
+            current = []
+        current.append(line)
+    if current:
+        parts.append('\n'.join(current))
+    return parts
+
+
+def split_passages(content, max_tokens, overlap=1):
+    """
+    Passagens de content, na ordem original: (texto, quantidade de parágrafos
+    iniciais repetidos da passagem anterior).
+    """
+    blocks = []
+    for block in _PARAGRAPH_RE.split(content or ''):
+        block = block.strip('\n')
+        if block.strip():
+            blocks.extend(_split_block(block, max_tokens))
+
+    sections = []
+    for block in blocks:
+        heading = _heading(block)
+        if heading is not None or not sections:
+            sections.append((heading, [block]))
+        else:
+            sections[-1][1].append(block)
+
+    merged = []
+    for heading, section_blocks in sections:
+        if merged and _tokens(merged[-1][1]) < max_tokens // 4:
+            merged[-1] = (merged[-1][0], merged[-1][1] + section_blocks)
+        else:
+            merged.append((heading, section_blocks))
+
+    passages = []
+    for heading, section_blocks in merged:
+        current = []
+        repeated = 0
+        for block in section_blocks:
+            if current and _tokens(current + [block]) > max_tokens:
+                passages.append(('\n\n'.join(current), repeated))
+                carry = current[-overlap:] if overlap else []
+                prefix = [heading] if heading and not any(heading in part for part in carry) else []
+                current = prefix + carry
+                # A sobreposição não pode estourar o tamanho da passagem
+                while current and _tokens(current + [block]) > max_tokens:
+                    current.pop()
+                repeated = len(current)
+            current.append(block)
+        if current:
+            passages.append(('\n\n'.join(current), repeated))
+    return passages
+
+
+def build_passages(content, normalized_keywords, max_tokens, overlap=1):
+    """
+    Campos das passagens de um contexto (position, content, overlap, normalized_keywords,
+    term_frequencies, term_count, token_count). As keywords de cada passagem
+    são as keywords do contexto que aparecem no seu texto.
+    """
+    passages = []
+    for position, (text, repeated) in enumerate(split_passages(content, max_tokens, overlap)):
+        normalized_text = normalize_text(text)
+        passage_keywords = list(dict.fromkeys(
+            keyword for keyword in normalized_keywords or [] if keyword and keyword in normalized_text
+        ))
+        frequencies = term_frequencies(text, passage_keywords)
+        passages.append({
+            'position': position,
+            'content': text,
+            'overlap': repeated,
+            'normalized_keywords': passage_keywords,
+            'term_frequencies': frequencies,
+            'term_count': sum(frequencies.values()),
+            'token_count': count_tokens(text),
+        })
+    return passages
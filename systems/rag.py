@@ -0,0 +1,493 @@
+"""
+Índice em memória dos contextos RAG (ContextCategory) por cliente.
+
+Os contextos ativos de um cliente são carregados uma vez por processo, na
+primeira busca, em um ContextIndex: os campos usados na resposta e um índice
+invertido keyword normalizada -> contextos. As keywords já chegam
+normalizadas do banco (ContextCategory.normalized_keywords, calculado no
+save), então uma busca não consulta o banco nem normaliza keywords. As
+keywords distintas do cliente são localizadas na mensagem em uma única
+passada por um autômato Aho-Corasick (systems.keywords) compilado junto com
+o índice, e os acertos são distribuídos pelos contextos via dicionário. Com
+poucas keywords (< AUTOMATON_MIN_KEYWORDS) testar cada uma com `in` é mais
+rápido em Python e o autômato não é compilado; o resultado é o mesmo (ver
+`manage.py benchmark_context_matching`).
+
+Cada cliente tem um contador de revisão dos contextos no cache 'rag'
+(rag:revision:<id>), incrementado a cada save/delete de ContextCategory (e
+nas ações em massa do admin, que usam queryset.update). O índice em memória
+guarda a revisão com que foi carregado e é recarregado quando ela muda; com
+cache por processo (LocMemCache) os demais processos recarregam após
+CONTEXT_INDEX_TTL segundos.
+
+Com max_tokens, os contextos são escolhidos em ordem de score enquanto
+couberem no orçamento (ContextCategory.token_count, estimado no save com
+systems.text.count_tokens, mais o separador entre contextos); um contexto
+que não cabe é pulado e os seguintes, menores, ainda podem entrar.
+
+Com um cache 'rag' compartilhado (RAG_CACHE_BACKEND), as respostas também
+ficam nele (CONTEXT_CACHE_TTL), com chave formada pela revisão, mensagem
+normalizada, max_contexts, max_tokens, max_passages, categorias e método:
+as mensagens curtas e repetidas ("hola", "precio") são respondidas sem
+pontuar os contextos, e uma alteração de contexto invalida as respostas de
+todos os processos, pois muda a revisão. Com cache por processo a revisão
+não chega aos demais workers, então as respostas não são guardadas (um
+aviso é registrado na subida, ver SystemsConfig.ready).
+
+Com max_passages, cada contexto escolhido leva só as suas max_passages
+passagens mais relevantes (ContextPassage, ver systems.passages), na ordem
+original e sem repetir os parágrafos sobrepostos entre passagens vizinhas
+(ContextPassage.overlap), em vez do conteúdo inteiro: uma keyword
+encontrada em `fluxo_reserva` não envia mais o bloco todo de instruções.
+As passagens são pontuadas por BM25 (estatísticas das
+passagens de todos os contextos do cliente) + KEYWORD_SCORE por keyword
+encontrada no trecho; se nenhuma passagem pontuar, ou se o contexto tiver
+até max_passages passagens, vai o conteúdo inteiro. A escolha acontece antes
+do orçamento max_tokens, que passa a contar os tokens das passagens.
+
+Pontuação, conforme o método pedido:
+
+- 'keywords' (padrão, igual à do GetRelevantContextView original): +3 por
+  keyword contida na mensagem normalizada e +priority * 2. Os pesos 2
+  (palavra inteira) e 1 (parte de uma palavra) do loop antigo nunca eram
+  alcançados, pois uma palavra da mensagem, ou parte dela, também está
+  contida na mensagem inteira.
+- 'bm25': BM25 dos termos da mensagem sobre conteúdo + keywords de cada
+  contexto (systems.text.tokenize: sem acentos, sem stopwords pt/es e com
+  plurais reduzidos). As frequências dos termos são calculadas no save
+  (ContextCategory.term_frequencies) e as estatísticas do cliente (df,
+  tamanho médio) montadas junto com o índice. A prioridade só desempata.
+- 'hybrid': score de keywords/prioridade + CONTEXT_BM25_WEIGHT * BM25
+  relativo ao melhor contexto (0 a 1), para encontrar contextos pelo
+  conteúdo sem inflar a lista de keywords.
+- 'vector': similaridade de cosseno entre embeddings locais de mensagem e
+  contexto (systems.vectors); entram os contextos com similaridade mínima
+  CONTEXT_VECTOR_MIN_SIMILARITY. A matriz do cliente só é montada na
+  primeira busca vetorial.
+"""
+import hashlib
+import json
+import logging
+import math
+import threading
+import time
+from common import metrics
+from django.conf import settings
+from common.utils import is_shared_cache
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from systems.keywords import KeywordAutomaton
+from systems.models import ContextCategory, ContextPassage
+from systems.passages import build_passages
+from systems.text import count_tokens, normalize_keywords, normalize_text, term_frequencies, tokenize
+from systems.vectors import embedding_counts, load_context_vectors
+
+
+logger = logging.getLogger(__name__)
+
+KEYWORD_SCORE = 3
+PRIORITY_WEIGHT = 2
+# Contextos com essa prioridade entram mesmo sem keyword encontrada
+ALWAYS_INCLUDE_PRIORITY = 10
+# A partir de quantas keywords distintas o autômato compensa (medido com benchmark_context_matching)
+AUTOMATON_MIN_KEYWORDS = 100
+
+METHODS = ('keywords', 'bm25', 'hybrid', 'vector')
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Separador entre contextos na resposta do GetRelevantContextView
+CONTEXT_SEPARATOR = "\n\n---\n\n"
+SEPARATOR_TOKENS = count_tokens(CONTEXT_SEPARATOR)
+# Separador entre parágrafos (systems.passages) das passagens escolhidas de um contexto
+PASSAGE_SEPARATOR = "\n\n"
+
+_indexes = {}
+_lock = threading.Lock()
+
+metrics.declare('context_cache.hit', 'context_cache.miss')
+
+
+class Bm25:
+    """Estatísticas BM25 de um conjunto de documentos (contextos ou passagens)."""
+
+    def __init__(self, documents):
+        """
+        :param documents: Lista de dicts com 'term_frequencies' e 'term_count'; os
+                          scores são indexados pela posição nessa lista.
+        """
+        self.total = len(documents)
+        # termo -> [(posição do documento, frequência)]
+        self.term_postings = {}
+        for position, document in enumerate(documents):
+            for term, frequency in (document['term_frequencies'] or {}).items():
+                self.term_postings.setdefault(term, []).append((position, frequency))
+        average_length = sum(document['term_count'] for document in documents) / self.total if documents else 0
+        self.length_norms = [
+            BM25_K1 * (1 - BM25_B + BM25_B * document['term_count'] / average_length) if average_length else BM25_K1
+            for document in documents
+        ]
+
+    def scores(self, terms):
+        """Score BM25 dos termos (distintos) por posição de documento (só documentos com algum termo)."""
+        scores = {}
+        for term in terms:
+            postings = self.term_postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (self.total - len(postings) + 0.5) / (len(postings) + 0.5))
+            for position, frequency in postings:
+                scores[position] = scores.get(position, 0) + (
+                    idf * frequency * (BM25_K1 + 1) / (frequency + self.length_norms[position])
+                )
+        return scores
+
+
+class ContextIndex:
+    """Contextos ativos de um cliente (ordem: -priority, category) e índice invertido das keywords."""
+
+    def __init__(self, contexts, client_id=None):
+        self.client_id = client_id
+        self.contexts = contexts
+        self._vectors = None
+        # keyword normalizada -> [(posição do contexto, posição da keyword, keyword original)]
+        self.postings = {}
+        for position, context in enumerate(contexts):
+            keywords = context['keywords'] or []
+            for order, (keyword, normalized) in enumerate(zip(keywords, context['normalized_keywords'] or [])):
+                self.postings.setdefault(normalized, []).append((position, order, keyword))
+        self.keywords = tuple(self.postings)
+        self.automaton = KeywordAutomaton(self.keywords) if len(self.keywords) >= AUTOMATON_MIN_KEYWORDS else None
+
+        self.bm25 = Bm25(contexts)
+
+        # Passagens de todos os contextos em uma lista (estatísticas BM25 do cliente)
+        # e, por contexto, as posições das suas passagens nela
+        self.passages = []
+        self.context_passages = []
+        for context in contexts:
+            start = len(self.passages)
+            self.passages.extend(context.get('passages') or [])
+            self.context_passages.append(range(start, len(self.passages)))
+        self.passage_bm25 = Bm25(self.passages)
+
+    @classmethod
+    def load(cls, client_id):
+        contexts = list(
+            ContextCategory.objects.filter(client_id=client_id, active=True)
+            .order_by('-priority', 'category')
+            .values(
+                'id', 'category', 'content', 'keywords', 'normalized_keywords',
+                'term_frequencies', 'term_count', 'token_count', 'priority', 'updated_at'
+            )
+        )
+        for context in contexts:
+            # Linhas inseridas por SQL (ex: sql_new_context.sql) não passam pelo save
+            if len(context['normalized_keywords']) != len(context['keywords'] or []):
+                context['normalized_keywords'] = normalize_keywords(context['keywords'])
+            if not context['term_count'] and context['content']:
+                context['term_frequencies'] = term_frequencies(context['content'], context['keywords'])
+                context['term_count'] = sum(context['term_frequencies'].values())
+            if not context['token_count'] and context['content']:
+                context['token_count'] = count_tokens(context['content'])
+
+        passages = {}
+        for passage in (
+            ContextPassage.objects.filter(context__client_id=client_id, context__active=True)
+            .order_by('context_id', 'position')
+            .values(
+                'context_id', 'content', 'overlap', 'normalized_keywords', 'term_frequencies', 'term_count',
+                'token_count'
+            )
+        ):
+            passages.setdefault(passage.pop('context_id'), []).append(passage)
+        for context in contexts:
+            context['passages'] = passages.get(context['id']) or build_passages(
+                context['content'], context['normalized_keywords'],
+                settings.CONTEXT_PASSAGE_MAX_TOKENS, settings.CONTEXT_PASSAGE_OVERLAP
+            )
+        return cls(contexts, client_id)
+
+    @property
+    def vectors(self):
+        """Matriz de embeddings (systems.vectors.ContextVectors), montada na primeira busca vetorial."""
+        if self._vectors is None:
+            self._vectors = load_context_vectors(self.client_id, self.contexts, _load_embedding_counts)
+        return self._vectors
+
+    def match(self, normalized_message):
+        """Keywords normalizadas contidas na mensagem."""
+        if self.automaton is None:
+            return self.match_scan(normalized_message)
+        return [self.keywords[i] for i in self.automaton.findall(normalized_message)]
+
+    def match_scan(self, normalized_message):
+        return [keyword for keyword in self.keywords if keyword in normalized_message]
+
+    def best_passages(self, position, keywords, passage_scores, max_passages):
+        """
+        Conteúdo e tokens das max_passages passagens mais relevantes do contexto,
+        ou do conteúdo inteiro se nenhuma passagem pontuar.
+
+        :param keywords: Keywords normalizadas encontradas na mensagem.
+        :param passage_scores: BM25 da mensagem por posição em self.passages.
+        """
+        context = self.contexts[position]
+        indexes = self.context_passages[position]
+        if len(indexes) > max_passages:
+            scores = {}
+            for index in indexes:
+                score = passage_scores.get(index, 0) + KEYWORD_SCORE * len(
+                    keywords.intersection(self.passages[index]['normalized_keywords'])
+                )
+                if score > 0:
+                    scores[index] = score
+            if scores:
+                # Empate: a passagem anterior (sorted é estável)
+                best = sorted(sorted(scores, key=scores.get, reverse=True)[:max_passages])
+                blocks = []
+                for i, index in enumerate(best):
+                    passage_blocks = self.passages[index]['content'].split(PASSAGE_SEPARATOR)
+                    if i and best[i - 1] == index - 1:
+                        # Remove os parágrafos repetidos da passagem anterior (sobreposição)
+                        passage_blocks = passage_blocks[self.passages[index]['overlap']:]
+                    blocks.extend(passage_blocks)
+                content = PASSAGE_SEPARATOR.join(blocks)
+                return content, count_tokens(content)
+        return context['content'], context['token_count']
+
+    def search(self, message, max_contexts, categories=None, method='keywords', max_tokens=None, max_passages=None):
+        """
+        Contextos mais relevantes para a mensagem, no formato da resposta do
+        GetRelevantContextView ({'category', 'content', 'score', 'priority', ...}).
+
+        :param categories: Restringe a busca a essas categorias (opcional).
+        :param method: 'keywords', 'bm25', 'hybrid' ou 'vector' (ver docstring do módulo).
+        :param max_tokens: Orçamento de tokens dos contextos retornados (None = sem limite).
+        :param max_passages: Passagens por contexto retornadas (None = conteúdo inteiro).
+        """
+        normalized_message = normalize_text(message)
+        matched_keywords = self.match(normalized_message)
+
+        hits = {}
+        for normalized in matched_keywords:
+            for position, order, keyword in self.postings[normalized]:
+                hits.setdefault(position, []).append((order, keyword))
+
+        candidates = [
+            (position, context) for position, context in enumerate(self.contexts)
+            if not categories or context['category'] in categories
+        ]
+
+        terms = set(tokenize(message)) if method in ('bm25', 'hybrid') or max_passages else ()
+        bm25 = self.bm25.scores(terms) if method in ('bm25', 'hybrid') else {}
+        best_bm25 = max((bm25.get(position, 0) for position, _ in candidates), default=0)
+        similarities = self.vectors.similarities(message) if method == 'vector' and candidates else None
+
+        if max_passages:
+            keywords = set(matched_keywords)
+            passage_scores = self.passage_bm25.scores(terms)
+
+        def content(position, context):
+            if max_passages:
+                return self.best_passages(position, keywords, passage_scores, max_passages)
+            return context['content'], context['token_count']
+
+        scored_contexts = []
+        for position, context in candidates:
+            matched = [keyword for _, keyword in sorted(hits.get(position, ()))]
+            if method == 'bm25':
+                score = round(bm25.get(position, 0), 4)
+                relevant = score > 0
+            elif method == 'vector':
+                score = round(float(similarities[position]), 4)
+                relevant = score >= settings.CONTEXT_VECTOR_MIN_SIMILARITY
+            else:
+                score = KEYWORD_SCORE * len(matched) + context['priority'] * PRIORITY_WEIGHT
+                if method == 'hybrid' and best_bm25:
+                    score = round(score + settings.CONTEXT_BM25_WEIGHT * bm25.get(position, 0) / best_bm25, 4)
+                relevant = score > 0
+            if relevant or context['priority'] >= ALWAYS_INCLUDE_PRIORITY:
+                text, tokens = content(position, context)
+                scored_contexts.append({
+                    'category': context['category'],
+                    'content': text,
+                    'score': score,
+                    'priority': context['priority'],
+                    'tokens': tokens,
+                    'matched_keywords': matched[:3]
+                })
+
+        # Ordenar por score (e desempate por prioridade); a ordenação é estável
+        scored_contexts.sort(key=lambda x: (x['score'], x['priority']), reverse=True)
+
+        for ctx in scored_contexts[:5]:
+            logger.debug(
+                f"[RAG] {ctx['category']}: score={ctx['score']}, "
+                f"priority={ctx['priority']}, keywords={ctx['matched_keywords']}"
+            )
+
+        # Se não encontrou nenhum com keywords, retorna os mais importantes (por priority)
+        if not scored_contexts:
+            logger.warning("[RAG] Nenhuma keyword encontrada! Usando fallback por prioridade")
+            scored_contexts = []
+            for position, context in candidates:
+                text, tokens = content(position, context)
+                scored_contexts.append({
+                    'category': context['category'],
+                    'content': text,
+                    'score': 0,
+                    'priority': context['priority'],
+                    'tokens': tokens
+                })
+
+        if max_tokens:
+            return pack_contexts(scored_contexts, max_contexts, max_tokens)
+        return scored_contexts[:max_contexts]
+
+
+def pack_contexts(contexts, max_contexts, max_tokens):
+    """
+    Escolhe, na ordem recebida (score), os contextos que cabem em max_tokens,
+    contando o separador entre eles. Contextos maiores que o espaço restante
+    são pulados.
+    """
+    packed = []
+    used = 0
+    for context in contexts:
+        if len(packed) >= max_contexts:
+            break
+        tokens = context['tokens'] + (SEPARATOR_TOKENS if packed else 0)
+        if used + tokens > max_tokens:
+            logger.debug(f"[RAG] {context['category']} ({context['tokens']} tokens) não cabe no orçamento")
+            continue
+        packed.append(context)
+        used += tokens
+    return packed
+
+
+def context_tokens(contexts):
+    """Tokens estimados da resposta formatada (contextos + separadores)."""
+    return sum(context['tokens'] for context in contexts) + SEPARATOR_TOKENS * max(0, len(contexts) - 1)
+
+
+def _load_embedding_counts(contexts):
+    rows = {
+        row[0]: row[1:] for row in ContextCategory.objects.filter(
+            id__in=[context['id'] for context in contexts]
+        ).values_list('id', 'embedding', 'content', 'keywords')
+    }
+    return [
+        embedding_counts(*rows.get(context['id'], (None, context['content'], context['keywords'])))
+        for context in contexts
+    ]
+
+
+def _cache():
+    return caches['rag']
+
+
+def result_cache_enabled():
+    """Respostas em cache só com o cache 'rag' compartilhado (senão a revisão não invalida os outros processos)."""
+    return settings.CONTEXT_CACHE_TTL > 0 and is_shared_cache('rag')
+
+
+def _revision_key(client_id):
+    return f'rag:revision:{client_id}'
+
+
+def get_context_revision(client_id):
+    """Revisão atual dos contextos do cliente."""
+    cache = _cache()
+    revision = cache.get(_revision_key(client_id))
+    if revision is None:
+        # Valor inicial baseado no relógio: se o contador for perdido (eviction),
+        # a nova revisão não coincide com a de respostas ainda em cache
+        cache.add(_revision_key(client_id), time.time_ns(), None)
+        revision = cache.get(_revision_key(client_id))
+    return revision
+
+
+def bump_context_revision(client_id):
+    cache = _cache()
+    try:
+        return cache.incr(_revision_key(client_id))
+    except ValueError:
+        cache.add(_revision_key(client_id), time.time_ns(), None)
+        return cache.get(_revision_key(client_id))
+
+
+def get_context_index(client_id, revision=None):
+    """Retorna o ContextIndex do cliente, (re)carregando-o se a revisão mudou ou se expirou."""
+    if revision is None:
+        revision = get_context_revision(client_id)
+    entry = _indexes.get(client_id)
+    if entry is not None and entry[1] == revision and time.monotonic() - entry[2] < settings.CONTEXT_INDEX_TTL:
+        return entry[0]
+    with _lock:
+        entry = _indexes.get(client_id)
+        if entry is None or entry[1] != revision or time.monotonic() - entry[2] >= settings.CONTEXT_INDEX_TTL:
+            entry = (ContextIndex.load(client_id), revision, time.monotonic())
+            _indexes[client_id] = entry
+        return entry[0]
+
+
+def _result_key(client_id, revision, message, max_contexts, categories, method, max_tokens, max_passages):
+    if isinstance(categories, (list, tuple, set)):
+        categories = sorted(set(categories))
+    params = json.dumps(
+        [normalize_text(message), max_contexts, categories or None, method, max_tokens, max_passages], default=str
+    )
+    return f"rag:result:{client_id}:{revision}:{hashlib.sha1(params.encode('utf-8')).hexdigest()}"
+
+
+def search_relevant_contexts(client, message, max_contexts, categories=None, method='keywords', max_tokens=None,
+                             max_passages=None):
+    """ContextIndex.search com cache da resposta por revisão dos contextos do cliente."""
+    revision = get_context_revision(client.id)
+    if not result_cache_enabled():
+        return get_context_index(client.id, revision).search(
+            message, max_contexts, categories, method, max_tokens, max_passages
+        )
+
+    cache = _cache()
+    key = _result_key(client.id, revision, message, max_contexts, categories, method, max_tokens, max_passages)
+    contexts = cache.get(key)
+    if contexts is not None:
+        metrics.incr('context_cache.hit')
+        return contexts
+    metrics.incr('context_cache.miss')
+
+    contexts = get_context_index(client.id, revision).search(
+        message, max_contexts, categories, method, max_tokens, max_passages
+    )
+    cache.set(key, contexts, settings.CONTEXT_CACHE_TTL)
+    return contexts
+
+
+def invalidate_context_index(client_id=None):
+    """
+    Descarta o índice do cliente neste processo e incrementa a revisão dos
+    seus contextos, invalidando as respostas em cache e os índices dos demais
+    processos. Sem client_id, apenas descarta todos os índices deste processo.
+    """
+    with _lock:
+        if client_id is None:
+            _indexes.clear()
+        else:
+            _indexes.pop(client_id, None)
+    if client_id is not None:
+        bump_context_revision(client_id)
+
+
+@receiver(post_save, sender=ContextCategory)
+@receiver(post_delete, sender=ContextCategory)
+def _context_changed(sender, instance, **kwargs):
+    # Invalida também após o commit: uma busca concorrente pode ter recarregado
+    # o índice (e gravado respostas) com os dados anteriores enquanto a
+    # transação estava aberta
+    client_id = instance.client_id
+    invalidate_context_index(client_id)
+    transaction.on_commit(lambda: invalidate_context_index(client_id))
@@ -1,3 +1,511 @@
-from django.test import TestCase
+import numpy as np
+import random
+import requests
+import tempfile
+from clients.models import Client
+from datetime import timedelta
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from pathlib import Path
+from systems import llm, rag
+from systems.keywords import KeywordAutomaton
+from systems.management.commands.benchmark_context_matching import VOCABULARY, Command as BenchmarkCommand
+from systems.models import ContextCategory, LLMUsageDaily, LogLLMUsage
+from systems.passages import build_passages, split_passages
+from systems.text import count_tokens, normalize_keywords, term_frequencies
+from systems.vectors import ContextVectors, embed_counts, load_context_vectors
+from unittest import mock
 
-# Create your tests here.
+
+def create_client(name='Hotel', **kwargs):
+    return Client.objects.create(
+        name=name, business_name=name, phone='0', contact=name, email=f'{name.lower()}@example.com',
+        api_token=f'api-{name.lower()}', monthly_fee=0, **kwargs
+    )
+
+
+@override_settings(LLM_BACKEND='stub', LLM_STUB_LATENCY_MS=0, LLM_CACHE_TTL=60, LLM_CACHED_FLUSH_INTERVAL=3600)
+class LLMBudgetTests(TestCase):
+
+    def setUp(self):
+        llm._backend = None
+        llm.flush_cached_hits()
+        cache.clear()
+        self.addCleanup(setattr, llm, '_backend', None)
+
+    def complete(self, client, text):
+        return llm.chat_completion([{'role': 'user', 'content': text}], client=client, purpose='test')
+
+    def test_budget_is_shared_through_the_database(self):
+        client = create_client(llm_daily_token_budget=20)
+        result = self.complete(client, 'x' * 100)
+        self.assertEqual(llm.get_daily_tokens(client.id), result.prompt_tokens + result.completion_tokens)
+
+        # Outro processo (cache vazio) enxerga o mesmo consumo
+        cache.clear()
+        with self.assertRaises(llm.LLMBudgetExceeded):
+            self.complete(client, 'outro prompt')
+        self.assertEqual(LLMUsageDaily.objects.get(client_id=client).tokens, llm.get_daily_tokens(client.id))
+
+    def test_daily_tokens_accumulate(self):
+        client = create_client()
+        first = self.complete(client, 'primeiro prompt')
+        second = self.complete(client, 'segundo prompt')
+        total = sum(r.prompt_tokens + r.completion_tokens for r in (first, second))
+        self.assertEqual(llm.get_daily_tokens(client.id), total)
+        self.assertEqual(LLMUsageDaily.objects.filter(client_id=client).count(), 1)
+
+    def test_cached_hits_are_recorded_in_batches(self):
+        client = create_client()
+        self.complete(client, 'mesmo prompt')
+        for _ in range(5):
+            self.assertTrue(self.complete(client, 'mesmo prompt').cached)
+        self.assertFalse(LogLLMUsage.objects.filter(outcome='cached').exists())
+
+        llm.flush_cached_hits()
+        row = LogLLMUsage.objects.get(outcome='cached')
+        self.assertEqual((row.client_id_id, row.purpose, row.calls), (client.id, 'test', 5))
+
+
+@override_settings(LLM_BACKEND='openai', LLM_API_KEY='sk-test', LLM_MAX_RETRIES=0, LLM_CACHE_TTL=0)
+class OpenAIBackendTests(TestCase):
+
+    def setUp(self):
+        llm._backend = None
+        self.addCleanup(setattr, llm, '_backend', None)
+
+    def test_non_json_response_is_an_error(self):
+        client = create_client()
+        response = requests.Response()
+        response.status_code = 200
+        response._content = b'<html>Bad gateway</html>'
+        with mock.patch.object(requests.Session, 'post', return_value=response):
+            with self.assertRaises(llm.LLMError):
+                llm.chat_completion([{'role': 'user', 'content': 'oi'}], client=client, purpose='test')
+        self.assertEqual(LogLLMUsage.objects.get(client_id=client).outcome, 'error')
+
+
+    def test_malformed_response_is_an_error(self):
+        client = create_client()
+        backend = mock.Mock(**{'complete.return_value': {'choices': []}})
+        with mock.patch.object(llm, 'get_backend', return_value=backend):
+            with self.assertRaisesRegex(llm.LLMError, 'Invalid LLM response'):
+                llm.chat_completion([{'role': 'user', 'content': 'oi'}], client=client, purpose='test')
+        self.assertEqual(LogLLMUsage.objects.get(client_id=client).outcome, 'error')
+
+    def test_backend_bug_is_not_masked(self):
+        backend = mock.Mock(**{'complete.side_effect': TypeError('bug no backend')})
+        with mock.patch.object(llm, 'get_backend', return_value=backend):
+            with self.assertRaisesRegex(TypeError, 'bug no backend'):
+                llm.chat_completion([{'role': 'user', 'content': 'oi'}], client=create_client(), purpose='test')
+
+
+class RelevantContextCacheTests(TestCase):
+    """Cache das respostas do RAG (alias 'rag')."""
+
+    def setUp(self):
+        self.client_obj = create_client()
+        self.context = ContextCategory.objects.create(
+            client=self.client_obj, category='pagamento', content='Aceitamos pix e cartão.', keywords=['pix']
+        )
+        rag.invalidate_context_index()
+
+    def search(self):
+        return rag.search_relevant_contexts(self.client_obj, 'aceitam pix?', 3)
+
+    def result_keys(self):
+        return [key for key in caches['rag']._cache if ':rag:result:' in key]
+
+    def test_process_local_cache_does_not_store_results(self):
+        self.assertFalse(rag.result_cache_enabled())
+        self.assertEqual(self.search()[0]['content'], 'Aceitamos pix e cartão.')
+        self.assertEqual(self.result_keys(), [])
+        # Respostas do RAG não ocupam o cache default
+        self.assertFalse([key for key in cache._cache if ':rag:' in key])
+
+    def test_shared_cache_stores_results_and_invalidates_on_save(self):
+        with tempfile.TemporaryDirectory() as directory:
+            shared = {**settings.CACHES, 'rag': {
+                'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': directory
+            }}
+            with override_settings(CACHES=shared):
+                self.assertTrue(rag.result_cache_enabled())
+                self.search()
+                revision = rag.get_context_revision(self.client_obj.id)
+                self.assertTrue(caches['rag'].get(rag._result_key(
+                    self.client_obj.id, revision, 'aceitam pix?', 3, None, 'keywords', None, None
+                )))
+
+                self.context.content = 'Aceitamos apenas pix.'
+                self.context.save()
+                self.assertNotEqual(rag.get_context_revision(self.client_obj.id), revision)
+                self.assertEqual(self.search()[0]['content'], 'Aceitamos apenas pix.')
+
+
+class KeywordAutomatonTests(SimpleTestCase):
+    """KeywordAutomaton.findall deve coincidir com `keyword in texto`."""
+
+    def assert_matches_scan(self, keywords, text):
+        expected = {i for i, keyword in enumerate(keywords) if keyword in text}
+        self.assertEqual(KeywordAutomaton(keywords).findall(text), expected, (keywords, text))
+
+    def test_overlapping_keywords(self):
+        keywords = ['he', 'she', 'his', 'hers', 'ers', 'r', 'cafe da manha', 'manha', 'a']
+        for text in ('ushers', 'she sells his hers', 'cafe da manhã', 'cafe da manha', 'hhhshe', ''):
+            self.assert_matches_scan(keywords, text)
+
+    def test_empty_and_repeated_keywords(self):
+        keywords = ['', 'pix', 'pix', 'x']
+        self.assertEqual(KeywordAutomaton(keywords).findall(''), {0})
+        self.assertEqual(KeywordAutomaton(keywords).findall('aceitam pix?'), {0, 1, 2, 3})
+        self.assertEqual(KeywordAutomaton([]).findall('qualquer texto'), set())
+
+    def test_random_texts(self):
+        rng = random.Random(7)
+        alphabet = 'abc '
+        for _ in range(200):
+            keywords = [''.join(rng.choices(alphabet, k=rng.randint(1, 4))) for _ in range(rng.randint(1, 8))]
+            text = ''.join(rng.choices(alphabet + 'xé', k=rng.randint(0, 30)))
+            self.assert_matches_scan(keywords, text)
+
+
+class ContextIndexMatchingTests(SimpleTestCase):
+    """ContextIndex.search (varredura e autômato) contra a pontuação do loop original."""
+
+    def setUp(self):
+        self.benchmark = BenchmarkCommand()
+        rng = random.Random(42)
+        self.contexts = self.benchmark._synthetic_contexts(rng, 15, 30)
+        self.messages = [
+            ' '.join(rng.choices(VOCABULARY + ['quero', 'um', 'para', 'hoje', 'olá'], k=rng.randint(2, 12)))
+            for _ in range(200)
+        ] + ['', 'nada a ver', 'CAFÉ DA MANHÃ e Wi-Fi?']
+
+    def index(self, automaton):
+        index = rag.ContextIndex(self.contexts)
+        index.automaton = KeywordAutomaton(index.keywords) if automaton else None
+        return index
+
+    def test_threshold_selects_automaton(self):
+        self.assertGreaterEqual(len(rag.ContextIndex(self.contexts).keywords), rag.AUTOMATON_MIN_KEYWORDS)
+        self.assertIsNotNone(rag.ContextIndex(self.contexts).automaton)
+        self.assertIsNone(rag.ContextIndex(self.contexts[:1]).automaton)
+
+    def test_scores_match_legacy_loop(self):
+        for automaton in (False, True):
+            index = self.index(automaton)
+            for message in self.messages:
+                with self.subTest(automaton=automaton, message=message):
+                    found = [
+                        (c['category'], c['score'], c.get('matched_keywords'))
+                        for c in index.search(message.lower(), len(self.contexts))
+                    ]
+                    self.assertEqual(found, self.benchmark._legacy_scores(self.contexts, message.lower()))
+
+
+
+def context_row(position, category, content, keywords=(), priority=0):
+    """Contexto no formato carregado por ContextIndex.load (sem passagens)."""
+    keywords = list(keywords)
+    frequencies = term_frequencies(content, keywords)
+    return {
+        'id': position, 'category': category, 'content': content, 'keywords': keywords,
+        'normalized_keywords': normalize_keywords(keywords), 'term_frequencies': frequencies,
+        'term_count': sum(frequencies.values()), 'token_count': count_tokens(content), 'priority': priority,
+    }
+
+
+@override_settings(CONTEXT_BM25_WEIGHT=6)
+class ContextIndexRankingTests(SimpleTestCase):
+    """Métodos 'bm25' e 'hybrid' do ContextIndex.search contra scores BM25 calculados à mão."""
+
+    def setUp(self):
+        # Termos: {piscina: 2, aquecida: 1, aberta: 1}, {cafe: 1, piscina: 1},
+        # {estacionamento: 1, gratuito: 1, cafe: 2}; tamanho médio 10/3
+        self.index = rag.ContextIndex([
+            context_row(1, 'piscina', 'Piscina aquecida. Piscina aberta'),
+            context_row(2, 'cafe', 'Café e piscina'),
+            context_row(3, 'estacionamento', 'Estacionamento gratuito, café e café'),
+        ])
+
+    def ranking(self, message, method='bm25', index=None):
+        return [(c['category'], c['score']) for c in (index or self.index).search(message, 3, method=method)]
+
+    def test_bm25_scores(self):
+        # piscina em 2 de 3 documentos: idf = ln(1 + 1.5 / 2.5) = 0.470004
+        # normalização (k1 = 1.2, b = 0.75): 1.2 * (0.25 + 0.75 * 4 / (10/3)) = 1.38 e 1.2 * (0.25 + 0.75 * 2 / (10/3)) = 0.84
+        # piscina: 0.470004 * 2 * 2.2 / (2 + 1.38) = 0.6118; cafe: 0.470004 * 1 * 2.2 / (1 + 0.84) = 0.5620
+        self.assertEqual(self.ranking('piscina?'), [('piscina', 0.6118), ('cafe', 0.562)])
+        # cafe também em 2 de 3: o contexto 'cafe' soma 2 * 0.5620 e passa à frente
+        self.assertEqual(
+            self.ranking('café na piscina'), [('cafe', 1.1239), ('piscina', 0.6118), ('estacionamento', 0.6118)]
+        )
+        # Nenhum termo em comum: fallback por prioridade
+        with self.assertLogs('systems.rag', 'WARNING'):
+            self.assertEqual(self.ranking('wi-fi?'), [('piscina', 0), ('cafe', 0), ('estacionamento', 0)])
+
+    def test_hybrid_breaks_keyword_ties_with_bm25(self):
+        index = rag.ContextIndex([
+            context_row(1, 'lazer', 'Sauna e academia', ['piscina']),
+            context_row(2, 'piscina', 'Piscina aquecida das 8h às 22h', ['piscina']),
+        ])
+        # Mesma keyword e prioridade: empate resolvido pela ordem do índice
+        self.assertEqual(self.ranking('piscina aquecida?', 'keywords', index), [('lazer', 3), ('piscina', 3)])
+
+        # Termos: {sauna, academia, piscina} e {piscina: 2, aquecida, 8h, 22h}; tamanho médio 4
+        # idf: piscina ln(1 + 0.5 / 2.5) = 0.182322, aquecida ln(1 + 1.5 / 1.5) = 0.693147
+        # lazer: 0.182322 * 2.2 / (1 + 0.975) = 0.203093
+        # piscina: 0.182322 * 2 * 2.2 / (2 + 1.425) + 0.693147 * 2.2 / (1 + 1.425) = 0.863053
+        # hybrid: 3 + 6 * BM25 / 0.863053
+        self.assertEqual(self.ranking('piscina aquecida?', 'hybrid', index), [('piscina', 9.0), ('lazer', 4.4119)])
+
+
+
+def packed(tokens):
+    return {'category': f'contexto_{tokens}', 'content': 'x', 'tokens': tokens}
+
+
+class PackContextsTests(SimpleTestCase):
+    """Orçamento de tokens (rag.pack_contexts e rag.context_tokens)."""
+
+    def categories(self, contexts, max_contexts=5, max_tokens=100):
+        return [context['category'] for context in rag.pack_contexts(contexts, max_contexts, max_tokens)]
+
+    def test_separator_tokens_are_counted(self):
+        self.assertGreater(rag.SEPARATOR_TOKENS, 0)
+        contexts = [packed(10), packed(20)]
+        self.assertEqual(self.categories(contexts, max_tokens=30), ['contexto_10'])
+        self.assertEqual(self.categories(contexts, max_tokens=30 + rag.SEPARATOR_TOKENS), ['contexto_10', 'contexto_20'])
+        self.assertEqual(rag.context_tokens(contexts), 30 + rag.SEPARATOR_TOKENS)
+        self.assertEqual(rag.context_tokens([packed(10)]), 10)
+        self.assertEqual(rag.context_tokens([]), 0)
+
+    def test_oversized_context_is_skipped(self):
+        contexts = [packed(10), packed(50), packed(5)]
+        self.assertEqual(self.categories(contexts, max_tokens=30), ['contexto_10', 'contexto_5'])
+        self.assertEqual(self.categories(contexts, max_tokens=4), [])
+        self.assertEqual(self.categories(contexts, max_contexts=1), ['contexto_10'])
+
+
+@override_settings(CONTEXT_MAX_TOKENS=0, CONTEXT_MAX_PASSAGES=0)
+class GetRelevantContextMaxTokensTests(TestCase):
+    """Parâmetro max_tokens do GetRelevantContextView."""
+
+    def setUp(self):
+        self.client_obj = create_client()
+        # Mesmo keyword; a prioridade define a ordem (pagamento, politicas, horarios)
+        for category, words, priority in (('pagamento', 10, 5), ('politicas', 40, 4), ('horarios', 5, 3)):
+            ContextCategory.objects.create(
+                client=self.client_obj, category=category, content=' '.join(['pix'] * words),
+                keywords=['pix'], priority=priority
+            )
+        rag.invalidate_context_index()
+
+    def post(self, **data):
+        return self.client.post(
+            reverse('systems:get-relevant-context'), {'message': 'aceitam pix?', 'max_contexts': 3, **data},
+            content_type='application/json', HTTP_AUTHORIZATION=f'Bearer {self.client_obj.token}'
+        )
+
+    def test_max_tokens(self):
+        self.assertEqual(
+            list(ContextCategory.objects.order_by('-priority').values_list('token_count', flat=True)), [10, 40, 5]
+        )
+        response = self.post(max_tokens=15 + rag.SEPARATOR_TOKENS)
+        self.assertEqual(response.status_code, 200)
+        # politicas não cabe e é pulado; horarios, menor, ainda entra
+        self.assertEqual(response.json()['contexts_used'], ['pagamento', 'horarios'])
+        self.assertEqual(response.json()['tokens_used'], 15 + rag.SEPARATOR_TOKENS)
+        self.assertEqual(response.json()['tokens_used'], count_tokens(response.json()['context']))
+
+    def test_without_max_tokens(self):
+        response = self.post()
+        self.assertEqual(response.json()['contexts_used'], ['pagamento', 'politicas', 'horarios'])
+        self.assertEqual(response.json()['tokens_used'], 55 + 2 * rag.SEPARATOR_TOKENS)
+
+    def test_invalid_max_tokens(self):
+        for value in (0, -1, 'abc'):
+            with self.subTest(value=value):
+                self.assertEqual(self.post(max_tokens=value).status_code, 400)
+
+
+
+class ContextVectorFileTests(SimpleTestCase):
+    """Arquivo .npy dos vetores de um cliente (systems.vectors.load_context_vectors)."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+        settings_override = override_settings(CONTEXT_VECTOR_DIR=directory.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        now = timezone.now()
+        self.contexts = [
+            {'id': 1, 'updated_at': now, 'content': 'Aceitamos pix e cartão de crédito.', 'keywords': ['pix']},
+            {'id': 2, 'updated_at': now, 'content': 'Check-in a partir das 14h.', 'keywords': ['check-in']},
+        ]
+        self.load_counts = mock.Mock(side_effect=lambda contexts: [
+            embed_counts(' '.join([context['content'], *context['keywords']])) for context in contexts
+        ])
+
+    def load(self):
+        return load_context_vectors(7, self.contexts, self.load_counts)
+
+    def files(self):
+        return sorted(path.name for path in self.directory.iterdir())
+
+    def test_round_trip(self):
+        vectors = self.load()
+        self.assertEqual(self.load_counts.call_count, 1)
+        self.assertEqual(len(self.files()), 1)
+        self.assertTrue(self.files()[0].startswith('client_7_'))
+        expected = ContextVectors.build(self.load_counts(self.contexts))
+
+        # Segunda carga: lida do arquivo com mmap, sem recalcular
+        self.load_counts.reset_mock()
+        loaded = self.load()
+        self.load_counts.assert_not_called()
+        self.assertIsInstance(loaded.matrix, np.memmap)
+        np.testing.assert_array_equal(loaded.data(), vectors.data())
+        np.testing.assert_allclose(loaded.data(), expected.data())
+
+    def test_invalid_file_is_recomputed(self):
+        self.load()
+        path = self.directory / self.files()[0]
+        path.write_bytes(b'corrompido')
+        self.load_counts.reset_mock()
+
+        with self.assertLogs('systems.vectors', 'WARNING'):
+            vectors = self.load()
+        self.assertEqual(self.load_counts.call_count, 1)
+        self.assertEqual(vectors.matrix.shape, (2, 1024))
+        # O arquivo foi regravado e volta a ser lido sem recalcular
+        self.load_counts.reset_mock()
+        self.load()
+        self.load_counts.assert_not_called()
+
+    def test_old_fingerprints_are_removed(self):
+        self.load()
+        old = self.files()
+        load_context_vectors(8, self.contexts, self.load_counts)
+
+        self.contexts[1]['updated_at'] += timedelta(minutes=1)
+        self.load()
+        current = [name for name in self.files() if name.startswith('client_7_')]
+        self.assertEqual(len(current), 1)
+        self.assertNotEqual(current, old)
+        # Arquivos de outros clientes ficam
+        self.assertEqual(len([name for name in self.files() if name.startswith('client_8_')]), 1)
+        self.assertFalse([name for name in self.files() if name.endswith('.tmp')])
+
+
+class VectorSearchTests(TestCase):
+    """Método 'vector' do systems.rag (contextos gravados no banco)."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_override = override_settings(CONTEXT_VECTOR_DIR=directory.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.client_obj = create_client()
+        for category, content in (
+            ('pagamento', 'Aceitamos pix, cartão de crédito e débito. Pagamento antecipado de 50%.'),
+            ('horarios', 'Check-in a partir das 14h e check-out até as 12h.'),
+            ('fluxo_reserva', 'Para reservar, informe as datas, o número de hóspedes e o tipo de quarto.'),
+        ):
+            ContextCategory.objects.create(client=self.client_obj, category=category, content=content, keywords=[])
+        rag.invalidate_context_index()
+        self.addCleanup(rag.invalidate_context_index)
+
+    def search(self, message):
+        return [c['category'] for c in rag.search_relevant_contexts(self.client_obj, message, 3, method='vector')]
+
+    def test_ranking(self):
+        self.assertEqual(self.search('aceita cartao de credito?')[0], 'pagamento')
+        self.assertEqual(self.search('que horas e o checkin?')[0], 'horarios')
+        # Erro de digitação: os n-gramas de caracteres ainda aproximam "reservar" e "quartos"
+        self.assertEqual(self.search('quero resevar quartos')[0], 'fluxo_reserva')
+
+
+RULE = '━━━━━━━━━━'
+BOOKING_FLOW = f"""RESERVAS
+{RULE}
+
+- Pergunte as datas de entrada e saída do hóspede.
+
+{RULE}
+
+- Pergunte quantos adultos e crianças vão se hospedar.
+
+{RULE}
+
+- Confirme o tipo de quarto e o valor da diária com o pix.
+
+{RULE}
+
+- Envie o link de pagamento e aguarde a confirmação do pix."""
+
+
+class PassageTests(SimpleTestCase):
+    """Passagens (systems.passages) e a montagem do conteúdo em ContextIndex.best_passages."""
+
+    def index(self, content, keywords, max_tokens=30, overlap=1):
+        normalized = normalize_keywords(keywords)
+        frequencies = term_frequencies(content, keywords)
+        return rag.ContextIndex([{
+            'id': 1, 'category': 'fluxo_reserva', 'content': content, 'keywords': keywords,
+            'normalized_keywords': normalized, 'term_frequencies': frequencies,
+            'term_count': sum(frequencies.values()), 'token_count': count_tokens(content), 'priority': 0,
+            'passages': build_passages(content, normalized, max_tokens, overlap),
+        }])
+
+    def test_split_passages(self):
+        passages = split_passages(BOOKING_FLOW, 30)
+        self.assertEqual(len(passages), 4)
+        self.assertTrue(all(count_tokens(text) <= 30 for text, _ in passages))
+        # A primeira passagem começa a seção; as seguintes repetem o título e o último parágrafo
+        self.assertEqual([repeated for _, repeated in passages], [0, 2, 2, 2])
+        self.assertEqual(passages[1][0].split('\n\n')[:2], ['RESERVAS', RULE])
+
+        # Sem as repetições, as passagens reconstroem o conteúdo
+        blocks = [block for text, repeated in passages for block in text.split('\n\n')[repeated:]]
+        self.assertEqual('\n\n'.join(blocks), BOOKING_FLOW)
+
+    def test_split_passages_without_overlap(self):
+        passages = split_passages(BOOKING_FLOW, 30, overlap=0)
+        self.assertEqual([repeated for _, repeated in passages], [0, 1, 1, 1])
+        self.assertEqual(split_passages('Texto curto.', 30), [('Texto curto.', 0)])
+        self.assertEqual(split_passages('', 30), [])
+
+    def test_adjacent_passages_drop_only_the_overlap(self):
+        index = self.index(BOOKING_FLOW, ['pix'])
+        content = index.search('aceitam pix?', 1, max_passages=2)[0]['content']
+        # Os traços repetidos no próprio conteúdo continuam lá
+        self.assertEqual(content, '\n\n'.join([
+            'RESERVAS', RULE, '- Confirme o tipo de quarto e o valor da diária com o pix.', RULE,
+            '- Envie o link de pagamento e aguarde a confirmação do pix.',
+        ]))
+
+    def test_distant_passages_keep_repeated_paragraphs(self):
+        content = BOOKING_FLOW.replace('hóspede', 'hóspede e o pix')
+        index = self.index(content, ['pix'])
+        result = index.search('pix', 1, max_passages=2)[0]['content']
+        # Passagens 0 e 2: nada é removido, nem o título repetido pela passagem 2
+        self.assertEqual(result, '\n\n'.join(text for text, _ in split_passages(content, 30)[::2]))
+        self.assertEqual(result.count('RESERVAS'), 2)
+
+    def test_repeated_bullets_are_kept(self):
+        bullet = '- Aceitamos pix, cartão e transferência bancária.'
+        sections = [f'{title}\n{RULE}\n\n{bullet}\n\nDetalhes sobre {title.lower()} do hotel.' for title in ('QUARTOS', 'EVENTOS')]
+        content = '\n\n'.join(sections)
+        index = self.index(content, ['pix'], max_tokens=20)
+        self.assertGreater(len(index.passages), 2)
+        result = index.search('pix', 1, max_passages=2)[0]['content']
+        self.assertEqual(result.count(bullet), 2)
@@ -0,0 +1,88 @@
+"""
+Normalização e tokenização de texto usadas pelo RAG (systems.rag) e pelos
+campos pré-calculados de ContextCategory.
+"""
+import re
+import unicodedata
+
+
+def normalize_text(text):
+    """
+    Normaliza texto para busca mais flexível: remove acentos, converte para
+    minúsculas e remove espaços extras.
+    """
+    text = ''.join(
+        c for c in unicodedata.normalize('NFD', str(text))
+        if unicodedata.category(c) != 'Mn'
+    )
+    return ' '.join(text.lower().split())
+
+
+def normalize_keywords(keywords):
+    """Keywords normalizadas, na mesma ordem (e com as mesmas repetições) da lista original."""
+    return [normalize_text(keyword) for keyword in keywords or []]
+
+
+_WORD_RE = re.compile(r"\w+")
+
+# Palavras muito frequentes em português e espanhol (já sem acentos), ignoradas na indexação
+STOPWORDS = frozenset("""
+a o e as os um uma uns umas de do da dos das no na nos nas em por para pra com sem sob ao aos
+que se mas ou ja nao sim eu tu ele ela nos vos eles elas voce voces me te lhe lhes meu minha
+seu sua seus suas nosso nossa isso isto esse essa este esta aquele aquela ser estar ter ha foi
+sao era tem tenho pelo pela pelos pelas mais muito como quando onde qual quais quem porque
+el la los las un una unos unas del al y o pero con sin sobre en es son fue hay yo mi mis tu tus
+su sus nuestro nuestra le les lo este esta ese esa eso esto muy cuando donde cual quien porque
+""".split())
+
+# Plurais e terminações flexionais comuns (pt/es), testados em ordem
+_SUFFIXES = (
+    ('iones', 'ion'), ('coes', 'cao'), ('oes', 'ao'), ('aes', 'ao'), ('ais', 'al'), ('eis', 'el'),
+    ('ois', 'ol'), ('ns', 'm'), ('res', 'r'), ('zes', 'z'), ('ses', 's'), ('les', 'l'),
+)
+
+
+def stem(word):
+    """Reduz plurais comuns do português e do espanhol (ex: quartos -> quarto, habitaciones -> habitacion)."""
+    if len(word) <= 3:
+        return word
+    for suffix, replacement in _SUFFIXES:
+        if word.endswith(suffix):
+            return word[:-len(suffix)] + replacement
+    if word.endswith('s') and not word.endswith('ss'):
+        return word[:-1]
+    return word
+
+
+def tokenize(text):
+    """Termos de text para ranking (BM25): normalizados, sem stopwords e com plurais reduzidos."""
+    return [stem(word) for word in _WORD_RE.findall(normalize_text(text)) if word not in STOPWORDS]
+
+
+def term_frequencies(content, keywords):
+    """Frequência de cada termo no documento de um contexto (conteúdo + keywords)."""
+    frequencies = {}
+    for term in tokenize(' '.join([content or '', *[str(keyword) for keyword in keywords or []]])):
+        frequencies[term] = frequencies.get(term, 0) + 1
+    return frequencies
+
+
+_TOKEN_PIECE_RE = re.compile(r"\w+|[^\w\s]+")
+
+
+def count_tokens(text):
+    """
+    Estimativa local de tokens de text para os tokenizers BPE dos modelos da
+    OpenAI, sem dependências: palavras e sequências de pontuação contam um
+    token a cada ~4 caracteres e emojis (a partir de U+2600) contam 2 cada.
+    Mais próxima do real que len(text) // 4 para contextos com listas,
+    markdown e emojis.
+    """
+    total = 0
+    for piece in _TOKEN_PIECE_RE.findall(text or ''):
+        if piece[0].isalnum() or piece[0] == '_':
+            total += (len(piece) + 3) // 4
+        else:
+            symbols = sum(1 for c in piece if ord(c) >= 0x2600)
+            total += 2 * symbols + (len(piece) - symbols + 3) // 4
+    return total
@@ -0,0 +1,156 @@
+"""
+Embeddings locais dos contextos RAG (método 'vector' do GetRelevantContextView).
+
+Sem rede nem GPU: cada contexto (conteúdo + keywords) vira um vetor de
+VECTOR_DIM posições por feature hashing das palavras e dos n-gramas de
+caracteres (3 e 4) dos termos de systems.text.tokenize. Os n-gramas
+aproximam variações e erros de digitação ("reservacion", "resevar"), então
+perguntas parafraseadas encontram o contexto sem precisar de mais keywords.
+As contagens são calculadas no save e gravadas como float32
+(ContextCategory.embedding).
+
+Ao montar o índice do cliente, as linhas recebem peso TF-IDF (log da contagem
+x idf de cada posição entre os contextos do cliente) e norma 1, e a matriz é
+gravada em CONTEXT_VECTOR_DIR como .npy (linha 0 = pesos idf). Os processos
+abrem o arquivo com mmap, compartilhando as páginas em memória, e só
+recalculam a matriz quando os contextos mudam: o nome do arquivo leva uma
+assinatura dos ids/updated_at. A busca é um produto matriz x vetor (cosseno).
+"""
+import hashlib
+import logging
+import numpy as np
+import os
+import tempfile
+import zlib
+from django.conf import settings
+from pathlib import Path
+from systems.text import tokenize
+
+
+logger = logging.getLogger(__name__)
+
+VECTOR_DIM = 1024
+VECTOR_DTYPE = np.dtype('<f4')
+# Alterar a forma de gerar as features invalida os arquivos .npy existentes
+VECTOR_VERSION = 1
+
+
+def _features(text):
+    """Posição e sinal (hashing com sinal reduz o viés das colisões) de cada feature do texto."""
+    for term in tokenize(text):
+        features = [f'w:{term}']
+        padded = f' {term} '
+        for size in (3, 4):
+            features.extend(f'c:{padded[i:i + size]}' for i in range(len(padded) - size + 1))
+        for feature in features:
+            # crc32 é estável entre processos (hash() do Python não é)
+            value = zlib.crc32(feature.encode('utf-8'))
+            yield value % VECTOR_DIM, 1.0 if value & 0x80000000 else -1.0
+
+
+def embed_counts(text):
+    """Contagens (com sinal) das features de text, em um vetor float32 de VECTOR_DIM posições."""
+    indexes, signs = [], []
+    for index, sign in _features(text):
+        indexes.append(index)
+        signs.append(sign)
+    if not indexes:
+        return np.zeros(VECTOR_DIM, dtype=VECTOR_DTYPE)
+    return np.bincount(indexes, weights=signs, minlength=VECTOR_DIM).astype(VECTOR_DTYPE)
+
+
+def context_embedding(content, keywords):
+    """Embedding de um contexto (conteúdo + keywords) serializado para ContextCategory.embedding."""
+    text = ' '.join([content or '', *[str(keyword) for keyword in keywords or []]])
+    return embed_counts(text).tobytes()
+
+
+def _sublinear(counts):
+    return np.sign(counts) * np.log1p(np.abs(counts))
+
+
+class ContextVectors:
+    """Matriz TF-IDF normalizada dos contextos de um cliente (mesma ordem do ContextIndex)."""
+
+    def __init__(self, data):
+        # data: linha 0 = idf, demais = contextos
+        self.idf = data[0]
+        self.matrix = data[1:]
+
+    @classmethod
+    def build(cls, counts):
+        """
+        :param counts: Matriz (contextos x VECTOR_DIM) com as contagens de embed_counts.
+        """
+        counts = np.asarray(counts, dtype=np.float32).reshape(-1, VECTOR_DIM)
+        total = counts.shape[0]
+        document_frequency = np.count_nonzero(counts, axis=0)
+        idf = (np.log((1 + total) / (1 + document_frequency)) + 1).astype(np.float32)
+        matrix = _sublinear(counts) * idf
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix = np.divide(matrix, norms, out=np.zeros_like(matrix), where=norms > 0)
+        return cls(np.vstack([idf, matrix]).astype(VECTOR_DTYPE))
+
+    def data(self):
+        return np.vstack([self.idf, self.matrix])
+
+    def similarities(self, message):
+        """Similaridade de cosseno da mensagem com cada contexto."""
+        query = _sublinear(embed_counts(message)) * self.idf
+        norm = np.linalg.norm(query)
+        if not norm or not len(self.matrix):
+            return np.zeros(len(self.matrix), dtype=np.float32)
+        return self.matrix @ (query / norm)
+
+
+def _fingerprint(contexts):
+    digest = hashlib.sha1(f'{VECTOR_VERSION}:{VECTOR_DIM}'.encode())
+    for context in contexts:
+        digest.update(f"|{context['id']}:{context['updated_at'].isoformat()}".encode())
+    return digest.hexdigest()[:16]
+
+
+def load_context_vectors(client_id, contexts, load_counts):
+    """
+    Vetores dos contextos do cliente, do arquivo .npy compartilhado (mmap) ou
+    calculados e gravados nele.
+
+    :param contexts: Contextos do ContextIndex ('id' e 'updated_at', na ordem do índice).
+    :param load_counts: Função que recebe os contextos e retorna a matriz de
+                        contagens (usada só quando o arquivo ainda não existe).
+    """
+    directory = Path(settings.CONTEXT_VECTOR_DIR)
+    prefix = f'client_{client_id}_'
+    path = directory / f'{prefix}{_fingerprint(contexts)}.npy'
+    try:
+        return ContextVectors(np.load(path, mmap_mode='r'))
+    except FileNotFoundError:
+        pass
+    except ValueError:
+        logger.warning(f"[RAG] arquivo de vetores inválido: {path}; recalculando")
+
+    vectors = ContextVectors.build(load_counts(contexts))
+    try:
+        directory.mkdir(parents=True, exist_ok=True)
+        # Grava em arquivo temporário e renomeia: outro processo nunca lê um arquivo pela metade
+        with tempfile.NamedTemporaryFile(dir=directory, prefix=prefix, suffix='.tmp', delete=False) as tmp:
+            np.save(tmp, vectors.data())
+        os.replace(tmp.name, path)
+        # Arquivos antigos do cliente; quem ainda os tem mapeados continua lendo normalmente
+        for old in directory.glob(f'{prefix}*.npy'):
+            if old != path:
+                old.unlink(missing_ok=True)
+        return ContextVectors(np.load(path, mmap_mode='r'))
+    except OSError:
+        logger.exception(f"[RAG] não foi possível gravar {path}; usando os vetores em memória")
+        return vectors
+
+
+def embedding_counts(embedding, content, keywords):
+    """
+    Contagens de um contexto a partir do embedding gravado; recalcula se ele
+    faltar ou tiver outro tamanho (linhas inseridas por SQL, VECTOR_DIM alterado).
+    """
+    if embedding is not None and len(embedding) == VECTOR_DIM * VECTOR_DTYPE.itemsize:
+        return np.frombuffer(bytes(embedding), dtype=VECTOR_DTYPE)
+    return np.frombuffer(context_embedding(content, keywords), dtype=VECTOR_DTYPE)
@@ -5,6 +5,7 @@ import time
 from clients.models import Client
 from common.utils import parse_int
 from datetime import datetime, date
+from django.conf import settings
 from django.db.models import Q
 from drf_yasg import openapi
 from drf_yasg.utils import swagger_auto_schema
@@ -13,6 +14,7 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 from systems.models import LogIntegration, HotelRooms, ContextCategory, SystemPrompt, LogApiSystem
 from systems.hotel import reservations
+from systems.rag import CONTEXT_SEPARATOR, METHODS as CONTEXT_METHODS, context_tokens, search_relevant_contexts
 from systems.utils import log_received_json
 
 
@@ -1622,7 +1624,7 @@ class LogIntegrationView(APIView):
 class GetRelevantContextView(APIView):
     """
     Retorna contexto relevante baseado na mensagem do usuário
-    usando busca por palavras-chave (RAG leve)
+    usando busca por palavras-chave, BM25 ou embeddings locais (RAG leve)
     """
     authentication_classes = []
     permission_classes = []
@@ -1654,6 +1656,21 @@ class GetRelevantContextView(APIView):
                     type=openapi.TYPE_ARRAY,
                     items=openapi.Items(type=openapi.TYPE_STRING),
                     description='Categorias específicas (opcional)',
+                ),
+                'method': openapi.Schema(
+                    type=openapi.TYPE_STRING,
+                    enum=list(CONTEXT_METHODS),
+                    description="Ranking: 'keywords' (palavras-chave + prioridade), 'bm25' (conteúdo + keywords), "
+                                "'hybrid' (keywords + prioridade + BM25) ou 'vector' (similaridade de embeddings locais)",
+                    default='keywords'
+                ),
+                'max_tokens': openapi.Schema(
+                    type=openapi.TYPE_INTEGER,
+                    description='Orçamento aproximado de tokens dos contextos retornados (opcional)'
+                ),
+                'max_passages': openapi.Schema(
+                    type=openapi.TYPE_INTEGER,
+                    description='Retorna só as N passagens mais relevantes de cada contexto em vez do conteúdo inteiro (opcional)'
                 )
             },
             required=['message']
@@ -1679,9 +1696,26 @@ class GetRelevantContextView(APIView):
             message = request.data.get('message', '').lower()
             max_contexts = request.data.get('max_contexts', 3)
             specific_categories = request.data.get('categories', [])
+            method = request.data.get('method') or 'keywords'
             
             if not message:
                 return Response({"detail": "Campo 'message' é obrigatório"}, status=400)
+            if method not in CONTEXT_METHODS:
+                return Response({"detail": f"Campo 'method' deve ser um de: {', '.join(CONTEXT_METHODS)}"}, status=400)
+            try:
+                max_tokens = parse_int(request.data, 'max_tokens', required=False)
+            except ValueError as e:
+                return Response({"detail": str(e)}, status=400)
+            if max_tokens is not None and max_tokens < 1:
+                return Response({"detail": "'max_tokens' must be a positive integer"}, status=400)
+            max_tokens = max_tokens or settings.CONTEXT_MAX_TOKENS or None
+            try:
+                max_passages = parse_int(request.data, 'max_passages', required=False)
+            except ValueError as e:
+                return Response({"detail": str(e)}, status=400)
+            if max_passages is not None and max_passages < 1:
+                return Response({"detail": "'max_passages' must be a positive integer"}, status=400)
+            max_passages = max_passages or settings.CONTEXT_MAX_PASSAGES or None
             
             # Log da mensagem
             logger.info(f"[RAG] Cliente: {client.name} | Mensagem: {message[:100]}")
@@ -1691,7 +1725,10 @@ class GetRelevantContextView(APIView):
                 client, 
                 message, 
                 max_contexts,
-                specific_categories
+                specific_categories,
+                method,
+                max_tokens,
+                max_passages
             )
             
             # Log dos contextos encontrados
@@ -1699,118 +1736,29 @@ class GetRelevantContextView(APIView):
             logger.info(f"[RAG] Scores: {[(c['category'], c.get('score', 0)) for c in contexts]}")
             
             # Formatar resposta
-            formatted_context = "\n\n---\n\n".join([c['content'] for c in contexts])
+            formatted_context = CONTEXT_SEPARATOR.join([c['content'] for c in contexts])
             
             return Response({
                 "context": formatted_context,
                 "contexts_used": [c['category'] for c in contexts],
-                "total_contexts": len(contexts)
+                "total_contexts": len(contexts),
+                "method": method,
+                "tokens_used": context_tokens(contexts)
             }, status=200)
             
         except Exception as e:
             logger.exception("Erro ao buscar contexto")
             return Response({"detail": str(e)}, status=500)
     
-    def _normalize_text(self, text):
+    def _search_relevant_contexts(self, client, message, max_contexts, specific_categories, method='keywords',
+                                  max_tokens=None, max_passages=None):
         """
-        Normaliza texto para busca mais flexível
-        Remove espaços extras, acentos opcionalmente
+        Busca contextos relevantes (palavras-chave, BM25, híbrido ou vetorial) no índice
+        em memória do cliente (systems.rag), sem consultar o banco a cada mensagem
         """
-        import unicodedata
-        
-        # Remove acentos
-        text = ''.join(
-            c for c in unicodedata.normalize('NFD', text)
-            if unicodedata.category(c) != 'Mn'
+        return search_relevant_contexts(
+            client, message, max_contexts, specific_categories, method, max_tokens, max_passages
         )
-        
-        # Lowercase e remove espaços extras
-        text = ' '.join(text.lower().split())
-        
-        return text
-    
-    def _search_relevant_contexts(self, client, message, max_contexts, specific_categories):
-        """
-        Busca contextos relevantes usando palavras-chave
-        OTIMIZADO: Busca mais flexível e melhor scoring
-        """
-        # Normalizar mensagem
-        normalized_message = self._normalize_text(message)
-        message_words = set(normalized_message.split())
-        
-        # Buscar todos os contextos ativos do cliente
-        query = ContextCategory.objects.filter(client=client, active=True)
-        
-        # Se categorias específicas foram pedidas
-        if specific_categories:
-            query = query.filter(category__in=specific_categories)
-        
-        contexts = query.all()
-        
-        # Calcular score de relevância para cada contexto
-        scored_contexts = []
-        for ctx in contexts:
-            score = 0
-            keywords = ctx.keywords or []
-            matched_keywords = []
-            
-            # Pontuação por palavra-chave encontrada
-            for keyword in keywords:
-                normalized_keyword = self._normalize_text(keyword)
-                
-                # Match exato na mensagem completa
-                if normalized_keyword in normalized_message:
-                    score += 3
-                    matched_keywords.append(keyword)
-                
-                # Match de palavra individual
-                elif normalized_keyword in message_words:
-                    score += 2
-                    matched_keywords.append(keyword)
-                
-                # Match parcial (substring)
-                elif any(normalized_keyword in word for word in message_words):
-                    score += 1
-                    matched_keywords.append(keyword)
-            
-            # Adiciona prioridade do contexto (peso maior)
-            # Multiplica por 2 para dar mais peso à prioridade
-            score += (ctx.priority * 2)
-            
-            if score > 0 or ctx.priority >= 10:  # Sempre inclui contextos de prioridade máxima
-                scored_contexts.append({
-                    'category': ctx.category,
-                    'content': ctx.content,
-                    'score': score,
-                    'priority': ctx.priority,
-                    'matched_keywords': matched_keywords[:3]  # Primeiras 3 keywords
-                })
-        
-        # Ordenar por score (e desempate por prioridade)
-        scored_contexts.sort(key=lambda x: (x['score'], x['priority']), reverse=True)
-        
-        # Log dos scores para debug
-        for ctx in scored_contexts[:5]:  # Top 5
-            logger.debug(
-                f"[RAG] {ctx['category']}: score={ctx['score']}, "
-                f"priority={ctx['priority']}, keywords={ctx['matched_keywords']}"
-            )
-        
-        # Se não encontrou nenhum com keywords, retorna os mais importantes (por priority)
-        if not scored_contexts:
-            logger.warning("[RAG] Nenhuma keyword encontrada! Usando fallback por prioridade")
-            fallback = contexts.order_by('-priority')[:max_contexts]
-            return [
-                {
-                    'category': c.category, 
-                    'content': c.content,
-                    'score': 0,
-                    'priority': c.priority
-                } 
-                for c in fallback
-            ]
-        
-        return scored_contexts[:max_contexts]
 
 
 class GetSystemPromptView(APIView):